@@ -0,0 +1,15 @@
+from .engine import MultiTrackLooper
+from .mixer import MixEngine, write_mix, export_wav
+from .ringbuffer import RingBuffer
+from .export import ExportJob
+from .history import TrackHistory
+from .profiler import CallbackProfiler
+from .automation import Automation, GainRamps
+from .effects import Biquad, Delay, Pan, Compressor
+from .backends import SoundDeviceBackend, NullBackend
+from .session import load_session, save_session, read_wav
+from .convert import resample
+from .compact import CompactAudio
+from .importer import WavReader, import_wav, import_folder
+from .render import render_session
+from .control import ControlServer
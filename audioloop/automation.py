@@ -0,0 +1,130 @@
+import numpy as np
+
+# Gain changes are spread over this many frames (about 6 ms at 44.1 kHz)
+RAMP_FRAMES = 256
+
+class GainRamps:
+    """Per-track gains that glide linearly to their targets
+    
+    A ramp is defined in absolute frames (start, start + ramp_frames), not
+    in blocks, so the gains at any frame are the same however the audio is
+    split into blocks: live playback and export produce identical output.
+    Everything is preallocated; fill() writes per-sample gains with NumPy
+    broadcasting, without a Python loop over samples.
+    """
+    def __init__(self, num_tracks, channels, max_frames=4096, ramp_frames=RAMP_FRAMES):
+        self.channels = channels
+        self.ramp_frames = ramp_frames
+        self.start_gain = np.zeros(num_tracks, dtype=np.float32)
+        self.target = np.zeros(num_tracks, dtype=np.float32)
+        # -inf: no ramp, the gain is exactly start_gain == target
+        self.ramp_start = np.full(num_tracks, -np.inf)
+        # Every ramp has finished from this frame on
+        self.ramp_end = 0
+        
+        self._index = np.arange(max_frames, dtype=np.float32)
+        self._offset = np.zeros(num_tracks, dtype=np.float64)
+        self._offset32 = np.zeros(num_tracks, dtype=np.float32)
+        self._fraction = np.zeros((num_tracks, max_frames), dtype=np.float32)
+        self._rest = np.zeros((num_tracks, max_frames), dtype=np.float32)
+    
+    def ensure_capacity(self, frames):
+        if frames > len(self._index):
+            num_tracks = len(self.target)
+            self._index = np.arange(frames, dtype=np.float32)
+            self._fraction = np.zeros((num_tracks, frames), dtype=np.float32)
+            self._rest = np.zeros((num_tracks, frames), dtype=np.float32)
+    
+    def reset(self, gains):
+        """Jump every track straight to gains"""
+        self.start_gain[:] = gains
+        self.target[:] = gains
+        self.ramp_start[:] = -np.inf
+        self.ramp_end = 0
+    
+    def value(self, track, at):
+        """Gain of a track at absolute frame at"""
+        fraction = min(max((at - self.ramp_start[track]) / self.ramp_frames, 0.0), 1.0)
+        fraction = np.float32(fraction)
+        return self.target[track] * fraction + self.start_gain[track] * (np.float32(1) - fraction)
+    
+    def set(self, track, gain, at, hard=False):
+        """Glide a track from its gain at frame at to gain (or jump if hard)"""
+        if hard:
+            self.start_gain[track] = gain
+            self.ramp_start[track] = -np.inf
+        else:
+            self.start_gain[track] = self.value(track, at)
+            self.ramp_start[track] = at
+            self.ramp_end = max(self.ramp_end, at + self.ramp_frames)
+        self.target[track] = gain
+    
+    def steady(self, at):
+        """True if no gain changes from frame at on"""
+        return at >= self.ramp_end
+    
+    def fill(self, at, frames, out):
+        """Per-sample gains of frames from at into out, (num_tracks, frames * channels)
+        
+        gain = target * fraction + start * (1 - fraction), which is exactly
+        the target once a ramp is done, as in the steady mix.
+        """
+        fraction = self._fraction[:, :frames]
+        rest = self._rest[:, :frames]
+        np.subtract(at, self.ramp_start, out=self._offset)
+        np.minimum(self._offset, self.ramp_frames, out=self._offset)
+        np.copyto(self._offset32, self._offset, casting='same_kind')
+        np.add(self._offset32[:, None], self._index[None, :frames], out=fraction)
+        np.divide(fraction, self.ramp_frames, out=fraction)
+        np.clip(fraction, 0.0, 1.0, out=fraction)
+        np.subtract(1.0, fraction, out=rest)
+        np.multiply(rest, self.start_gain[:, None], out=rest)
+        np.multiply(fraction, self.target[:, None], out=fraction)
+        np.add(fraction, rest, out=fraction)
+        
+        samples = out.reshape(len(self.target), frames, self.channels)
+        np.copyto(samples, fraction[:, :, None])
+
+class Automation:
+    """Timestamped gain changes, replayed every time round the loop
+    
+    Events are (loop position in frames, track, gain) kept sorted by
+    position. An Automation is never modified: with_event and
+    without_track return new ones, so the looper can swap them in while
+    the audio callback is reading the old one.
+    """
+    def __init__(self, positions=(), tracks=(), gains=()):
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.tracks = np.asarray(tracks, dtype=np.int64)
+        self.gains = np.asarray(gains, dtype=np.float32)
+    
+    def __len__(self):
+        return len(self.positions)
+    
+    def with_event(self, position, track, gain):
+        """Copy with an event added after any others at the same position"""
+        i = np.searchsorted(self.positions, position, side='right')
+        return Automation(np.insert(self.positions, i, position),
+                          np.insert(self.tracks, i, track),
+                          np.insert(self.gains, i, gain))
+    
+    def without_track(self, track=None):
+        """Copy without a track's events (or without any)"""
+        if track is None:
+            return Automation()
+        keep = self.tracks != track
+        return Automation(self.positions[keep], self.tracks[keep], self.gains[keep])
+    
+    def first_at(self, position):
+        """Index of the first event at or after a loop position"""
+        return int(np.searchsorted(self.positions, position))
+    
+    def to_list(self):
+        """[[position, track, gain], ...] for a session file"""
+        return [[int(p), int(t), float(g)]
+                for p, t, g in zip(self.positions, self.tracks, self.gains)]
+    
+    @classmethod
+    def from_list(cls, events):
+        events = sorted(events, key=lambda event: event[0])
+        return cls([e[0] for e in events], [e[1] for e in events], [e[2] for e in events])
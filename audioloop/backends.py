@@ -0,0 +1,277 @@
+import numpy as np
+
+class StreamTime:
+    """Timestamps passed to callbacks, like sounddevice's time struct"""
+    def __init__(self, current_time, input_adc_time=0.0, output_dac_time=0.0):
+        self.currentTime = current_time
+        self.inputBufferAdcTime = input_adc_time
+        self.outputBufferDacTime = output_dac_time
+
+class CallbackStatus:
+    """Status flags passed to callbacks, like sounddevice.CallbackFlags"""
+    def __init__(self):
+        self.input_underflow = False
+        self.input_overflow = False
+        self.output_underflow = False
+        self.output_overflow = False
+        self.priming_output = False
+    
+    def __bool__(self):
+        return (self.input_underflow or self.input_overflow or
+                self.output_underflow or self.output_overflow or self.priming_output)
+
+class SoundDeviceBackend:
+    """Real audio I/O through sounddevice/PortAudio
+    
+    sounddevice is imported and devices are chosen only when they are
+    first needed, so creating a looper is cheap and works without hardware.
+    Devices not given explicitly are picked by a DeviceSelector (see
+    devices.py), which reuses the ones cached from the last run if they
+    are still there. Streams open with each device's cached low latency
+    and, once probed, its smallest stable block size.
+    """
+    def __init__(self, input_device=None, output_device=None, samplerate=44100, channels=2,
+                 rules=None, cache_path=None, rescan=False, input_channels=None):
+        self.input_device_id = input_device
+        self.output_device_id = output_device
+        self.samplerate = samplerate
+        self.channels = channels
+        self.input_channels = input_channels
+        self.rules = rules
+        self.cache_path = cache_path
+        self.rescan = rescan
+        self.selector = None
+        self.settings = {}
+        self._resolved = False
+    
+    def devices(self):
+        """(input, output) device ids, choosing them on first use"""
+        if not self._resolved:
+            self._discover_devices()
+            self._resolved = True
+        return self.input_device_id, self.output_device_id
+    
+    def _discover_devices(self):
+        import sounddevice as sd
+        from .devices import DeviceSelector
+        
+        self.selector = DeviceSelector(sd, self.samplerate, self.channels, self.rules,
+                                       self.cache_path, self.rescan, self.input_channels)
+        self.settings['input'] = self.selector.select('input', self.input_device_id)
+        self.settings['output'] = self.selector.select('output', self.output_device_id)
+        self.input_device_id = self.settings['input']['index']
+        self.output_device_id = self.settings['output']['index']
+        print(f"Audio devices ready - Input: {self.input_device_id}, Output: {self.output_device_id}")
+    
+    def probe_block_sizes(self, seconds=1.0):
+        """Find and cache the smallest stable block size of both devices"""
+        self.devices()
+        for kind in ('input', 'output'):
+            block_size = self.selector.probe(kind, self.settings[kind], seconds=seconds)
+            print(f"Smallest stable {kind} block size: {block_size}")
+        return self.settings['input']['block_size'], self.settings['output']['block_size']
+    
+    def _stream_settings(self, kind):
+        """latency and blocksize arguments for a stream on a kind's device"""
+        settings = self.settings[kind]
+        return settings['latency'] or 'low', settings['block_size'] or 0
+    
+    def input_stream(self, samplerate, channels, dtype, callback):
+        """Create (not start) an input stream"""
+        import sounddevice as sd
+        device = self.devices()[0]
+        latency, blocksize = self._stream_settings('input')
+        return sd.InputStream(
+            device=device,
+            samplerate=samplerate,
+            channels=channels,
+            dtype=dtype,
+            callback=callback,
+            latency=latency,
+            blocksize=blocksize
+        )
+    
+    def output_stream(self, samplerate, channels, dtype, callback):
+        """Create (not start) an output stream"""
+        import sounddevice as sd
+        device = self.devices()[1]
+        latency, blocksize = self._stream_settings('output')
+        return sd.OutputStream(
+            device=device,
+            samplerate=samplerate,
+            channels=channels,
+            dtype=dtype,
+            callback=callback,
+            latency=latency,
+            blocksize=blocksize
+        )
+    
+    def duplex_stream(self, samplerate, channels, dtype, callback):
+        """Create (not start) a full-duplex stream with one callback"""
+        import sounddevice as sd
+        devices = self.devices()
+        input_latency, input_block = self._stream_settings('input')
+        output_latency, output_block = self._stream_settings('output')
+        # One callback serves both directions: use a block size both
+        # devices were probed stable at, else let PortAudio choose
+        blocksize = max(input_block, output_block) if input_block and output_block else 0
+        return sd.Stream(
+            device=devices,
+            samplerate=samplerate,
+            channels=channels,
+            dtype=dtype,
+            callback=callback,
+            latency=(input_latency, output_latency),
+            blocksize=blocksize
+        )
+
+class NullStream:
+    """Stream stand-in whose callback is driven by a NullBackend
+    
+    As with sounddevice, a duplex stream's channels can be (input, output).
+    """
+    def __init__(self, backend, kind, samplerate, channels, dtype, callback, latency=0.0):
+        self.backend = backend
+        self.kind = kind
+        self.latency = latency
+        self.samplerate = samplerate
+        self.channels = channels
+        if isinstance(channels, tuple):
+            self.input_channels, self.output_channels = channels
+        else:
+            self.input_channels = self.output_channels = channels
+        self.dtype = dtype
+        self.callback = callback
+        self.active = False
+        self.closed = False
+    
+    def start(self):
+        self.active = True
+        self.backend.streams.append(self)
+    
+    def stop(self):
+        self.active = False
+        if self in self.backend.streams:
+            self.backend.streams.remove(self)
+    
+    def close(self):
+        self.stop()
+        self.closed = True
+
+class NullBackend:
+    """Offline backend with no audio hardware
+    
+    Streams only run when run() is called, which drives every started
+    callback block by block from a synthetic clock, as fast as the CPU
+    allows. Input callbacks get audio from input_signal (silence after it
+    runs out); output blocks can be collected into an array.
+    
+    Duplex streams report latency (input, output) in seconds. With
+    loopback=True their input is their own output delayed by that round
+    trip, like a cable from the output back into the input, which lets
+    tests check that overdubs land sample-accurately.
+    """
+    def __init__(self, blocksize=256, input_signal=None, latency=(0.0, 0.0), loopback=False):
+        self.blocksize = blocksize
+        self.input_signal = input_signal
+        self.latency = latency
+        self.loopback = loopback
+        self._delay_line = None
+        self.input_position = 0
+        self.frames_elapsed = 0
+        self.streams = []
+        self._status = CallbackStatus()
+        # Block buffers by (kind, frames, channels), kept across run() calls
+        self._buffers = {}
+    
+    def devices(self):
+        return None, None
+    
+    def input_stream(self, samplerate, channels, dtype, callback):
+        return NullStream(self, 'input', samplerate, channels, dtype, callback)
+    
+    def output_stream(self, samplerate, channels, dtype, callback):
+        return NullStream(self, 'output', samplerate, channels, dtype, callback)
+    
+    def duplex_stream(self, samplerate, channels, dtype, callback):
+        return NullStream(self, 'duplex', samplerate, channels, dtype, callback,
+                          latency=self.latency)
+    
+    def _run_duplex(self, stream, indata, outdata):
+        """One block of a duplex stream, feeding output back in if looped back"""
+        count = len(indata)
+        if self.loopback:
+            delay = int(round(sum(self.latency) * stream.samplerate))
+            if delay < count:
+                raise ValueError("Loopback round trip must be at least one block")
+            if self._delay_line is None:
+                self._delay_line = np.zeros((delay, stream.output_channels), dtype=stream.dtype)
+            # A mono input hears the first output channel
+            indata[:] = self._delay_line[:count, :stream.input_channels]
+        stream.callback(indata, outdata, count, StreamTime(self.frames_elapsed / stream.samplerate),
+                        self._status)
+        if self.loopback:
+            self._delay_line = np.concatenate((self._delay_line[count:], outdata))
+    
+    def _read_input(self, indata):
+        """Fill indata from input_signal, padding with silence"""
+        indata.fill(0)
+        if self.input_signal is None:
+            return
+        available = len(self.input_signal) - self.input_position
+        count = max(0, min(len(indata), available))
+        if count:
+            indata[:count] = self.input_signal[self.input_position:self.input_position + count]
+        self.input_position += len(indata)
+    
+    def run(self, frames, output=None):
+        """Advance the clock by frames, calling the active stream callbacks
+        
+        If output is given (frames x channels), the blocks produced by the
+        output streams are written into it. Returns the frames processed.
+        """
+        buffers = self._buffers
+        done = 0
+        while done < frames:
+            count = min(self.blocksize, frames - done)
+            now = StreamTime(self.frames_elapsed / self._samplerate())
+            consumed_input = False
+            
+            # Snapshot the list: callbacks may start or stop streams
+            for stream in list(self.streams):
+                channels = (stream.output_channels if stream.kind == 'output'
+                            else stream.input_channels)
+                key = (stream.kind, count, channels)
+                if key not in buffers:
+                    buffers[key] = np.zeros((count, channels), dtype=stream.dtype)
+                block = buffers[key]
+                if stream.kind == 'output':
+                    stream.callback(block, count, now, self._status)
+                    if output is not None:
+                        output[done:done + count] = block
+                    continue
+                
+                if not consumed_input:
+                    self._read_input(block)
+                    consumed_input = True
+                if stream.kind == 'input':
+                    stream.callback(block, count, now, self._status)
+                else:
+                    outkey = ('duplex_out', count, stream.output_channels)
+                    if outkey not in buffers:
+                        buffers[outkey] = np.zeros((count, stream.output_channels),
+                                                   dtype=stream.dtype)
+                    self._run_duplex(stream, block, buffers[outkey])
+                    if output is not None:
+                        output[done:done + count] = buffers[outkey]
+            
+            if not consumed_input and self.input_signal is not None:
+                self.input_position += count
+            self.frames_elapsed += count
+            done += count
+        return done
+    
+    def _samplerate(self):
+        for stream in self.streams:
+            return stream.samplerate
+        return 44100
@@ -0,0 +1,121 @@
+import argparse
+import os
+import time
+from .render import render_sessions, output_path_for
+
+def render_command(args):
+    multiple = len(args.sessions) > 1
+    if multiple and args.output:
+        os.makedirs(args.output, exist_ok=True)
+    
+    jobs = [(path, output_path_for(path, args.output, multiple), args.block_size, args.repeats,
+             65536, args.sample_rate)
+            for path in args.sessions]
+    
+    t0 = time.perf_counter()
+    total_seconds = 0.0
+    for result in render_sessions(jobs, workers=args.jobs):
+        total_seconds += result['seconds']
+        factor = result['seconds'] / result['elapsed'] if result['elapsed'] else float('inf')
+        print(f"{result['output']}: {result['seconds']:.2f} s of audio in "
+              f"{result['elapsed']:.3f} s ({factor:.1f}x realtime)")
+    
+    if multiple:
+        elapsed = time.perf_counter() - t0
+        print(f"Rendered {len(jobs)} sessions, {total_seconds:.2f} s of audio in "
+              f"{elapsed:.3f} s ({total_seconds / elapsed:.1f}x realtime overall)")
+
+def devices_command(args):
+    import sounddevice as sd
+    from .backends import SoundDeviceBackend
+    from .devices import cache_path
+    
+    path = args.cache or cache_path()
+    print(sd.query_devices())
+    print(f"\nDevice cache: {path}")
+    backend = SoundDeviceBackend(args.input_device, args.output_device, cache_path=path,
+                                 rescan=args.rescan)
+    backend.devices()
+    if args.probe:
+        backend.probe_block_sizes(seconds=args.seconds)
+    for kind, settings in backend.settings.items():
+        print(f"{kind.capitalize()}: {settings['name']} ({settings['hostapi']}), "
+              f"latency {settings['latency'] * 1000:.1f} ms, "
+              f"block size {settings['block_size'] or 'not probed'}")
+
+def serve_command(args):
+    from .engine import MultiTrackLooper
+    from .control import ControlServer, parse_address, run_headless
+    looper = MultiTrackLooper(num_tracks=args.tracks, sample_rate=args.sample_rate,
+                              channels=args.channels, input_channels=args.input_channels,
+                              compact=args.compact)
+    server = ControlServer(looper, **parse_address(args.control)).start()
+    run_headless(looper, server)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='audioloop', description="Multi-track audio looper")
+    commands = parser.add_subparsers(dest='command')
+    
+    gui = commands.add_parser('gui', help="run the looper GUI (default)")
+    gui.add_argument('--tracks', type=int, default=4, help="number of tracks")
+    gui.add_argument('--sample-rate', type=int, default=44100, help="sample rate (default 44100)")
+    gui.add_argument('--channels', type=int, default=2, help="output channels (default 2)")
+    gui.add_argument('--input-channels', type=int, default=None,
+                     help="recording input channels, e.g. 1 for a mono mic (default: --channels)")
+    gui.add_argument('--compact', choices=['int16', 'float16'], default=None,
+                     help="keep tracks quantized, in about half the memory")
+    gui.add_argument('--control', metavar='PORT_OR_PATH', default=None,
+                     help="also serve remote control on a local TCP port or Unix socket")
+    
+    serve = commands.add_parser('serve', help="run the looper without a GUI, under remote control")
+    serve.add_argument('--control', metavar='PORT_OR_PATH', default='9000',
+                       help="local TCP port or Unix socket path (default 9000)")
+    serve.add_argument('--tracks', type=int, default=4, help="number of tracks")
+    serve.add_argument('--sample-rate', type=int, default=44100,
+                       help="sample rate (default 44100)")
+    serve.add_argument('--channels', type=int, default=2, help="output channels (default 2)")
+    serve.add_argument('--input-channels', type=int, default=None,
+                       help="recording input channels (default: --channels)")
+    serve.add_argument('--compact', choices=['int16', 'float16'], default=None,
+                       help="keep tracks quantized, in about half the memory")
+    
+    render = commands.add_parser('render', help="render sessions to WAV without a sound card")
+    render.add_argument('sessions', nargs='+', help="session JSON files")
+    render.add_argument('-o', '--output',
+                        help="output WAV file, or directory when rendering several sessions")
+    render.add_argument('--block-size', type=int, default=256,
+                        help="frames per audio callback (default 256)")
+    render.add_argument('--repeats', type=int, default=1, help="loop passes to render")
+    render.add_argument('--sample-rate', type=int, default=None,
+                        help="output sample rate (default: the session's)")
+    render.add_argument('-j', '--jobs', type=int, default=None,
+                        help="worker processes for several sessions (default: CPU count)")
+    
+    devices = commands.add_parser('devices', help="show, choose and probe the audio devices")
+    devices.add_argument('--rescan', action='store_true',
+                         help="choose the devices again instead of using the cached ones")
+    devices.add_argument('--input-device', type=int, default=None,
+                         help="use this input device index instead of the cached one")
+    devices.add_argument('--output-device', type=int, default=None,
+                         help="use this output device index instead of the cached one")
+    devices.add_argument('--probe', action='store_true',
+                         help="find the smallest stable block size of each device")
+    devices.add_argument('--seconds', type=float, default=1.0,
+                         help="how long each block size is tried when probing (default 1)")
+    devices.add_argument('--cache', help="device cache file (default: per-user config)")
+    
+    args = parser.parse_args(argv)
+    if args.command == 'render':
+        render_command(args)
+    elif args.command == 'devices':
+        devices_command(args)
+    elif args.command == 'serve':
+        serve_command(args)
+    else:
+        from .gui import main as gui_main
+        gui_main(num_tracks=getattr(args, 'tracks', 4),
+                 sample_rate=getattr(args, 'sample_rate', 44100),
+                 channels=getattr(args, 'channels', 2),
+                 input_channels=getattr(args, 'input_channels', None),
+                 compact=getattr(args, 'compact', None),
+                 control=getattr(args, 'control', None))
@@ -0,0 +1,413 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+from .session import save_session
+
+# Remote control over a local socket: JSON objects, one per line, each
+# answered by one line.
+#
+#   {"id": 1, "cmd": "volume", "track": 0, "value": 0.5}
+#   -> {"id": 1, "ok": true, "result": null}
+#   {"id": 2, "batch": [{"cmd": "mute", "track": 1}, {"cmd": "volume", "track": 2, "value": 1}]}
+#   -> {"id": 2, "ok": true, "result": [null, null]}
+#   {"cmd": "subscribe", "meters": true}
+#   ... {"event": "state", "state": {...}}  {"event": "meters", "position": ..., ...}
+#
+# Meter updates carry peak and rms lists: the tracks, then the master
+# output and the recording input (see meters.py).
+#
+# Commands: record (track), stop (the take, else playback), play, mute
+# (track, optional muted), volume (track, value), clear (track), save
+# (path for a mix WAV written in the background, or session for a session
+# directory), scene (name), stats, state, subscribe (optional meters) and
+# unsubscribe.
+#
+# The socket is served by an asyncio loop on a thread of its own, which
+# only parses requests and queues them (a bounded queue: a full one
+# answers "busy"). The thread that owns the looper (the GUI's, or
+# run_headless) runs them in process(); a batch runs inside
+# looper.batch(), so all of its changes reach the audio callback in one
+# snapshot, on the same block. The audio thread does no extra work.
+#
+# Every command of a batch is checked before any of it runs, against the
+# transport and tracks the commands before it would leave (see _plan), so
+# a batch that fails its checks changes nothing.
+
+# Requests waiting for process()
+CONTROL_QUEUE = 256
+# Bytes queued to a subscriber past which meter updates to it are dropped
+SUBSCRIBER_BACKLOG = 64 * 1024
+
+# Keys of events.py that are ticks rather than changes of state
+TICKS = ('playhead', 'take', 'meters', 'stats')
+
+# Fields each command needs
+COMMAND_FIELDS = {
+    'record': ('track',),
+    'mute': ('track',),
+    'volume': ('track', 'value'),
+    'clear': ('track',),
+    'scene': ('name',),
+}
+
+class ControlError(Exception):
+    """A request that can't be carried out; sent back as its error"""
+
+class ControlServer:
+    """JSON-lines control server for a looper on a local TCP or Unix socket
+    
+    Listens on host:port (port 0 picks a free one; see address), or on the
+    Unix socket path if given.
+    """
+    def __init__(self, looper, host='127.0.0.1', port=0, path=None, max_queue=CONTROL_QUEUE):
+        self.looper = looper
+        self.host = host
+        self.port = port
+        self.path = path
+        self.address = None
+        self.requests = queue.Queue(maxsize=max_queue)
+        self.subscribers = {}
+        self.events = looper.events.listener()
+        self._loop = None
+        self._thread = None
+        self._error = None
+    
+    def start(self):
+        """Start serving on a thread of its own; returns once listening"""
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+        if self._error is not None:
+            raise self._error
+        print(f"Control server listening on {self.address}")
+        return self
+    
+    def stop(self):
+        """Close the server and every connection"""
+        if self._loop is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self.looper.events.remove_listener(self.events)
+    
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+    
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        try:
+            if self.path is not None:
+                server = self._loop.run_until_complete(
+                    asyncio.start_unix_server(self._client, path=self.path))
+                self.address = self.path
+            else:
+                server = self._loop.run_until_complete(
+                    asyncio.start_server(self._client, self.host, self.port))
+                self.address = server.sockets[0].getsockname()[:2]
+        except Exception as e:
+            self._error = e
+            ready.set()
+            self._loop.close()
+            return
+        ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            server.close()
+            for writer in list(self.subscribers):
+                writer.close()
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+    
+    async def _client(self, reader, writer):
+        """Answer one connection's requests in order"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as e:
+                    self._send(writer, {'ok': False, 'error': f"Bad request: {e}"})
+                    continue
+                reply = self._loop.create_future()
+                try:
+                    self.requests.put_nowait((request, writer, reply))
+                except queue.Full:
+                    reply.set_result(_reply(request, error="busy"))
+                self._send(writer, await reply)
+        except (ConnectionError, asyncio.CancelledError):
+            # Gone, or the server is stopping
+            pass
+        finally:
+            self.subscribers.pop(writer, None)
+            writer.close()
+    
+    def _send(self, writer, message, droppable=False):
+        """Write a message line (on the loop's thread)"""
+        if writer.is_closing():
+            return
+        if droppable and writer.transport.get_write_buffer_size() > SUBSCRIBER_BACKLOG:
+            return
+        writer.write(json.dumps(message).encode() + b'\n')
+    
+    def process(self, max_requests=None):
+        """Run the queued requests and push updates to subscribers
+        
+        Call regularly from the thread that owns the looper (the GUI does
+        every frame). Returns how many requests were run.
+        """
+        count = 0
+        while max_requests is None or count < max_requests:
+            try:
+                request, writer, reply = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            message = self._execute(request, writer)
+            self._loop.call_soon_threadsafe(_resolve, reply, message)
+            count += 1
+        
+        dirty = self.events.take()
+        if self.subscribers and (count or any(key not in TICKS for key in dirty)):
+            self._push({'event': 'state', 'state': self.state()})
+        if self.subscribers and 'meters' in dirty:
+            meters = self.looper.meters
+            self._push({'event': 'meters', 'position': self.looper.playback_position,
+                        'peak': meters.peak.tolist(), 'rms': meters.rms.tolist()}, meters=True)
+        return count
+    
+    def _push(self, message, meters=False):
+        for writer, wants_meters in list(self.subscribers.items()):
+            if wants_meters or not meters:
+                self._loop.call_soon_threadsafe(self._send, writer, message, meters)
+    
+    def _execute(self, request, writer):
+        """Run a request (or batch) and build its reply"""
+        try:
+            if 'batch' in request:
+                commands = request['batch']
+                if not isinstance(commands, list):
+                    raise ControlError("batch must be a list of commands")
+                plan = self._plan()
+                handlers = [self._command(command, plan) for command in commands]
+                with self.looper.batch():
+                    result = [handler(command, writer)
+                              for handler, command in zip(handlers, commands)]
+            else:
+                result = self._run_command(request, writer)
+        except Exception as e:
+            return _reply(request, error=str(e) or type(e).__name__)
+        return _reply(request, result=result)
+    
+    def _command(self, command, plan):
+        """The handler of a command, checking it against plan (see _plan)
+        
+        The command's own check, if it has one, updates plan to the state
+        the command will leave, so the next command of a batch is checked
+        against that.
+        """
+        if not isinstance(command, dict):
+            raise ControlError("a command must be a JSON object")
+        name = command.get('cmd')
+        handler = getattr(self, f'_do_{name}', None) if isinstance(name, str) else None
+        if handler is None:
+            raise ControlError(f"Unknown command {name!r}")
+        for field in COMMAND_FIELDS.get(name, ()):
+            if field not in command:
+                raise ControlError(f"{name} needs {field!r}")
+        if 'track' in command:
+            track = command['track']
+            if not isinstance(track, int) or not 0 <= track < self.looper.num_tracks:
+                raise ControlError(f"No track {track!r}")
+        check = getattr(self, f'_check_{name}', None)
+        if check is not None:
+            check(command, plan)
+        return handler
+    
+    def _run_command(self, command, writer):
+        return self._command(command, self._plan())(command, writer)
+    
+    def _plan(self):
+        """The looper state the command checks go by, as it is now"""
+        looper = self.looper
+        return {
+            'playing': looper.playing,
+            'recording': looper.recording,
+            'tracks': {i for i in range(looper.num_tracks) if looper.tracks[i] is not None},
+            'scene_pending': looper.scene_pending(),
+            'exporting': looper.export_job is not None and looper.export_job.running(),
+        }
+    
+    def state(self):
+        """What subscribers are sent: the transport and every track's mixer"""
+        looper = self.looper
+        return {
+            'playing': looper.playing,
+            'recording': looper.recording,
+            'current_track': looper.current_track,
+            'loop_length': looper.master_length,
+            'sample_rate': looper.sample_rate,
+            'scene': looper.scene,
+            'tracks': [{'present': looper.tracks[i] is not None,
+                        'volume': float(looper.track_volumes[i]),
+                        'muted': not looper.track_enabled[i]}
+                       for i in range(looper.num_tracks)],
+        }
+    
+    # Commands: each gets the command object and the client's writer, and
+    # returns the reply's result. _check_<command> raises ControlError for a
+    # command that would fail, before anything runs, and updates the plan
+    # (see _plan) to what it will do.
+    
+    def _check_record(self, command, plan):
+        if plan['recording']:
+            raise ControlError("Already recording")
+        if plan['scene_pending']:
+            raise ControlError("Can't record while a scene change is pending")
+        plan['recording'] = True
+    
+    def _do_record(self, command, writer):
+        if self.looper.recording:
+            raise ControlError("Already recording")
+        self.looper.start_recording(command['track'])
+        if not self.looper.recording:
+            raise ControlError("Recording did not start")
+    
+    def _check_stop(self, command, plan):
+        if plan['recording']:
+            # A duplex take is only stored after a later audio block
+            plan['recording'] = self.looper.duplex_stream is not None
+        else:
+            plan['playing'] = False
+    
+    def _do_stop(self, command, writer):
+        if self.looper.recording:
+            self.looper.stop_recording()
+        elif self.looper.playing:
+            self.looper.toggle_playback()
+    
+    def _check_play(self, command, plan):
+        if not plan['tracks']:
+            raise ControlError("Nothing to play")
+        plan['playing'] = True
+    
+    def _do_play(self, command, writer):
+        if not self.looper.playing:
+            self.looper.toggle_playback()
+        if not self.looper.playing:
+            raise ControlError("Nothing to play")
+    
+    def _check_mute(self, command, plan):
+        if not isinstance(command.get('muted', False), bool):
+            raise ControlError("muted must be true or false")
+    
+    def _do_mute(self, command, writer):
+        track = command['track']
+        muted = command.get('muted', self.looper.track_enabled[track])
+        if muted == self.looper.track_enabled[track]:
+            self.looper.toggle_track(track)
+    
+    def _check_volume(self, command, plan):
+        value = command['value']
+        if (not isinstance(value, (int, float)) or isinstance(value, bool)
+                or not 0.0 <= value <= 1.0):
+            raise ControlError("volume must be a number between 0 and 1")
+    
+    def _do_volume(self, command, writer):
+        self.looper.set_track_volume(command['track'], float(command['value']))
+    
+    def _check_clear(self, command, plan):
+        plan['tracks'].discard(command['track'])
+    
+    def _do_clear(self, command, writer):
+        self.looper.clear_track(command['track'])
+    
+    def _check_save(self, command, plan):
+        if 'session' in command:
+            return
+        if 'path' not in command:
+            raise ControlError("save needs 'path' (a mix) or 'session' (a directory)")
+        if not plan['tracks'] or plan['exporting']:
+            raise ControlError("Nothing to save, or a mix is already being saved")
+        plan['exporting'] = True
+    
+    def _do_save(self, command, writer):
+        if 'session' in command:
+            return save_session(self.looper, command['session'])
+        job = self.looper.start_export(command['path'])
+        if job is None:
+            raise ControlError("Nothing to save, or a mix is already being saved")
+        return job.filepath
+    
+    def _check_scene(self, command, plan):
+        if command['name'] not in self.looper.scenes:
+            raise ControlError(f"No scene named {command['name']!r}")
+        if plan['recording']:
+            raise ControlError("Can't change scene while recording")
+        if self.looper.scene is None and plan['tracks']:
+            raise ControlError("Save the current tracks as a scene first")
+        plan['scene_pending'] = True
+    
+    def _do_scene(self, command, writer):
+        self.looper.queue_scene(command['name'])
+    
+    def _do_stats(self, command, writer):
+        return self.looper.callback_stats()
+    
+    def _do_state(self, command, writer):
+        return self.state()
+    
+    def _do_subscribe(self, command, writer):
+        self.subscribers[writer] = bool(command.get('meters', False))
+        return self.state()
+    
+    def _do_unsubscribe(self, command, writer):
+        self.subscribers.pop(writer, None)
+
+def parse_address(text):
+    """ControlServer arguments for a port number or a Unix socket path"""
+    if text.isdigit():
+        return {'port': int(text)}
+    return {'path': text}
+
+def _reply(request, result=None, error=None):
+    reply = {'ok': error is None}
+    if error is None:
+        reply['result'] = result
+    else:
+        reply['error'] = error
+    if 'id' in request:
+        reply['id'] = request['id']
+    return reply
+
+def _resolve(future, message):
+    # The client may have gone, cancelling its wait
+    if not future.done():
+        future.set_result(message)
+
+def run_headless(looper, server, interval=0.005):
+    """Own the looper on this thread with no GUI, until interrupted
+    
+    Does what the GUI's frame loop would: runs the server's requests and
+    the looper's per-frame upkeep every interval seconds.
+    """
+    try:
+        while server.running():
+            looper.update_recording()
+            looper.update_scenes()
+            looper.poll_events()
+            server.process()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
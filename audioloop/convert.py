@@ -0,0 +1,106 @@
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Converting imported audio to the looper's sample rate and channel count.
+# This happens once, when audio is loaded, never in the audio callbacks.
+
+# Zero crossings of the windowed sinc on each side of its centre, at the
+# lower of the two rates, and the Kaiser window's beta (about -90 dB
+# stopband)
+RESAMPLE_ZEROS = 24
+RESAMPLE_BETA = 9.0
+# Cutoff as a share of the lower rate's Nyquist frequency
+RESAMPLE_ROLLOFF = 0.94
+# Output frames computed per vectorized step, bounding the scratch memory
+RESAMPLE_CHUNK = 32768
+
+_filter_banks = {}
+
+def resample_filter(up, down):
+    """Polyphase bank (up, taps) of the anti-aliasing filter for up/down
+    
+    Row p holds the taps applied for output samples falling p/up of the way
+    between two input samples, reversed to line up with a window of the
+    input. Each row is scaled to a DC gain of exactly 1.
+    """
+    key = (up, down)
+    if key not in _filter_banks:
+        # Designed at the up-sampled rate: cutoff at the lower Nyquist
+        factor = max(up, down)
+        cutoff = RESAMPLE_ROLLOFF / factor
+        half = RESAMPLE_ZEROS * factor
+        n = np.arange(-half, half + 1, dtype=np.float64)
+        h = cutoff * np.sinc(cutoff * n) * np.kaiser(len(n), RESAMPLE_BETA)
+        taps = -(-len(h) // up)
+        h = np.concatenate((h, np.zeros(taps * up - len(h))))
+        bank = h.reshape(taps, up).T[:, ::-1]
+        bank = bank / bank.sum(axis=1, keepdims=True)
+        _filter_banks[key] = (np.ascontiguousarray(bank, dtype=np.float32), half)
+    return _filter_banks[key]
+
+def _ratio(from_rate, to_rate):
+    gcd = math.gcd(int(from_rate), int(to_rate))
+    return int(to_rate) // gcd, int(from_rate) // gcd
+
+def resampled_frames(frames, from_rate, to_rate):
+    """Length of frames of audio once resampled from from_rate to to_rate"""
+    up, down = _ratio(from_rate, to_rate)
+    return (frames * up + down // 2) // down
+
+def resample(audio, from_rate, to_rate):
+    """Resample (frames, channels) float audio from from_rate to to_rate
+    
+    Polyphase FIR: the rates' ratio is reduced to up/down, and output
+    frame n is the windowed-sinc filter's dot product with the input
+    frames around n * down / up, picking the filter phase for where it
+    falls between two input frames. Computed with NumPy over whole chunks
+    of output frames at once. The output has round(frames * up / down)
+    frames and is aligned with the input (no delay).
+    """
+    if from_rate == to_rate:
+        return audio
+    up, down = _ratio(from_rate, to_rate)
+    bank, half = resample_filter(up, down)
+    taps = bank.shape[1]
+    
+    audio = np.asarray(audio, dtype=np.float32)
+    frames, channels = audio.shape
+    out_frames = resampled_frames(frames, from_rate, to_rate)
+    out = np.empty((out_frames, channels), dtype=np.float32)
+    
+    # Input padded with silence on both sides, and every window of taps
+    # frames of it (a strided view, nothing copied yet)
+    padded = np.zeros((frames + 2 * taps, channels), dtype=np.float32)
+    padded[taps:taps + frames] = audio
+    windows = sliding_window_view(padded, taps, axis=0)
+    
+    for start in range(0, out_frames, RESAMPLE_CHUNK):
+        n = np.arange(start, min(start + RESAMPLE_CHUNK, out_frames), dtype=np.int64)
+        # Position of output frame n on the up-sampled grid, centred on
+        # the filter, and the last input frame it reaches
+        t = n * down + half
+        last = t // up
+        phases = t % up
+        # Window ending at input frame last starts at padded index last + 1
+        chunk = windows[last + 1]
+        np.einsum('nct,nt->nc', chunk, bank[phases], out=out[n[0]:n[-1] + 1])
+    return out
+
+def fit_channels(audio, channels):
+    """audio with at most channels channels, keeping mono as mono
+    
+    Mono stays one channel (the mixer spreads it over every output
+    channel). Extra channels are dropped, or averaged down for a mono
+    looper.
+    """
+    if audio.ndim == 1:
+        audio = audio[:, None]
+    have = audio.shape[1]
+    if have == 1 or have == channels:
+        return audio
+    if have < channels:
+        raise ValueError(f"{have} channels can't be spread over {channels}")
+    if channels == 1:
+        return audio.mean(axis=1, keepdims=True, dtype=np.float32)
+    return audio[:, :channels]
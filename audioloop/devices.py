@@ -0,0 +1,245 @@
+import json
+import os
+import sys
+import time
+
+# Device selection rules: (host API, device name) substrings, matched
+# case-insensitively and tried in order; None matches anything. The first
+# device that matches a rule and supports the stream settings is used,
+# otherwise the system default. Rules under "rules" in the cache file are
+# tried before these.
+DEFAULT_RULES = {
+    'input': [
+        ('JACK', None),         # a running JACK (or PipeWire-JACK) server
+        ('ALSA', 'pipewire'),
+        ('ALSA', 'pulse'),
+        ('DirectSound', 'External Microphone'),
+        ('DirectSound', 'Microphone'),
+    ],
+    'output': [
+        ('JACK', None),
+        ('ALSA', 'pipewire'),
+        ('ALSA', 'pulse'),
+        ('DirectSound', 'Headphones'),
+    ],
+}
+
+# Block sizes tried by probe_block_size, smallest first
+PROBE_BLOCK_SIZES = (32, 64, 128, 256, 512, 1024, 2048)
+
+KIND_CHANNELS = {'input': 'max_input_channels', 'output': 'max_output_channels'}
+KIND_LATENCY = {'input': 'default_low_input_latency', 'output': 'default_low_output_latency'}
+
+def cache_path():
+    """Where the chosen devices are remembered ($AUDIOLOOP_DEVICES overrides)"""
+    if os.environ.get('AUDIOLOOP_DEVICES'):
+        return os.environ['AUDIOLOOP_DEVICES']
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA', os.path.expanduser('~'))
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME', os.path.join(os.path.expanduser('~'), '.config'))
+    return os.path.join(base, 'audioloop', 'devices.json')
+
+def load_cache(path):
+    """The cache file's contents, or {} if it is missing or unreadable"""
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+def save_cache(cache, path):
+    """Write the cache atomically, so a crash never leaves half a file"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=4)
+    os.replace(tmp_path, path)
+
+def _matches(text, pattern):
+    return pattern is None or pattern.lower() in text.lower()
+
+def match_device(devices, hostapis, kind, rules, usable=None):
+    """Index of the first device matching one of rules, or None
+    
+    devices and hostapis are as from sounddevice's query_devices() and
+    query_hostapis(). usable(index) can reject devices that match but
+    cannot open the stream.
+    """
+    for hostapi_rule, name_rule in rules:
+        for i, device in enumerate(devices):
+            if device[KIND_CHANNELS[kind]] <= 0:
+                continue
+            if not (_matches(hostapis[device['hostapi']]['name'], hostapi_rule)
+                    and _matches(device['name'], name_rule)):
+                continue
+            if usable is None or usable(i):
+                return i
+    return None
+
+class DeviceSelector:
+    """Picks the input and output devices, remembering them between runs
+    
+    The cache file holds, per kind, the device chosen last time with the
+    settings it accepted (sample rate, channels, low latency) and, once
+    probed, its smallest stable block size. On startup the cached device
+    is checked on its own; the device list is only scanned and matched
+    against the rules if it is gone or no longer accepts the settings, or
+    with rescan=True.
+    """
+    def __init__(self, sd, samplerate=44100, channels=2, rules=None, path=None, rescan=False,
+                 input_channels=None):
+        self.sd = sd
+        self.samplerate = samplerate
+        self.channels = channels
+        # Channels each kind of device must offer
+        self.kind_channels = {'input': input_channels or channels, 'output': channels}
+        self.path = path if path is not None else cache_path()
+        self.cache = load_cache(self.path)
+        self.rescan = rescan
+        self.rules = {}
+        for kind in KIND_CHANNELS:
+            user_rules = (rules or {}).get(kind) or self.cache.get('rules', {}).get(kind, [])
+            self.rules[kind] = [tuple(rule) for rule in user_rules] + DEFAULT_RULES[kind]
+        # Whether the last select() had to scan the device list
+        self.scanned = False
+    
+    def select(self, kind, device=None):
+        """Cache entry of the device to use for kind ('input' or 'output')
+        
+        device forces a device index instead of the cache and rules; it is
+        not remembered.
+        """
+        previous = self.cache.get(kind)
+        if device is not None:
+            entry = self._entry(kind, device)
+            if self._same_device(previous, entry):
+                entry['block_size'] = previous.get('block_size')
+            return entry
+        
+        entry = previous
+        if entry is not None and not self.rescan and self._still_valid(kind, entry):
+            print(f"Using cached {kind} device: {entry['name']} ({entry['hostapi']}, "
+                  f"device {entry['index']})")
+            return entry
+        self.scanned = True
+        devices = self.sd.query_devices()
+        hostapis = self.sd.query_hostapis()
+        device = match_device(devices, hostapis, kind, self.rules[kind],
+                              lambda i: self._accepts(kind, i))
+        if device is None:
+            device = self.sd.default.device[0 if kind == 'input' else 1]
+            print(f"Using default {kind} device: {devices[device]['name']}")
+        else:
+            hostapi = hostapis[devices[device]['hostapi']]['name']
+            print(f"Found {kind} device: {devices[device]['name']} ({hostapi}, device {device})")
+        
+        entry = self._entry(kind, device)
+        if self._same_device(previous, entry):
+            # Same device at a new index: keep what was probed for it
+            entry['block_size'] = previous.get('block_size')
+        self.cache[kind] = entry
+        self.save()
+        return entry
+    
+    def _same_device(self, entry, other):
+        return (entry is not None and entry.get('name') == other['name']
+                and entry.get('hostapi') == other['hostapi'])
+    
+    def save(self):
+        try:
+            save_cache(self.cache, self.path)
+        except OSError as e:
+            print(f"Could not save the device cache: {e}")
+    
+    def _entry(self, kind, index):
+        info = self.sd.query_devices(index)
+        return {
+            'index': index,
+            'name': info['name'],
+            'hostapi': self.sd.query_hostapis(info['hostapi'])['name'],
+            'samplerate': self.samplerate,
+            'channels': self.kind_channels[kind],
+            'latency': info[KIND_LATENCY[kind]],
+            'block_size': None,
+        }
+    
+    def _accepts(self, kind, index):
+        """True if the device opens with our stream settings"""
+        check = (self.sd.check_input_settings if kind == 'input'
+                 else self.sd.check_output_settings)
+        try:
+            check(device=index, samplerate=self.samplerate, channels=self.kind_channels[kind],
+                  dtype='float32')
+        except Exception:
+            return False
+        return True
+    
+    def _still_valid(self, kind, entry):
+        """Whether a cached device is still there, unchanged, with the same settings"""
+        channels = self.kind_channels[kind]
+        if entry.get('samplerate') != self.samplerate or entry.get('channels') != channels:
+            return False
+        try:
+            info = self.sd.query_devices(entry['index'])
+            hostapi = self.sd.query_hostapis(info['hostapi'])['name']
+        except Exception:
+            return False
+        return (info['name'] == entry['name'] and hostapi == entry['hostapi']
+                and info[KIND_CHANNELS[kind]] >= channels
+                and self._accepts(kind, entry['index']))
+    
+    def probe(self, kind, entry=None, sizes=PROBE_BLOCK_SIZES, seconds=1.0):
+        """Find, cache and return the smallest stable block size of a kind's device
+        
+        entry is the device to probe, as returned by select (default: the
+        cached one). The result is only cached if it is the cached device.
+        """
+        if entry is None:
+            entry = self.cache.get(kind) or self.select(kind)
+        block_size = probe_block_size(self.sd, kind, entry['index'], self.samplerate,
+                                      self.kind_channels[kind], sizes, seconds)
+        entry['block_size'] = block_size
+        cached = self.cache.get(kind)
+        if self._same_device(cached, entry):
+            cached['block_size'] = block_size
+            self.save()
+        return block_size
+
+def probe_block_size(sd, kind, device, samplerate, channels, sizes=PROBE_BLOCK_SIZES,
+                     seconds=1.0):
+    """Smallest block size a device runs for seconds without an xrun, or None
+    
+    Each size is tried on a stream that plays silence (or discards input),
+    counting the underflow/overflow flags its callback is called with.
+    """
+    for block_size in sizes:
+        state = {'callbacks': 0, 'xruns': 0}
+        
+        if kind == 'input':
+            def callback(indata, frames, time_info, status):
+                state['callbacks'] += 1
+                if status.input_overflow or status.input_underflow:
+                    state['xruns'] += 1
+            stream_class = sd.InputStream
+        else:
+            def callback(outdata, frames, time_info, status):
+                outdata.fill(0)
+                state['callbacks'] += 1
+                if status.output_underflow or status.output_overflow:
+                    state['xruns'] += 1
+            stream_class = sd.OutputStream
+        
+        try:
+            with stream_class(device=device, samplerate=samplerate, channels=channels,
+                              dtype='float32', blocksize=block_size, latency='low',
+                              callback=callback):
+                time.sleep(seconds)
+        except Exception as e:
+            print(f"Block size {block_size}: {e}")
+            continue
+        print(f"Block size {block_size}: {state['callbacks']} callbacks, {state['xruns']} xruns")
+        if state['callbacks'] and not state['xruns']:
+            return block_size
+    return None
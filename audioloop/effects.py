@@ -0,0 +1,369 @@
+import math
+import numpy as np
+
+# Insert effects for the tracks and the master bus. Each effect processes
+# a block in place with NumPy, carrying its state from block to block.
+#
+# An effect's output never depends on how the audio is split into blocks:
+# filters and the compressor work on a fixed grid of EFFECT_CELL frames
+# counted from the start of playback (or of an export), computing every
+# cell with the same NumPy operations whether it arrives whole or in
+# pieces. So live playback and an export of the same mix come out
+# sample-identical, whatever the sound card's block size.
+
+# Frames per cell of the filter/compressor grid
+EFFECT_CELL = 64
+
+# Longest delay time, in seconds, and frames a delay handles per step
+MAX_DELAY_SECONDS = 4.0
+DELAY_STEP_FRAMES = 4096
+
+class Effect:
+    """Base of the insert effects
+    
+    Parameters are given to the constructor or set(); prepare() then fits
+    an effect to a looper's sample rate and channels, computing its
+    coefficients and allocating its state. The audio thread only reads
+    the params tuple that set() replaces as a whole, so parameters can
+    change while the effect plays; the state carries on through the
+    change. process() resets the state by itself when a block does not
+    follow on from the last one (playback restarted).
+    """
+    name = None
+    
+    def __init__(self):
+        self.sample_rate = None
+        self.channels = None
+        self.params = None
+        self._position = None
+    
+    def settings(self):
+        """Parameters as a dict (the constructor's keyword arguments)"""
+        raise NotImplementedError
+    
+    def set(self, **settings):
+        """Change parameters; coefficients are recomputed here, not in process()"""
+        for key, value in settings.items():
+            if key not in self.settings():
+                raise TypeError(f"{type(self).__name__} has no parameter {key!r}")
+            setattr(self, key, value)
+        if self.sample_rate is not None:
+            self.params = self._compute()
+    
+    def prepare(self, sample_rate, channels):
+        """Fit the effect to a sample rate and channel count"""
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._allocate()
+        self.params = self._compute()
+        self._position = None
+        return self
+    
+    def copy(self):
+        """The same effect with fresh state (prepared the same way)"""
+        effect = type(self)(**self.settings())
+        if self.sample_rate is not None:
+            effect.prepare(self.sample_rate, self.channels)
+        return effect
+    
+    def to_dict(self):
+        return dict(type=self.name, **self.settings())
+    
+    def process(self, block, at):
+        """Process (frames, channels) float32 block in place; at is its first frame"""
+        if at != self._position:
+            self.reset()
+        self._position = at + len(block)
+        self._process(block, at, self.params)
+    
+    def reset(self):
+        """Forget the audio played so far"""
+    
+    def _allocate(self):
+        pass
+    
+    def _compute(self):
+        raise NotImplementedError
+    
+    def _process(self, block, at, params):
+        raise NotImplementedError
+
+def biquad_coefficients(kind, freq, q, gain_db, sample_rate):
+    """Normalised (b0, b1, b2, a1, a2) of an RBJ cookbook biquad"""
+    freq = min(max(freq, 1.0), 0.49 * sample_rate)
+    w0 = 2 * math.pi * freq / sample_rate
+    cos_w0, alpha = math.cos(w0), math.sin(w0) / (2 * q)
+    amp = 10 ** (gain_db / 40)
+    if kind == 'lowpass':
+        b = ((1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+    elif kind == 'highpass':
+        b = ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+    elif kind == 'bandpass':
+        b = (alpha, 0.0, -alpha)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+    elif kind == 'notch':
+        b = (1.0, -2 * cos_w0, 1.0)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+    elif kind == 'peak':
+        b = (1 + alpha * amp, -2 * cos_w0, 1 - alpha * amp)
+        a = (1 + alpha / amp, -2 * cos_w0, 1 - alpha / amp)
+    elif kind in ('lowshelf', 'highshelf'):
+        sign = 1 if kind == 'lowshelf' else -1
+        root = 2 * math.sqrt(amp) * alpha
+        b = (amp * ((amp + 1) - sign * (amp - 1) * cos_w0 + root),
+             sign * 2 * amp * ((amp - 1) - sign * (amp + 1) * cos_w0),
+             amp * ((amp + 1) - sign * (amp - 1) * cos_w0 - root))
+        a = ((amp + 1) + sign * (amp - 1) * cos_w0 + root,
+             -sign * 2 * ((amp - 1) + sign * (amp + 1) * cos_w0),
+             (amp + 1) + sign * (amp - 1) * cos_w0 - root)
+    else:
+        raise ValueError(f"Unknown filter type {kind!r}")
+    return (b[0] / a[0], b[1] / a[0], b[2] / a[0], a[1] / a[0], a[2] / a[0])
+
+def biquad_cell_matrix(coefficients, cell=EFFECT_CELL):
+    """(cell + 2) square matrix that runs a biquad over a whole cell at once
+    
+    Applied to a column of the cell's input samples followed by the
+    filter's two state values at the cell start (transposed direct form
+    II), it gives the cell's output samples followed by the state at the
+    cell end. Built by running the recursion once on every basis vector.
+    """
+    b0, b1, b2, a1, a2 = coefficients
+    basis = np.eye(cell + 2)
+    s1, s2 = basis[cell].copy(), basis[cell + 1].copy()
+    matrix = np.empty((cell + 2, cell + 2))
+    for n in range(cell):
+        x = basis[n]
+        y = b0 * x + s1
+        s1, s2 = b1 * x - a1 * y + s2, b2 * x - a2 * y
+        matrix[n] = y
+    matrix[cell] = s1
+    matrix[cell + 1] = s2
+    return matrix
+
+class Biquad(Effect):
+    """Second-order filter: lowpass, highpass, bandpass, notch, peak, lowshelf, highshelf
+    
+    A cell of input is filtered with one matrix product that also carries
+    the filter state to the next cell (see biquad_cell_matrix). Frames of
+    a cell that arrive in pieces are kept until the cell is complete; each
+    piece recomputes the cell so far, with the same product.
+    """
+    name = 'biquad'
+    
+    def __init__(self, kind='peak', freq=1000.0, q=0.707, gain_db=0.0):
+        super().__init__()
+        self.kind = kind
+        self.freq = freq
+        self.q = q
+        self.gain_db = gain_db
+        # Checked now rather than at prepare()
+        biquad_coefficients(kind, freq, q, gain_db, 44100)
+    
+    def settings(self):
+        return {'kind': self.kind, 'freq': self.freq, 'q': self.q, 'gain_db': self.gain_db}
+    
+    def _allocate(self):
+        # Input frames of the current cell, then the state at its start
+        self._cell = np.zeros((EFFECT_CELL + 2, self.channels))
+        self._result = np.zeros((EFFECT_CELL + 2, self.channels))
+    
+    def _compute(self):
+        return biquad_cell_matrix(biquad_coefficients(self.kind, self.freq, self.q,
+                                                      self.gain_db, self.sample_rate))
+    
+    def reset(self):
+        self._cell.fill(0)
+    
+    def _process(self, block, at, matrix):
+        cell, result = self._cell, self._result
+        done = 0
+        while done < len(block):
+            phase = (at + done) % EFFECT_CELL
+            count = min(EFFECT_CELL - phase, len(block) - done)
+            cell[phase:phase + count] = block[done:done + count]
+            np.matmul(matrix, cell, out=result)
+            block[done:done + count] = result[phase:phase + count]
+            if phase + count == EFFECT_CELL:
+                cell[EFFECT_CELL:] = result[EFFECT_CELL:]
+            done += count
+
+class Delay(Effect):
+    """Feedback delay: the input plus mix times its echoes, time seconds apart"""
+    name = 'delay'
+    
+    def __init__(self, time=0.25, feedback=0.35, mix=0.3):
+        super().__init__()
+        if not 0 < time <= MAX_DELAY_SECONDS:
+            raise ValueError(f"Delay time must be above 0 and at most {MAX_DELAY_SECONDS} s")
+        self.time = time
+        self.feedback = feedback
+        self.mix = mix
+        # Newest delay line, and the one playing with its write position
+        self._line = None
+        self._playing = None
+        self._write = 0
+    
+    def settings(self):
+        return {'time': self.time, 'feedback': self.feedback, 'mix': self.mix}
+    
+    def _allocate(self):
+        self._echo = np.zeros((DELAY_STEP_FRAMES, self.channels), dtype=np.float32)
+        self._line = None
+    
+    def _compute(self):
+        length = max(1, round(self.time * self.sample_rate))
+        line = self._line
+        if line is None or len(line) != length:
+            # A new delay line; the audio thread switches over to it
+            line = np.zeros((length, self.channels), dtype=np.float32)
+        self._line = line
+        return (line, np.float32(self.feedback), np.float32(self.mix))
+    
+    def reset(self):
+        if self._line is not None:
+            self._line.fill(0)
+        self._write = 0
+    
+    def _process(self, block, at, params):
+        line, feedback, mix = params
+        if line is not self._playing:
+            self._playing = line
+            self._write = 0
+        write = self._write % len(line)
+        done = 0
+        # Pieces never cross the end of the line, so no frame read in a
+        # piece was written in the same piece
+        while done < len(block):
+            count = min(len(block) - done, len(line) - write, DELAY_STEP_FRAMES)
+            dry = block[done:done + count]
+            echo = self._echo[:count]
+            echo[:] = line[write:write + count]
+            slot = line[write:write + count]
+            np.multiply(echo, feedback, out=slot)
+            slot += dry
+            echo *= mix
+            dry += echo
+            write = (write + count) % len(line)
+            done += count
+        self._write = write
+
+class Pan(Effect):
+    """Constant-power pan of a stereo signal, unity gain at the centre
+    
+    pan runs from -1 (left) to 1 (right). Other channel counts pass through.
+    """
+    name = 'pan'
+    
+    def __init__(self, pan=0.0):
+        super().__init__()
+        self.pan = pan
+    
+    def settings(self):
+        return {'pan': self.pan}
+    
+    def _compute(self):
+        if self.channels != 2:
+            return None
+        angle = (min(max(self.pan, -1.0), 1.0) + 1) * math.pi / 4
+        return np.array([math.cos(angle), math.sin(angle)], dtype=np.float32) * np.float32(math.sqrt(2))
+    
+    def _process(self, block, at, gains):
+        if gains is not None:
+            block *= gains
+
+class Compressor(Effect):
+    """Peak compressor with attack and release, gain computed per cell
+    
+    The peak of each cell of input drives an envelope follower; the gain
+    for the envelope then glides across the next cell. Only whole past
+    cells are used, so the gain of a frame doesn't depend on the blocks.
+    """
+    name = 'compressor'
+    
+    def __init__(self, threshold_db=-18.0, ratio=4.0, attack=0.005, release=0.1, makeup_db=0.0):
+        super().__init__()
+        self.threshold_db = threshold_db
+        self.ratio = ratio
+        self.attack = attack
+        self.release = release
+        self.makeup_db = makeup_db
+    
+    def settings(self):
+        return {'threshold_db': self.threshold_db, 'ratio': self.ratio, 'attack': self.attack,
+                'release': self.release, 'makeup_db': self.makeup_db}
+    
+    def _allocate(self):
+        # Share of the way through the glide at each frame of a cell
+        self._ramp = np.arange(1, EFFECT_CELL + 1, dtype=np.float32) / EFFECT_CELL
+        self._gains = np.zeros(EFFECT_CELL, dtype=np.float32)
+        self._levels = np.zeros((EFFECT_CELL, self.channels), dtype=np.float32)
+    
+    def _compute(self):
+        cell_seconds = EFFECT_CELL / self.sample_rate
+        attack = math.exp(-cell_seconds / max(self.attack, 1e-6))
+        release = math.exp(-cell_seconds / max(self.release, 1e-6))
+        return (attack, release, self.threshold_db, 1 - 1 / max(self.ratio, 1.0),
+                10 ** (self.makeup_db / 20))
+    
+    def reset(self):
+        self._envelope = 0.0
+        self._peak = 0.0
+        self._gain_from = self._gain_to = None
+    
+    def _gain(self, params):
+        attack, release, threshold_db, slope, makeup = params
+        level_db = 20 * math.log10(self._envelope) if self._envelope > 1e-9 else -180.0
+        over = level_db - threshold_db
+        return makeup * (10 ** (-over * slope / 20) if over > 0 else 1.0)
+    
+    def _process(self, block, at, params):
+        if self._gain_from is None:
+            self._gain_from = self._gain_to = self._gain(params)
+        done = 0
+        while done < len(block):
+            phase = (at + done) % EFFECT_CELL
+            count = min(EFFECT_CELL - phase, len(block) - done)
+            piece = block[done:done + count]
+            
+            levels = self._levels[:count]
+            np.abs(piece, out=levels)
+            self._peak = max(self._peak, float(levels.max()))
+            
+            gains = self._gains[:count]
+            np.multiply(self._ramp[phase:phase + count], self._gain_to - self._gain_from, out=gains)
+            gains += self._gain_from
+            piece *= gains[:, None]
+            
+            if phase + count == EFFECT_CELL:
+                attack, release = params[0], params[1]
+                coefficient = attack if self._peak > self._envelope else release
+                self._envelope = self._peak + coefficient * (self._envelope - self._peak)
+                self._peak = 0.0
+                self._gain_from = self._gain_to
+                self._gain_to = self._gain(params)
+            done += count
+
+EFFECT_TYPES = {cls.name: cls for cls in (Biquad, Delay, Pan, Compressor)}
+
+def effect_from_dict(settings):
+    """Effect from its to_dict()"""
+    settings = dict(settings)
+    kind = settings.pop('type')
+    if kind not in EFFECT_TYPES:
+        raise ValueError(f"Unknown effect type {kind!r}")
+    return EFFECT_TYPES[kind](**settings)
+
+def copy_effects(effects):
+    """A mix's (track chains, master chain) with every effect copied, fresh state
+    
+    track chains can be None (no track has any effects).
+    """
+    if effects is None:
+        return None
+    track_chains, master_chain = effects
+    if track_chains is not None:
+        track_chains = tuple(tuple(effect.copy() for effect in chain) for chain in track_chains)
+    return track_chains, tuple(effect.copy() for effect in master_chain)
@@ -0,0 +1,1059 @@
+import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from time import perf_counter_ns
+from .ringbuffer import RingBuffer
+from .mixer import MixEngine, export_wav
+from .export import ExportJob
+from .backends import SoundDeviceBackend
+from .peaks import PeakPyramid
+from .meters import LevelMeters
+from .history import TrackHistory
+from .automation import Automation
+from .profiler import CallbackProfiler, INPUT, OUTPUT, DUPLEX, write_stats
+from .convert import resample, fit_channels
+from .compact import CompactAudio, COMPACT_FORMATS
+from .scenes import Scene, SceneSwitch
+from .events import EventBus
+
+class MultiTrackLooper:
+    def __init__(self, num_tracks=4, max_record_seconds=120, backend=None, undo_budget_mb=256,
+                 sample_rate=44100, channels=2, input_channels=None, compact=None):
+        # Everything runs at one sample rate with channels output channels;
+        # audio at other rates is resampled once when it is loaded. The
+        # input can have fewer channels (e.g. a mono microphone).
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.input_channels = input_channels if input_channels is not None else channels
+        
+        # Audio I/O backend; devices are only discovered when a stream opens
+        if backend is None:
+            backend = SoundDeviceBackend(samplerate=sample_rate, channels=channels,
+                                         input_channels=self.input_channels)
+        self.backend = backend
+        
+        self.dtype = 'float32'  # Use float32 which is more universally supported
+        self.recording = False
+        self.playing = False
+        self.current_track = 0
+        self.master_length = None
+        
+        # All tracks live in one (num_tracks, master_length, channels) block,
+        # allocated when the first take sets the loop length. self.tracks
+        # holds views into it (None for empty tracks).
+        self.num_tracks = num_tracks
+        self.track_data = None
+        self.tracks = [None] * num_tracks
+        
+        # Takes shorter than the loop are kept at their own length instead,
+        # as (audio, offset) entries (see mixer.gather_span) that the mixer
+        # repeats. So are mono takes, as one channel the mixer spreads over
+        # all of them, rather than copied to every channel of a block row.
+        self.track_loops = [None] * num_tracks
+        # Compact storage ('int16' or 'float16', see compact.py) keeps every
+        # take that way instead, at about half the memory; the mixer then
+        # dequantizes each block as it mixes it
+        if compact is not None and compact not in COMPACT_FORMATS:
+            raise ValueError(f"Unknown compact storage {compact!r}")
+        self.compact = compact
+        self.track_enabled = [True] * num_tracks
+        self.track_volumes = [1.0] * num_tracks
+        
+        # Effective gain per track: volume, or 0 when muted or empty
+        self.track_gains = np.zeros(num_tracks, dtype=np.float32)
+        
+        # Insert effects (see effects.py) per track, before its volume, and
+        # on the master bus, before the clip
+        self.track_effects = [()] * num_tracks
+        self.master_effects = ()
+        
+        # What the audio callback mixes: (track_data, loops, gains, present,
+        # effects), rebuilt by _publish after every change and swapped in as
+        # a whole, so the callback picks up all of a change at once between
+        # blocks. None of its arrays or lists are modified after publishing.
+        self.mix_params = (None, None, self.track_gains, np.zeros(num_tracks, dtype=bool), None)
+        
+        # Volume/mute automation, replayed while playing if automation_playing;
+        # with automation_recording on, volume and mute changes made during
+        # playback are added to it at the loop position they happen
+        self.automation = Automation()
+        self.automation_playing = True
+        self.automation_recording = False
+        
+        # Recording: the input callback writes straight into a preallocated
+        # ring buffer, and stop_recording reads the take back out of it
+        self.record_ring = RingBuffer(int(max_record_seconds * self.sample_rate),
+                                      self.input_channels)
+        self.playback_position = 0
+        
+        # Waveform peaks per track (built lazily, see get_track_peaks), and
+        # the peaks of the take being recorded, kept up to date incrementally
+        self.track_peaks = [None] * num_tracks
+        self.record_peaks = PeakPyramid()
+        self._record_peaks_position = 0
+        
+        # Levels measured in the audio callbacks, polled by the GUI
+        self.meters = LevelMeters(num_tracks)
+        self.metering = True
+        
+        # Callback timing and xrun counts, also polled rather than printed:
+        # printing from the audio thread could itself cause xruns
+        self.profiler = CallbackProfiler(self.sample_rate)
+        self.profiling = True
+        
+        # Undo/redo of track changes, sharing the stored audio
+        self.history = TrackHistory(undo_budget_mb * 1024 * 1024)
+        
+        # Background export of a snapshot of the tracks (see start_export)
+        self.export_job = None
+        
+        # Mixer owns its scratch buffers so the output callback never allocates
+        self.mixer = MixEngine(self.channels, num_tracks=num_tracks)
+        
+        # Scenes (see scenes.py) by name and the one playing. A switch is
+        # requested, then handed to the callback once prepared, and stays
+        # switched until the looper's own state has caught up
+        self.scenes = {}
+        self.scene = None
+        self._scene_request = None
+        self._scene_future = None
+        self._scene_switch = None
+        self._switched = None
+        self._scene_pool = None
+        
+        # Song mode: [(scene name, repeats)] played in order
+        self.song = None
+        
+        # Inside batch(): the snapshot held back until the batch ends
+        self._batch_depth = 0
+        self._held_params = None
+        
+        # Called with a track number whenever that track's audio changes
+        self.on_track_changed = None
+        
+        # What changed since the GUI last looked (see events.py and
+        # poll_events); never touched by the audio callbacks
+        self.events = EventBus()
+        
+        # Audio streams - don't create them until needed
+        self.input_stream = None
+        self.output_stream = None
+        
+        # Full-duplex mode: one persistent stream records and plays in the
+        # same callback (see start_duplex). The take state below is set up
+        # by start/stop_recording and then only advanced by that callback.
+        self.duplex_stream = None
+        self.latency_compensation = None
+        self._capturing = False
+        self._take_start = None
+        self._take_end = None
+        self._take_grid = 0
+        self._take_synced = False
+        self._take_done = False
+        self._stop_requested = False
+        
+        # Quantized recording: divisions of the loop that takes start and
+        # stop on (0 = off, 1 = loop start, 4 = quarters...). Needs duplex
+        # mode with playback running, the only case with one sample clock.
+        self.quantize = 0
+    
+    def audio_input_callback(self, indata, frames, time, status):
+        """Callback for audio input"""
+        started = perf_counter_ns()
+        if status:
+            self.profiler.count_status(INPUT, status)
+        if self.recording:
+            self.record_ring.write(indata)
+        if self.metering:
+            self.meters.measure(self.meters.input, indata)
+        if self.profiling:
+            self.profiler.record(INPUT, started, frames, self.record_ring.available())
+    
+    def audio_output_callback(self, outdata, frames, time, status):
+        """Mix and play all enabled tracks"""
+        started = perf_counter_ns()
+        if status:
+            self.profiler.count_status(OUTPUT, status)
+        self._render_output(outdata, frames)
+        if self.profiling:
+            self.profiler.record(OUTPUT, started, frames)
+    
+    def audio_duplex_callback(self, indata, outdata, frames, time, status):
+        """Record and play sample-synchronously from one full-duplex stream"""
+        started = perf_counter_ns()
+        if status:
+            self.profiler.count_status(DUPLEX, status)
+        
+        if self.recording and not self._take_done:
+            # The input arriving now was played along to output from one
+            # round trip ago
+            self._capture(indata, self.playback_position - self._compensation_frames())
+        if self.metering:
+            self.meters.measure(self.meters.input, indata)
+        
+        self._render_output(outdata, frames)
+        if self.profiling:
+            self.profiler.record(DUPLEX, started, frames, self.record_ring.available())
+    
+    def _capture(self, indata, position):
+        """Write the part of an input block that belongs to the take
+        
+        position is the loop position (unwrapped) the first frame of indata
+        was played along to. Constant work per block: the take's start and
+        end are worked out once, when first needed.
+        """
+        if not self._take_grid:
+            # Free take: whole blocks, from the first block after the click
+            # to the first block after stop
+            if self._stop_requested:
+                self._capturing = False
+                self._take_done = True
+                return
+            if not self._capturing:
+                self._take_start = position
+                self._capturing = True
+            self.record_ring.write(indata)
+            return
+        
+        if not self.playing or self.master_length is None:
+            # The loop clock stopped; end the take where it is
+            self._capturing = False
+            self._take_done = True
+            return
+        
+        frames = len(indata)
+        if self._take_start is None:
+            self._take_start = self._next_boundary(position)
+        if self._stop_requested and self._take_end is None:
+            # Stopping before the take started cancels it
+            self._take_end = self._next_boundary(position) if self._capturing else position
+        
+        start = max(self._take_start - position, 0)
+        stop = frames if self._take_end is None else min(self._take_end - position, frames)
+        if stop > start:
+            self.record_ring.write(indata[start:stop])
+            self._capturing = True
+        if self._take_end is not None and position + frames >= self._take_end:
+            self._capturing = False
+            self._take_done = True
+    
+    def _next_boundary(self, position):
+        """First quantize boundary at or after an (unwrapped) loop position"""
+        length = self.master_length
+        divisions = self._take_grid
+        loop, rest = divmod(position, length)
+        division = -(-rest * divisions // length)
+        return loop * length + division * length // divisions
+    
+    def _compensation_frames(self):
+        """Round-trip latency in frames subtracted from overdub positions"""
+        if self.latency_compensation is not None:
+            return self.latency_compensation
+        input_latency, output_latency = self.duplex_stream.latency
+        return int(round((input_latency + output_latency) * self.sample_rate))
+    
+    def _render_output(self, outdata, frames):
+        """Fill outdata with the next block of the mix"""
+        # One read of the snapshot (the next scene's once switched); the
+        # block's own length is the loop length
+        switched = self._switched
+        track_data, loops, gains, present, effects = (
+            self.mix_params if switched is None else switched.mix_params)
+        if not self.playing or track_data is None:
+            outdata.fill(0)
+            if self.metering:
+                self.meters.clear()
+            return
+        
+        switch = self._scene_switch
+        if switch is not None:
+            split = self._switch_frame(switch, track_data.shape[1])
+            if split < frames:
+                # The next scene starts on the boundary frame, from its
+                # loop start; only references change hands here
+                if split:
+                    self._render_output(outdata[:split], split)
+                if self._scene_switch is switch:
+                    self._scene_switch = None
+                self._switched = switch
+                self.playback_position = 0
+                self._render_output(outdata[split:], frames - split)
+                return
+        
+        self.mixer.mix(outdata, track_data, gains, self.playback_position, track_data.shape[1],
+                       self.meters if self.metering else None, loops,
+                       self.automation if self.automation_playing else None, present, effects)
+        
+        self.playback_position += frames
+    
+    def _switch_frame(self, switch, length):
+        """Frames of the current scene left to play before a switch"""
+        position = self.playback_position
+        if switch.at is None or switch.at < position:
+            # Too late for where it was asked for: the next loop boundary
+            switch.at = -(-position // length) * length
+        return switch.at - position
+    
+    def start_recording(self, track_num):
+        """Start recording to specified track"""
+        if self.recording:
+            return
+        if self._scene_request is not None:
+            print("Can't record while a scene change is pending")
+            return
+        
+        self.current_track = track_num
+        self.record_ring.reset()
+        self.record_peaks = PeakPyramid()
+        self._record_peaks_position = 0
+        
+        if self.duplex_stream is not None:
+            # Arm the take; the duplex callback starts capturing at its next
+            # block, or at the next quantize boundary
+            self._take_synced = self.playing and self.master_length is not None
+            self._take_grid = self.quantize if self._take_synced else 0
+            self._take_start = None
+            self._take_end = None
+            self._take_done = False
+            self._stop_requested = False
+            self.recording = True
+            self.events.mark('recording')
+            if self._take_grid:
+                print(f"Recording track {track_num + 1} from the next 1/{self._take_grid} of the loop")
+            else:
+                print(f"Recording track {track_num + 1}")
+            return
+        
+        if self.quantize and self.master_length is not None:
+            print("Quantize needs duplex mode with playback running; recording unquantized")
+        self.recording = True
+        
+        # Recreate input stream if needed
+        try:
+            if self.input_stream:
+                self.input_stream.close()
+            
+            self.input_stream = self.backend.input_stream(
+                self.sample_rate, self.input_channels, self.dtype, self.audio_input_callback)
+            self.input_stream.start()
+            self.events.mark('recording')
+            print(f"Recording track {track_num + 1}")
+        except Exception as e:
+            print(f"Error starting recording: {e}")
+            self.recording = False
+            return
+    
+    def stop_recording(self):
+        """Stop recording and save to current track
+        
+        In duplex mode this only asks the callback to stop: the take ends
+        with its next block (or at the next boundary when quantized) and
+        update_recording stores it, so the caller never waits on the audio.
+        """
+        if not self.recording or self._stop_requested:
+            return
+        
+        if self.duplex_stream is not None:
+            self._stop_requested = True
+            if self._take_grid:
+                print("Recording stops at the next boundary")
+            return
+        
+        self.recording = False
+        
+        # Stop and close input stream
+        try:
+            if self.input_stream:
+                self.input_stream.stop()
+                self.input_stream.close()
+                self.input_stream = None
+            print("Recording stopped")
+        except Exception as e:
+            print(f"Error stopping recording: {e}")
+        self._store_take(0)
+    
+    def _finish_recording(self):
+        """Store a duplex take once the callback has stopped capturing"""
+        self.recording = False
+        self._stop_requested = False
+        offset = 0
+        if self._take_synced and self._take_start is not None and self.master_length is not None:
+            offset = self._take_start % self.master_length
+        print("Recording stopped")
+        self._store_take(offset)
+    
+    def _store_take(self, offset):
+        """Copy the recorded take onto the current track at a loop offset"""
+        self.events.mark('recording')
+        self.meters.clear(self.meters.input)
+        if self.record_ring.overflows:
+            print(f"Recording overflowed: {self.record_ring.dropped_frames} frames dropped")
+        
+        if self.record_ring.available():
+            self._update_record_peaks()
+            # View into the ring; it is copied into the track block
+            self.set_track_audio(self.current_track, self.record_ring.read(),
+                                 peaks=self.record_peaks, offset=offset)
+    
+    def update_recording(self):
+        """Per-frame upkeep of the take (call from the GUI thread)
+        
+        Folds newly recorded audio into record_peaks, and stores a duplex
+        take once the callback has finished it after a stop.
+        """
+        if not self.recording:
+            return
+        self._update_record_peaks()
+        if self._take_done and self._stop_requested:
+            self._finish_recording()
+    
+    def _update_record_peaks(self):
+        stop = self.record_ring.write_pos
+        for segment in self.record_ring.segments(self._record_peaks_position, stop):
+            self.record_peaks.append(segment)
+        self._record_peaks_position = stop
+    
+    def get_track_peaks(self, track_num):
+        """Peak pyramid of a track, or None if it is empty"""
+        if self.tracks[track_num] is None:
+            return None
+        if self.track_peaks[track_num] is None:
+            audio = self.tracks[track_num]
+            if isinstance(audio, CompactAudio):
+                pyramid = PeakPyramid()
+                for segment in audio.segments():
+                    pyramid.append(segment)
+                self.track_peaks[track_num] = pyramid
+            else:
+                self.track_peaks[track_num] = PeakPyramid.from_audio(audio)
+        return self.track_peaks[track_num]
+    
+    def callback_stats(self):
+        """Timing and xrun statistics of the audio callbacks, as plain values
+        
+        'callbacks' has an entry per callback kind (see CallbackProfiler.stats);
+        'record_queue' describes the ring the input is recorded into, whose
+        depth the input and duplex callbacks report as their queue depth.
+        """
+        return {
+            'sample_rate': self.sample_rate,
+            'callbacks': self.profiler.stats(),
+            'record_queue': {
+                'depth': self.record_ring.available(),
+                'capacity': self.record_ring.capacity,
+                'overflows': self.record_ring.overflows,
+                'dropped_frames': self.record_ring.dropped_frames,
+            },
+        }
+    
+    def dump_stats(self, path):
+        """Write callback_stats() to a .json or .csv file"""
+        write_stats(self.callback_stats(), path)
+        return path
+    
+    def report_status(self):
+        """Print the xruns the callbacks flagged since the last call
+        
+        Poll this off the audio thread (the GUI does every frame); returns
+        the messages printed.
+        """
+        messages = self.profiler.report()
+        for message in messages:
+            print(message)
+        return messages
+    
+    def set_track_audio(self, track_num, audio, peaks=None, offset=0, sample_rate=None,
+                        copy=True):
+        """Put audio on a track, trimmed or looped to the loop length
+        
+        The first track to get audio sets the loop length. The audio starts
+        at loop position offset and is trimmed to the loop. A take as long
+        as the loop is copied into the track's row of the stacked block, so
+        the mixer takes it in its single vectorized pass (see _write_row);
+        shorter, mono and compact takes are kept at their own length
+        instead, and the mixer repeats them. peaks can be the already
+        computed pyramid of audio.
+        
+        audio is (frames, channels) with one channel or the looper's
+        channels (more are dropped, see fit_channels), recorded at
+        sample_rate if that is given; it is resampled here if it differs.
+        With copy=False float32 audio kept at its own length is kept as it
+        is instead of copied; it must not be written to afterwards. In
+        compact mode it is quantized either way.
+        """
+        audio = fit_channels(audio, self.channels)
+        if sample_rate is not None and sample_rate != self.sample_rate:
+            audio = resample(audio, sample_rate, self.sample_rate)
+            peaks = None
+            copy = False
+        if not len(audio):
+            # A loop (or take) of no frames has no position to play from
+            raise ValueError(f"No audio to put on track {track_num + 1}")
+        mono = audio.shape[1] == 1 and self.channels > 1
+        keep = not copy and audio.dtype == np.float32
+        
+        before = self._track_state(track_num)
+        loop = None
+        # If this is the first track, set master length
+        if self.master_length is None:
+            self.master_length = len(audio)
+        audio = audio[:self.master_length]
+        if mono or self.compact or len(audio) < self.master_length:
+            # Stored once and never written again, so the undo history and
+            # running exports can share it. Its row of the block is left
+            # untouched (a first take's pages are never even allocated).
+            loop = (self._stored(audio, keep), offset)
+            if self.track_data is None:
+                self.track_data = self._empty_block()
+            self.track_loops[track_num] = loop
+        else:
+            self.track_loops[track_num] = None
+            self._write_row(track_num, audio, offset)
+        
+        if peaks is not None:
+            peaks.truncate(self.master_length)
+        self.track_peaks[track_num] = peaks
+        self.tracks[track_num] = self.track_data[track_num] if loop is None else loop[0]
+        self._publish()
+        self._track_changed(track_num)
+        self.history.push(track_num, before, self._state_cost(before))
+    
+    def _empty_block(self):
+        return np.zeros((self.num_tracks, self.master_length, self.channels), dtype=np.float32)
+    
+    def _write_row(self, track_num, audio, offset=0):
+        """Put loop-length audio in a track's row of a new copy of the block
+        
+        Published blocks are never written, as the callback, exports, scenes
+        and the undo history may still be reading them: the other rows are
+        copied over and the new block swapped in. audio starts at loop
+        position offset, wrapping round the end.
+        """
+        length = self.master_length
+        if self.track_data is None:
+            block = self._empty_block()
+        else:
+            block = np.array(self.track_data)
+        offset %= length
+        block[track_num, offset:] = audio[:length - offset]
+        block[track_num, :offset] = audio[length - offset:]
+        self.track_data = block
+        # Rows are views: point them at the new block, so the old one can go
+        for i in range(self.num_tracks):
+            if self.tracks[i] is not None and self.track_loops[i] is None:
+                self.tracks[i] = block[i]
+    
+    def _stored(self, audio, keep):
+        """audio as a track keeps it: compacted, as it is, or copied"""
+        if self.compact:
+            return CompactAudio(audio, self.compact)
+        return audio if keep else np.array(audio, dtype=np.float32)
+    
+    def load_tracks(self, track_data, volumes=None, enabled=None, empty=None):
+        """Adopt an existing (num_tracks, length, channels) block as the tracks
+        
+        The block is used as-is, without copying, so it can be memory-mapped
+        from a session file. Playback should be stopped while loading.
+        In compact mode the rows are quantized instead, and the block gives
+        way to zeros that are never touched.
+        """
+        if track_data.shape[0] != self.num_tracks or track_data.shape[2] != self.channels:
+            raise ValueError(f"Expected {self.num_tracks} tracks of {self.channels} channels, "
+                             f"got shape {track_data.shape}")
+        
+        self.track_data = track_data
+        self.master_length = track_data.shape[1]
+        self.track_loops = [None] * self.num_tracks
+        self.history.clear()
+        if self.compact:
+            for i in range(self.num_tracks):
+                if not (empty and empty[i]):
+                    self.track_loops[i] = (CompactAudio(track_data[i], self.compact), 0)
+            self.track_data = np.zeros(track_data.shape, dtype=np.float32)
+        for i in range(self.num_tracks):
+            if self.track_loops[i] is not None:
+                self.tracks[i] = self.track_loops[i][0]
+            else:
+                self.tracks[i] = None if empty and empty[i] else track_data[i]
+            self.track_peaks[i] = None
+            if volumes is not None:
+                self.track_volumes[i] = volumes[i]
+            if enabled is not None:
+                self.track_enabled[i] = enabled[i]
+        self._publish()
+        for i in range(self.num_tracks):
+            self._track_changed(i)
+            self.events.mark(('mixer', i))
+    
+    def start_duplex(self):
+        """Open one persistent full-duplex stream for recording and playback
+        
+        From then on start_recording and toggle_playback only flip flags
+        the callback picks up at its next block; no streams are created.
+        Overdubs are placed at the loop position they were played along to,
+        compensating for the stream's reported input + output latency (or
+        latency_compensation frames, if set).
+        """
+        if self.duplex_stream is not None or self.recording:
+            return
+        if self.playing:
+            self.toggle_playback()
+        channels = self.channels
+        if self.input_channels != self.channels:
+            channels = (self.input_channels, self.channels)
+        try:
+            self.duplex_stream = self.backend.duplex_stream(
+                self.sample_rate, channels, self.dtype, self.audio_duplex_callback)
+            self.duplex_stream.start()
+            print("Duplex stream started")
+        except Exception as e:
+            print(f"Error starting duplex stream: {e}")
+            self.duplex_stream = None
+    
+    def stop_duplex(self):
+        """Close the full-duplex stream and go back to separate streams"""
+        if self.duplex_stream is None:
+            return
+        if self.recording:
+            self.stop_recording()
+        try:
+            self.duplex_stream.stop()
+            self.duplex_stream.close()
+            print("Duplex stream stopped")
+        except Exception as e:
+            print(f"Error stopping duplex stream: {e}")
+        if self.recording:
+            # A quantized take that had not reached its end keeps what it has
+            self._finish_recording()
+        self.duplex_stream = None
+        self._capturing = False
+        self.playing = False
+        self.meters.clear()
+        self.events.mark('playing', 'playhead', 'meters')
+    
+    def toggle_playback(self):
+        """Toggle master playback"""
+        if self.master_length is None:
+            print("No tracks recorded yet")
+            return
+        
+        self.playing = not self.playing
+        self.events.mark('playing', 'playhead', 'meters', 'stats')
+        if self.duplex_stream is not None:
+            if self.playing:
+                self.playback_position = 0
+            else:
+                self.meters.clear()
+            return
+        
+        if self.playing:
+            self.playback_position = 0
+            # Recreate output stream if needed
+            try:
+                if self.output_stream:
+                    self.output_stream.close()
+                
+                self.output_stream = self.backend.output_stream(
+                    self.sample_rate, self.channels, self.dtype, self.audio_output_callback)
+                self.output_stream.start()
+                print("Playback started")
+            except Exception as e:
+                print(f"Error starting playback: {e}")
+                self.playing = False
+        else:
+            # Stop and close stream
+            try:
+                if self.output_stream:
+                    self.output_stream.stop()
+                    self.output_stream.close()
+                    self.output_stream = None
+                self.meters.clear()
+                print("Playback stopped")
+            except Exception as e:
+                print(f"Error stopping playback: {e}")
+    
+    def clear_track(self, track_num):
+        """Clear a specific track"""
+        if self.tracks[track_num] is None:
+            return
+        before = self._track_state(track_num)
+        
+        self.tracks[track_num] = None
+        self.track_peaks[track_num] = None
+        self.track_loops[track_num] = None
+        
+        # If all tracks cleared, reset master length
+        if all(track is None for track in self.tracks):
+            self.master_length = None
+            self.track_data = None
+        self._publish()
+        self._track_changed(track_num)
+        self.history.push(track_num, before, self._state_cost(before))
+    
+    def undo(self):
+        """Put back the track as it was before its last change
+        
+        Returns the track number, or None if there is nothing to undo.
+        """
+        step = self.history.pop_undo()
+        if step is None:
+            return None
+        track_num, state = step
+        current = self._track_state(track_num)
+        self._set_track_state(track_num, state)
+        self.history.push_redo(track_num, current, self._state_cost(current))
+        return track_num
+    
+    def redo(self):
+        """Reapply the last undone change; returns its track number or None"""
+        step = self.history.pop_redo()
+        if step is None:
+            return None
+        track_num, state = step
+        current = self._track_state(track_num)
+        self._set_track_state(track_num, state)
+        self.history.push_undo(track_num, current, self._state_cost(current))
+        return track_num
+    
+    def _track_state(self, track_num):
+        """Everything needed to put a track back as it is now
+        
+        Only references, as track audio is never written once stored, except
+        for a track in a row of the block: the row is copied out, so the
+        state doesn't keep a whole block alive once the next take replaces it.
+        """
+        audio, loop = self.tracks[track_num], self.track_loops[track_num]
+        if audio is not None and loop is None:
+            audio = np.array(audio)
+        return (audio, loop, self.track_peaks[track_num], self.master_length)
+    
+    def _state_cost(self, state):
+        """Bytes a history state keeps alive that the live tracks don't"""
+        audio, loop, peaks, master_length = state
+        return 0 if audio is None else audio.nbytes
+    
+    def _set_track_state(self, track_num, state):
+        """Swap a track to a saved state (one _publish for the callback)"""
+        audio, loop, peaks, master_length = state
+        self.master_length = master_length
+        self.tracks[track_num] = audio
+        self.track_peaks[track_num] = peaks
+        self.track_loops[track_num] = loop
+        if master_length is None:
+            # Before the first take (or after clearing the last)
+            self.track_data = None
+        elif audio is not None and loop is None:
+            self._write_row(track_num, audio)
+        elif self.track_data is None:
+            self.track_data = self._empty_block()
+        self._publish()
+        self._track_changed(track_num)
+    
+    def toggle_track(self, track_num):
+        """Toggle track on/off"""
+        self.track_enabled[track_num] = not self.track_enabled[track_num]
+        self._publish()
+        self.events.mark(('mixer', track_num))
+        self._record_automation(track_num)
+    
+    def set_track_volume(self, track_num, volume):
+        """Set track volume (0.0 to 1.0)"""
+        self.track_volumes[track_num] = volume
+        self._publish()
+        self.events.mark(('mixer', track_num))
+        self._record_automation(track_num)
+    
+    def set_track_effects(self, track_num, effects):
+        """Set a track's chain of insert effects, applied before its volume
+        
+        Effects are prepared for the looper's rate and channels here. An
+        effect already playing keeps its state, so a chain can be edited
+        while it plays; its parameters can be changed with its set().
+        """
+        self.track_effects[track_num] = self._prepare_effects(effects)
+        self._publish()
+    
+    def set_master_effects(self, effects):
+        """Set the master bus's chain of insert effects, applied before the clip"""
+        self.master_effects = self._prepare_effects(effects)
+        self._publish()
+    
+    def _prepare_effects(self, effects):
+        for effect in effects:
+            if effect.sample_rate != self.sample_rate or effect.channels != self.channels:
+                effect.prepare(self.sample_rate, self.channels)
+        return tuple(effects)
+    
+    def clear_automation(self, track_num=None):
+        """Remove a track's automation (or all of it)"""
+        self.automation = self.automation.without_track(track_num)
+    
+    def _record_automation(self, track_num):
+        """Add a track's new gain to the automation if it is being recorded"""
+        if (self.automation_recording and self.playing and self.master_length is not None
+                and self.tracks[track_num] is not None):
+            position = self.playback_position % self.master_length
+            self.automation = self.automation.with_event(position, track_num,
+                                                         self.track_gains[track_num])
+    
+    def _publish(self):
+        """Rebuild the mix_params snapshot from the track state and swap it in"""
+        switched = self._switched
+        if switched is not None and not switched.entered:
+            # The callback already plays the next scene: make it the
+            # looper's before publishing over it
+            self._enter_scene(switched.scene)
+            switched.entered = True
+        params = self._snapshot(self.track_data, self.tracks, self.track_loops,
+                                self.track_volumes, self.track_enabled)
+        self.track_gains = params[2]
+        if self._batch_depth:
+            self._held_params = params
+            return
+        self.mix_params = params
+        self._held_params = None
+        if switched is not None:
+            self._switched = None
+            self._scene_entered(switched)
+    
+    @contextmanager
+    def batch(self):
+        """Hold back publishing while several changes are made
+        
+        Everything changed inside (takes, clears, volumes, mutes...) reaches
+        the callback as one snapshot, so it all takes effect on the same
+        block. Batches can nest; the outermost one publishes.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._held_params is not None:
+                self._publish()
+    
+    def _snapshot(self, track_data, tracks, track_loops, volumes, enabled):
+        """A mix_params snapshot of a set of tracks, with the current effects"""
+        present = np.array([track is not None for track in tracks])
+        gains = np.array([volumes[i] if present[i] and enabled[i] else 0.0
+                          for i in range(self.num_tracks)], dtype=np.float32)
+        loops = None
+        if any(loop is not None for loop in track_loops):
+            loops = list(track_loops)
+        effects = None
+        if any(self.track_effects) or self.master_effects:
+            effects = (tuple(self.track_effects) if any(self.track_effects) else None,
+                       self.master_effects)
+        return (track_data, loops, gains, present, effects)
+    
+    def save_scene(self, name):
+        """Keep the current tracks as scene name, which becomes the current scene"""
+        if self.master_length is None:
+            raise ValueError("No tracks to keep as a scene")
+        scene = self.scenes.get(name) or Scene(name)
+        scene.capture(self)
+        self.scenes[name] = scene
+        self.scene = name
+    
+    def add_scene(self, name, path):
+        """Add a scene loaded from a session file when it is first switched to"""
+        self.scenes[name] = Scene(name, path)
+    
+    def queue_scene(self, name, at=None):
+        """Switch to a scene at the next loop boundary
+        
+        The scene is loaded and paged in on a worker thread, then the
+        output callback switches on the boundary frame: at loop position
+        at of the current scene if given and not yet passed, otherwise the
+        first boundary after it is ready. With playback stopped it is
+        switched to as soon as it is ready. The current tracks are kept
+        in their own scene. Returns the Future of the preparation.
+        """
+        if name not in self.scenes:
+            raise ValueError(f"No scene named {name!r}")
+        if self.scene is None and self.master_length is not None:
+            raise ValueError("Save the current tracks as a scene first")
+        if self.recording:
+            raise ValueError("Can't change scene while recording")
+        if name == self.scene:
+            self.scenes[name].capture(self)
+        switch = SceneSwitch(self.scenes[name], at)
+        # Replaces a request the callback has not switched to yet
+        self._scene_request = switch
+        self._scene_switch = None
+        if self._scene_pool is None:
+            self._scene_pool = ThreadPoolExecutor(max_workers=1)
+        self._scene_future = self._scene_pool.submit(self._prepare_switch, switch)
+        return self._scene_future
+    
+    def scene_pending(self):
+        """Whether a scene change has been asked for and not made yet"""
+        return self._scene_request is not None
+    
+    def _prepare_switch(self, switch):
+        """Load, page in and snapshot a switch's scene (worker thread)"""
+        scene = switch.scene
+        scene.load(self)
+        track_data, tracks, loops, _, master_length, volumes, enabled = scene.state
+        if master_length is None:
+            raise ValueError(f"Scene {scene.name!r} has no tracks")
+        scene.page_in()
+        switch.mix_params = self._snapshot(track_data, tracks, loops, volumes, enabled)
+        if self._scene_request is switch:
+            self._scene_switch = switch
+        return switch
+    
+    def update_scenes(self):
+        """Per-frame upkeep of scene changes (call from the GUI thread)
+        
+        Makes a scene the callback switched to the looper's own state,
+        switches straight away while playback is stopped, and moves song
+        mode on. Returns the name of the scene entered, or None.
+        """
+        future = self._scene_future
+        if future is not None and future.done():
+            self._scene_future = None
+            if future.exception() is not None:
+                print(f"Error preparing scene: {future.exception()}")
+                self._scene_request = None
+                self.song = None
+        switch = self._scene_switch
+        if switch is not None and switch.at is None and not self.playing:
+            self._scene_switch = None
+            self._switched = switch
+        switched = self._switched
+        if switched is None:
+            return None
+        self._publish()
+        return switched.scene.name
+    
+    def _enter_scene(self, scene):
+        """Keep the current tracks in their scene and take on another's"""
+        if self.scene is not None:
+            self.scenes[self.scene].capture(self)
+        scene.restore(self)
+        self.scene = scene.name
+        self.history.clear()
+    
+    def _scene_entered(self, switch):
+        if self._scene_request is switch:
+            self._scene_request = None
+        print(f"Scene: {switch.scene.name}")
+        self.events.mark('scene')
+        for i in range(self.num_tracks):
+            self._track_changed(i)
+            self.events.mark(('mixer', i))
+        if self.song is not None and switch.song_index is not None:
+            index = switch.song_index + 1
+            if index < len(self.song):
+                # Counted from this scene's first frame
+                self._queue_song_entry(index, self.song[index - 1][1] * self.master_length)
+            else:
+                self.song = None
+    
+    def play_song(self, song):
+        """Play scenes one after another: song is [(scene name, repeats), ...]
+        
+        Each scene plays its loop repeats times and the next one starts on
+        the frame after; the first starts at the next loop boundary. The
+        last scene keeps looping.
+        """
+        for name, repeats in song:
+            if name not in self.scenes:
+                raise ValueError(f"No scene named {name!r}")
+            if repeats < 1:
+                raise ValueError(f"Scene {name!r} must play at least once")
+        self.song = list(song)
+        self._queue_song_entry(0, None)
+    
+    def _queue_song_entry(self, index, at):
+        future = self.queue_scene(self.song[index][0], at)
+        self._scene_request.song_index = index
+        return future
+    
+    def stop_song(self):
+        """Leave song mode, staying in the current scene"""
+        self.song = None
+        self._scene_request = None
+        self._scene_switch = None
+    
+    def _track_changed(self, track_num):
+        """Notify the listener (the GUI, if any) that a track changed"""
+        self.events.mark(('track', track_num), 'loop_length')
+        if self.on_track_changed:
+            self.on_track_changed(track_num)
+    
+    def poll_events(self, now=None):
+        """The event keys marked since the last call, with the ticks due
+        
+        Call from the GUI thread (see events.py). Ticks only come while
+        playback, recording or the duplex stream runs.
+        """
+        if self.playing:
+            self.events.tick('playhead', now)
+        if self.recording:
+            self.events.tick('take', now)
+        if self.playing or self.recording or self.duplex_stream is not None:
+            self.events.tick('meters', now)
+            self.events.tick('stats', now)
+        return self.events.take()
+    
+    def track_position(self, track_num):
+        """Frame of a track's own audio playing now, or None if it isn't"""
+        if not self.playing or self.tracks[track_num] is None or self.master_length is None:
+            return None
+        position = self.playback_position % self.master_length
+        loop = self.track_loops[track_num]
+        if loop is None:
+            return position
+        audio, offset = loop
+        return (position - offset) % self.master_length % len(audio)
+    
+    def _export_automation(self):
+        """Automation an export replays, as playback would"""
+        return self.automation if self.automation_playing else None
+    
+    def _mix_path(self, filename):
+        """Where a mix with this name gets saved"""
+        if not filename.endswith('.wav'):
+            filename += '.wav'
+        return os.path.abspath(filename)
+    
+    def save_mix(self, filename, repeats=1, chunk_frames=65536, progress=None):
+        """Save the current mix to a WAV file
+        
+        The mix is streamed to disk in chunks of chunk_frames, so memory use
+        stays bounded. repeats writes the loop that many times back to back,
+        and progress(frames_written, total_frames) is called after each chunk.
+        """
+        if self.master_length is None:
+            return None
+        
+        filepath = self._mix_path(filename)
+        track_data, loops, gains, present, effects = self.mix_params
+        export_wav(filepath, track_data, gains, self.sample_rate,
+                   repeats=repeats, chunk_frames=chunk_frames, progress=progress,
+                   loops=loops, automation=self._export_automation(), present=present,
+                   effects=effects)
+        return filepath
+    
+    def start_export(self, filename, repeats=1, on_progress=None, on_done=None):
+        """Save the current mix on a worker thread, returning its ExportJob
+        
+        The job works from a snapshot of the tracks and gains, so playback,
+        recording and mixer changes carry on while it runs.
+        """
+        if self.master_length is None:
+            return None
+        if self.export_job is not None and self.export_job.running():
+            return None
+        
+        # The snapshot is never modified, so the job can use it as it is
+        track_data, loops, gains, present, effects = self.mix_params
+        self.export_job = ExportJob(self._mix_path(filename), track_data, gains,
+                                    self.sample_rate, repeats=repeats,
+                                    on_progress=on_progress, on_done=on_done, loops=loops,
+                                    automation=self._export_automation(), present=present,
+                                    effects=effects)
+        return self.export_job.start()
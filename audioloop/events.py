@@ -0,0 +1,67 @@
+import threading
+import time
+
+# Engine-to-GUI change notification. The engine marks what changed as
+# dirty keys; the GUI takes the set once per frame and redraws only the
+# widgets behind them, so an idle looper costs next to nothing per frame.
+#
+# Keys: ('track', n) audio of track n (waveform), ('mixer', n) its volume
+# or mute, 'loop_length', 'recording' (a take started or was stored),
+# 'playing' (playback started or stopped), 'scene', and the ticks
+# 'playhead', 'take' (peaks of the take being recorded), 'meters' and
+# 'stats', raised at most every interval below while something is running.
+#
+# The audio callbacks never mark anything: what they produce (position,
+# levels, timings) is read by the GUI when a tick comes due. Other
+# consumers (e.g. the control server) get listeners of their own, which
+# see every mark, ticks included.
+
+# Tick intervals (seconds)
+TICK_INTERVALS = {
+    'playhead': 1 / 30,
+    'take': 1 / 30,
+    'meters': 1 / 30,
+    'stats': 0.5,
+}
+
+class EventBus:
+    """Set of dirty keys, marked from any thread but the audio callbacks"""
+    def __init__(self, intervals=None):
+        self.intervals = dict(TICK_INTERVALS, **(intervals or {}))
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._ticked = {}
+        self._listeners = []
+    
+    def listener(self):
+        """A bus of its own that every key marked here is also marked on"""
+        listener = EventBus(self.intervals)
+        with self._lock:
+            self._listeners = self._listeners + [listener]
+        return listener
+    
+    def remove_listener(self, listener):
+        with self._lock:
+            self._listeners = [other for other in self._listeners if other is not listener]
+    
+    def mark(self, *keys):
+        """Flag keys as changed"""
+        with self._lock:
+            self._dirty.update(keys)
+            listeners = self._listeners
+        for listener in listeners:
+            listener.mark(*keys)
+    
+    def tick(self, key, now=None):
+        """Mark a tick key if its interval has passed since it was last marked"""
+        if now is None:
+            now = time.monotonic()
+        if now - self._ticked.get(key, float('-inf')) >= self.intervals[key]:
+            self._ticked[key] = now
+            self.mark(key)
+    
+    def take(self):
+        """The keys marked since the last call, clearing them"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
@@ -0,0 +1,75 @@
+import threading
+import os
+from .mixer import export_wav
+
+class ExportJob:
+    """Exports a snapshot of the tracks to a WAV file on a worker thread
+    
+    track_data and gains must not be written to while the job runs. The
+    looper passes its current mix_params snapshot, which it never modifies.
+    """
+    def __init__(self, filepath, track_data, gains, sample_rate, repeats=1,
+                 chunk_frames=65536, on_progress=None, on_done=None, loops=None,
+                 automation=None, present=None, effects=None):
+        self.filepath = filepath
+        self.track_data = track_data
+        self.gains = gains
+        self.loops = loops
+        self.automation = automation
+        self.present = present
+        self.effects = effects
+        self.sample_rate = sample_rate
+        self.repeats = repeats
+        self.chunk_frames = chunk_frames
+        self.on_progress = on_progress
+        self.on_done = on_done
+        
+        self.progress = 0.0
+        self.cancelled = False
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def start(self):
+        """Start the worker thread"""
+        self._thread.start()
+        return self
+    
+    def cancel(self):
+        """Ask the worker to stop after the current chunk"""
+        self._cancel.set()
+    
+    def running(self):
+        """True while the worker thread is still exporting"""
+        return self._thread.is_alive()
+    
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns True if it did"""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+    
+    def _report(self, written, total):
+        self.progress = written / total
+        if self.on_progress:
+            self.on_progress(self)
+    
+    def _run(self):
+        try:
+            export_wav(self.filepath, self.track_data, self.gains, self.sample_rate,
+                       repeats=self.repeats, chunk_frames=self.chunk_frames,
+                       progress=self._report, cancel=self._cancel, loops=self.loops,
+                       automation=self.automation, present=self.present,
+                       effects=self.effects)
+            if self._cancel.is_set():
+                # Don't leave a truncated file behind
+                self.cancelled = True
+                os.remove(self.filepath)
+        except Exception as e:
+            self.error = e
+        finally:
+            # Drop the snapshot so its memory can be freed
+            self.track_data = None
+            self.loops = None
+            self.effects = None
+            if self.on_done:
+                self.on_done(self)
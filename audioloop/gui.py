@@ -0,0 +1,670 @@
+import dearpygui.dearpygui as dpg
+import math
+from .engine import MultiTrackLooper
+from .profiler import KINDS
+from .session import load_session, save_session
+from .importer import import_wav, import_folder
+from .effects import Biquad, Delay, Pan, Compressor
+from .scenes import parse_song
+from .control import ControlServer, parse_address
+
+# The looper driven by this GUI (created in main), and its remote
+# control server if one was asked for
+app = None
+control_server = None
+
+# Track whose record button shows a take in progress (None when idle)
+record_button_track = None
+
+# Quantize choices: label -> divisions of the loop
+QUANTIZE_OPTIONS = {"Off": 0, "Loop": 1, "1/2": 2, "1/4": 4, "1/8": 8, "1/16": 16}
+
+# Meter levels as drawn, decaying towards the measured peaks at every
+# meters tick (see events.py), and the level below which a meter is drawn
+# as empty and stops asking for redraws
+meter_display = []
+METER_DECAY = 0.72
+METER_FLOOR = 1e-4
+
+# Inserts the Effects panel edits on every track, and the setting at which
+# each is left out of the chain
+INSERT_OFF = {'low_cut': 20.0, 'high_cut': 20000.0, 'pan': 0.0, 'delay': 0.0}
+track_inserts = []
+master_compressor = None
+
+def plot_width(track_num):
+    """Pixel width of a track's waveform plot"""
+    width = dpg.get_item_rect_size(f"track_{track_num}_plot")[0]
+    if not width:
+        width = dpg.get_viewport_client_width()
+    return max(int(width), 100)
+
+def update_track_display(track_num):
+    """Update waveform display for a track"""
+    peaks = app.get_track_peaks(track_num)
+    if peaks is None:
+        dpg.set_value(f"track_{track_num}_series", [[], []])
+        return
+    
+    # Min/max envelope at the resolution of the plot, not the loop length
+    time_axis, display_data = peaks.display(plot_width(track_num), app.sample_rate)
+    
+    # Update plot
+    dpg.set_value(f"track_{track_num}_series", [time_axis.tolist(), display_data.tolist()])
+
+def update_live_display():
+    """Per-frame upkeep: redraw only the widgets behind the looper's events
+    
+    The looper marks what changed (see events.py) and ticks the playhead,
+    meters and take at a capped rate while audio runs; with nothing
+    marked, a frame does no work here. Only polled values are read (the
+    meter arrays, the playback position, the incrementally updated take
+    peaks), so the audio callbacks never wait on the GUI.
+    """
+    app.update_recording()
+    if control_server is not None:
+        control_server.process()
+    scene = app.update_scenes()
+    if scene is not None:
+        update_scene_list()
+        dpg.set_value("status_text", f"Scene: {scene}")
+    if any(level > METER_FLOOR for level in meter_display):
+        # Meters still falling after the audio stopped
+        app.events.tick('meters')
+    
+    dirty = app.poll_events()
+    if not dirty:
+        return
+    for key in dirty:
+        if isinstance(key, tuple):
+            kind, track_num = key
+            if kind == 'track':
+                update_track_display(track_num)
+            elif kind == 'mixer':
+                update_mixer_controls(track_num)
+    if 'loop_length' in dirty:
+        update_loop_length()
+    if 'recording' in dirty:
+        # A take started remotely, or a duplex one was finished and stored
+        update_record_button()
+    if 'playing' in dirty:
+        update_play_button()
+    if 'take' in dirty and app.recording:
+        update_take_display()
+    if 'playhead' in dirty:
+        update_playheads()
+    if 'meters' in dirty:
+        update_meters()
+    if 'stats' in dirty:
+        # xruns are only counted by the callbacks; they are logged from here
+        messages = app.report_status()
+        if messages:
+            dpg.set_value("status_text", messages[-1])
+        update_stats_panel()
+
+def update_take_display():
+    """Waveform of the take being recorded, on its track's plot"""
+    track_num = app.current_track
+    time_axis, display_data = app.record_peaks.display(plot_width(track_num), app.sample_rate)
+    dpg.set_value(f"track_{track_num}_series", [time_axis.tolist(), display_data.tolist()])
+    dpg.fit_axis_data(f"track_{track_num}_xaxis")
+
+def update_playheads():
+    """Move each track's cursor to the frame of its audio playing now"""
+    for i in range(app.num_tracks):
+        frame = app.track_position(i)
+        dpg.configure_item(f"track_{i}_playhead", show=frame is not None)
+        if frame is not None:
+            dpg.set_value(f"track_{i}_playhead", frame / app.sample_rate)
+
+def update_meters():
+    peaks = app.meters.peak.copy()
+    rms = app.meters.rms.copy()
+    for slot, tag in enumerate(meter_tags()):
+        level = max(float(peaks[slot]), meter_display[slot] * METER_DECAY)
+        if level <= METER_FLOOR:
+            level = 0.0
+        meter_display[slot] = level
+        dpg.set_value(tag, min(level, 1.0))
+        dpg.configure_item(tag, overlay=format_db(rms[slot]))
+
+def update_mixer_controls(track_num):
+    """Set a track's volume slider and mute button from the looper"""
+    dpg.set_value(f"volume_{track_num}", app.track_volumes[track_num] * 100)
+    muted = not app.track_enabled[track_num]
+    dpg.set_item_label(f"mute_btn_{track_num}", "Muted" if muted else "Mute")
+    dpg.bind_item_theme(f"mute_btn_{track_num}",
+                        "button_theme_muted" if muted else "button_theme_default")
+
+def update_stats_panel():
+    """Refresh the callback statistics (on the looper's stats tick)"""
+    stats = app.callback_stats()
+    for kind in KINDS:
+        entry = stats['callbacks'][kind]
+        if not entry['callbacks']:
+            continue
+        xruns = (entry['input_underflow'] + entry['input_overflow'] +
+                 entry['output_underflow'] + entry['output_overflow'])
+        dpg.set_value(f"stats_{kind}",
+                      f"{kind.capitalize()}: {entry['callbacks']} callbacks, "
+                      f"mean {entry['mean_us']:.0f} us, p99 {entry['p99_us']:.0f} us, "
+                      f"max {entry['max_us']:.0f} us, budget {entry['budget_percent']:.1f}% "
+                      f"(peak {entry['peak_budget_percent']:.0f}%), "
+                      f"{entry['late']} late, {xruns} xruns")
+    queue = stats['record_queue']
+    dpg.set_value("stats_queue",
+                  f"Record queue: {queue['depth']} / {queue['capacity']} frames, "
+                  f"{queue['overflows']} overflows")
+
+def meter_tags():
+    """Widget tags of the meters, in LevelMeters slot order"""
+    return [f"meter_{i}" for i in range(app.num_tracks)] + ["meter_master", "meter_input"]
+
+def format_db(level):
+    """Level as dBFS text for a meter overlay"""
+    if level <= 1e-5:
+        return "-inf dB"
+    return f"{20 * math.log10(level):.0f} dB"
+
+def reset_record_button():
+    global record_button_track
+    track_num = record_button_track
+    dpg.set_item_label(f"record_btn_{track_num}", f"Record Track {track_num + 1}")
+    dpg.bind_item_theme(f"record_btn_{track_num}", "button_theme_default")
+    record_button_track = None
+
+def update_record_button():
+    """Show the take in progress on its record button, however it was started"""
+    global record_button_track
+    if app.recording and record_button_track is None:
+        record_button_track = app.current_track
+        dpg.set_item_label(f"record_btn_{record_button_track}", "Stop Recording")
+        dpg.bind_item_theme(f"record_btn_{record_button_track}", "button_theme_recording")
+    elif not app.recording and record_button_track is not None:
+        reset_record_button()
+
+def update_play_button():
+    if app.playing:
+        dpg.set_item_label("play_btn", "Stop All")
+        dpg.bind_item_theme("play_btn", "button_theme_playing")
+    else:
+        dpg.set_item_label("play_btn", "Play All")
+        dpg.bind_item_theme("play_btn", "button_theme_default")
+
+# GUI callbacks
+def record_button_callback(sender, app_data, user_data):
+    global record_button_track
+    track_num = user_data
+    if app.recording and app.current_track == track_num:
+        app.stop_recording()
+        if app.recording:
+            # Duplex: the take ends with the next block (or quantize
+            # boundary) and is stored by update_recording
+            dpg.set_item_label(f"record_btn_{track_num}", "Stopping...")
+        else:
+            reset_record_button()
+    elif not app.recording:
+        app.start_recording(track_num)
+        if app.recording:
+            record_button_track = track_num
+            dpg.set_item_label(f"record_btn_{track_num}", "Stop Recording")
+            dpg.bind_item_theme(f"record_btn_{track_num}", "button_theme_recording")
+
+def play_button_callback():
+    app.toggle_playback()
+    update_play_button()
+
+def duplex_callback(sender, app_data):
+    if app_data:
+        app.start_duplex()
+    else:
+        app.stop_duplex()
+        if record_button_track is not None:
+            reset_record_button()
+    dpg.set_value("duplex_checkbox", app.duplex_stream is not None)
+    # Switching modes stops playback
+    dpg.set_item_label("play_btn", "Play All")
+    dpg.bind_item_theme("play_btn", "button_theme_default")
+
+def quantize_callback(sender, app_data):
+    app.quantize = QUANTIZE_OPTIONS[app_data]
+
+def automation_write_callback(sender, app_data):
+    app.automation_recording = app_data
+
+def automation_read_callback(sender, app_data):
+    app.automation_playing = app_data
+
+def clear_automation_callback():
+    app.clear_automation()
+    dpg.set_value("status_text", "Automation cleared")
+
+def mute_callback(sender, app_data, user_data):
+    track_num = user_data
+    app.toggle_track(track_num)
+
+def clear_callback(sender, app_data, user_data):
+    track_num = user_data
+    app.clear_track(track_num)
+
+def import_callback(sender, app_data, user_data):
+    track_num = user_data
+    path = dpg.get_value("import_input")
+    if path:
+        try:
+            import_wav(app, track_num, path)
+            dpg.set_value("status_text", f"Imported {path} to track {track_num + 1}")
+        except Exception as e:
+            dpg.set_value("status_text", f"Error importing: {e}")
+
+def import_folder_callback():
+    directory = dpg.get_value("import_input")
+    if directory:
+        try:
+            paths = import_folder(app, directory)
+            dpg.set_value("status_text", f"Imported {len(paths)} files from: {directory}")
+        except Exception as e:
+            dpg.set_value("status_text", f"Error importing: {e}")
+
+def undo_callback():
+    if app.undo() is None:
+        dpg.set_value("status_text", "Nothing to undo")
+
+def redo_callback():
+    if app.redo() is None:
+        dpg.set_value("status_text", "Nothing to redo")
+
+def volume_callback(sender, app_data, user_data):
+    track_num = user_data
+    volume = app_data / 100.0  # Convert from 0-100 to 0-1
+    app.set_track_volume(track_num, volume)
+
+def export_progress(job):
+    dpg.set_value("status_text", f"Saving mix... {job.progress * 100:.0f}%")
+
+def export_done(job):
+    if job.error:
+        dpg.set_value("status_text", f"Error saving mix: {job.error}")
+    elif job.cancelled:
+        dpg.set_value("status_text", "Save cancelled")
+    else:
+        dpg.set_value("status_text", f"Saved mix to: {job.filepath}")
+
+def save_callback():
+    filename = dpg.get_value("filename_input")
+    if filename:
+        if app.export_job is not None and app.export_job.running():
+            dpg.set_value("status_text", "Already saving a mix")
+            return
+        job = app.start_export(filename, on_progress=export_progress, on_done=export_done)
+        if job is None:
+            dpg.set_value("status_text", "No tracks recorded yet!")
+
+def save_session_callback():
+    directory = dpg.get_value("session_input")
+    if directory:
+        try:
+            manifest = save_session(app, directory)
+            dpg.set_value("status_text", f"Saved session to: {manifest}")
+        except Exception as e:
+            dpg.set_value("status_text", f"Error saving session: {e}")
+
+def load_session_callback():
+    directory = dpg.get_value("session_input")
+    if directory:
+        if app.playing:
+            play_button_callback()
+        try:
+            load_session(directory, looper=app)
+            dpg.set_value("status_text", f"Loaded session: {directory}")
+        except Exception as e:
+            dpg.set_value("status_text", f"Error loading session: {e}")
+        sync_inserts()
+
+def update_scene_list():
+    names = [f"[{name}]" if name == app.scene else name for name in app.scenes]
+    dpg.set_value("scene_list_text", "Scenes: " + (", ".join(names) or "none"))
+
+def save_scene_callback():
+    name = dpg.get_value("scene_input").strip()
+    if name:
+        try:
+            app.save_scene(name)
+            dpg.set_value("status_text", f"Saved scene: {name}")
+        except Exception as e:
+            dpg.set_value("status_text", f"Error saving scene: {e}")
+        update_scene_list()
+
+def add_scene_callback():
+    name = dpg.get_value("scene_input").strip()
+    directory = dpg.get_value("session_input")
+    if name and directory:
+        app.add_scene(name, directory)
+        dpg.set_value("status_text", f"Scene {name} will load from: {directory}")
+        update_scene_list()
+
+def go_scene_callback():
+    name = dpg.get_value("scene_input").strip()
+    if name:
+        try:
+            app.queue_scene(name)
+            dpg.set_value("status_text", f"Switching to {name} at the loop boundary")
+        except Exception as e:
+            dpg.set_value("status_text", f"Error changing scene: {e}")
+
+def play_song_callback():
+    try:
+        app.play_song(parse_song(dpg.get_value("song_input")))
+        dpg.set_value("status_text", "Playing song")
+    except Exception as e:
+        dpg.set_value("status_text", f"Error playing song: {e}")
+
+def stop_song_callback():
+    app.stop_song()
+    dpg.set_value("status_text", "Song stopped")
+
+def cancel_save_callback():
+    if app.export_job is not None and app.export_job.running():
+        app.export_job.cancel()
+
+def default_inserts():
+    return {'low_cut': Biquad('highpass', INSERT_OFF['low_cut']),
+            'high_cut': Biquad('lowpass', INSERT_OFF['high_cut']),
+            'pan': Pan(INSERT_OFF['pan']),
+            'delay': Delay(mix=INSERT_OFF['delay'])}
+
+def insert_value(name, effect):
+    """The setting of an insert that its panel slider shows"""
+    if name == 'pan':
+        return effect.pan
+    if name == 'delay':
+        return effect.mix
+    return effect.freq
+
+def insert_callback(sender, app_data, user_data):
+    track_num, name = user_data
+    effect = track_inserts[track_num][name]
+    if name == 'pan':
+        effect.set(pan=app_data)
+    elif name == 'delay':
+        effect.set(mix=app_data)
+    else:
+        effect.set(freq=app_data)
+    publish_inserts(track_num)
+
+def publish_inserts(track_num):
+    """Give a track the inserts that are not at their off setting
+    
+    The same effect objects stay in the chain, so they play on without
+    losing their state.
+    """
+    chain = [effect for name, effect in track_inserts[track_num].items()
+             if insert_value(name, effect) != INSERT_OFF[name]]
+    app.set_track_effects(track_num, chain)
+
+def compressor_callback(sender, app_data, user_data):
+    if user_data == 'threshold':
+        master_compressor.set(threshold_db=app_data)
+    app.set_master_effects([master_compressor] if dpg.get_value("compressor_checkbox") else [])
+
+def sync_inserts():
+    """Show the effects a loaded session put on the tracks in the Effects panel"""
+    global master_compressor
+    for i in range(app.num_tracks):
+        inserts = default_inserts()
+        for effect in app.track_effects[i]:
+            if isinstance(effect, Biquad) and effect.kind in ('highpass', 'lowpass'):
+                inserts['low_cut' if effect.kind == 'highpass' else 'high_cut'] = effect
+            elif isinstance(effect, Pan):
+                inserts['pan'] = effect
+            elif isinstance(effect, Delay):
+                inserts['delay'] = effect
+        track_inserts[i] = inserts
+        for name, effect in inserts.items():
+            dpg.set_value(f"{name}_{i}", insert_value(name, effect))
+    compressors = [effect for effect in app.master_effects if isinstance(effect, Compressor)]
+    master_compressor = compressors[0] if compressors else Compressor()
+    dpg.set_value("compressor_checkbox", bool(compressors))
+    dpg.set_value("compressor_threshold", master_compressor.threshold_db)
+
+def save_stats_callback():
+    path = dpg.get_value("stats_input") or "callback_stats.json"
+    try:
+        app.dump_stats(path)
+        dpg.set_value("status_text", f"Saved stats to: {path}")
+    except Exception as e:
+        dpg.set_value("status_text", f"Error saving stats: {e}")
+
+def reset_stats_callback():
+    app.profiler.reset()
+
+def update_loop_length():
+    if app.master_length:
+        length_seconds = app.master_length / app.sample_rate
+        dpg.set_value("loop_length_text", f"   Loop Length: {length_seconds:.2f} seconds")
+    else:
+        dpg.set_value("loop_length_text", "   Loop Length: Not set")
+
+def build_gui():
+    """Create the Dear PyGui context, themes and main window"""
+    # Create GUI
+    dpg.create_context()
+    
+    # Create button themes for different states
+    with dpg.theme(tag="button_theme_default"):
+        with dpg.theme_component(dpg.mvButton):
+            dpg.add_theme_color(dpg.mvThemeCol_Button, (51, 51, 55))
+            dpg.add_theme_color(dpg.mvThemeCol_ButtonHovered, (71, 71, 75))
+            dpg.add_theme_color(dpg.mvThemeCol_ButtonActive, (91, 91, 95))
+    
+    with dpg.theme(tag="button_theme_recording"):
+        with dpg.theme_component(dpg.mvButton):
+            dpg.add_theme_color(dpg.mvThemeCol_Button, (150, 0, 0))
+            dpg.add_theme_color(dpg.mvThemeCol_ButtonHovered, (170, 20, 20))
+            dpg.add_theme_color(dpg.mvThemeCol_ButtonActive, (190, 40, 40))
+    
+    with dpg.theme(tag="button_theme_playing"):
+        with dpg.theme_component(dpg.mvButton):
+            dpg.add_theme_color(dpg.mvThemeCol_Button, (0, 150, 0))
+            dpg.add_theme_color(dpg.mvThemeCol_ButtonHovered, (20, 170, 20))
+            dpg.add_theme_color(dpg.mvThemeCol_ButtonActive, (40, 190, 40))
+    
+    with dpg.theme(tag="button_theme_muted"):
+        with dpg.theme_component(dpg.mvButton):
+            dpg.add_theme_color(dpg.mvThemeCol_Button, (150, 150, 0))
+            dpg.add_theme_color(dpg.mvThemeCol_ButtonHovered, (170, 170, 20))
+            dpg.add_theme_color(dpg.mvThemeCol_ButtonActive, (190, 190, 40))
+    
+    # Custom theme for track colors
+    with dpg.theme() as track_theme:
+        with dpg.theme_component(dpg.mvAll):
+            dpg.add_theme_style(dpg.mvStyleVar_FrameRounding, 5)
+    
+    with dpg.window(label=f"{app.num_tracks}-Track Looper", tag="main_window"):
+        # Master controls
+        dpg.add_text("Master Controls", color=(255, 255, 255))
+        with dpg.group(horizontal=True):
+            dpg.add_button(label="Play All", tag="play_btn", callback=play_button_callback,
+                          width=150, height=40)
+            dpg.add_button(label="Undo", callback=undo_callback, width=60, height=40)
+            dpg.add_button(label="Redo", callback=redo_callback, width=60, height=40)
+            dpg.add_checkbox(label="Duplex", tag="duplex_checkbox", callback=duplex_callback)
+            dpg.add_combo(list(QUANTIZE_OPTIONS), default_value="Off", label="Quantize",
+                          width=60, callback=quantize_callback)
+            dpg.add_text("   Loop Length: Not set", tag="loop_length_text")
+        with dpg.group(horizontal=True):
+            dpg.add_text("Master")
+            dpg.add_progress_bar(tag="meter_master", width=150, overlay="-inf dB")
+            dpg.add_text("Input")
+            dpg.add_progress_bar(tag="meter_input", width=150, overlay="-inf dB")
+        with dpg.group(horizontal=True):
+            dpg.add_text("Automation:")
+            dpg.add_checkbox(label="Write", callback=automation_write_callback)
+            dpg.add_checkbox(label="Read", default_value=True, callback=automation_read_callback)
+            dpg.add_button(label="Clear Automation", callback=clear_automation_callback, width=120)
+        
+        dpg.add_separator()
+        
+        # Create one row per track
+        colors = [(255, 100, 100), (100, 255, 100), (100, 100, 255), (255, 255, 100)]
+        
+        for i in range(app.num_tracks):
+            dpg.add_text(f"Track {i + 1}", color=colors[i % len(colors)])
+            
+            with dpg.group(horizontal=True):
+                # Track controls
+                dpg.add_button(label=f"Record Track {i + 1}", tag=f"record_btn_{i}",
+                              callback=record_button_callback, user_data=i,
+                              width=120, height=30)
+                dpg.add_button(label="Mute", tag=f"mute_btn_{i}",
+                              callback=mute_callback, user_data=i,
+                              width=60, height=30)
+                dpg.add_button(label="Clear", tag=f"clear_btn_{i}",
+                              callback=clear_callback, user_data=i,
+                              width=60, height=30)
+                dpg.add_button(label="Import", callback=import_callback, user_data=i,
+                              width=60, height=30)
+                dpg.add_text("Volume:")
+                dpg.add_slider_float(tag=f"volume_{i}", min_value=0, max_value=100,
+                                   default_value=100, callback=volume_callback,
+                                   user_data=i, width=150)
+                dpg.add_progress_bar(tag=f"meter_{i}", width=100, overlay="-inf dB")
+            
+            # Waveform display
+            with dpg.plot(height=80, width=-1, no_title=True, tag=f"track_{i}_plot"):
+                x_axis = dpg.add_plot_axis(dpg.mvXAxis, no_tick_labels=True, tag=f"track_{i}_xaxis")
+                y_axis = dpg.add_plot_axis(dpg.mvYAxis, no_tick_labels=True)
+                dpg.set_axis_limits(y_axis, -1, 1)
+                dpg.add_line_series([], [], parent=y_axis, tag=f"track_{i}_series")
+                dpg.add_drag_line(tag=f"track_{i}_playhead", default_value=0, show=False,
+                                  show_label=False, color=(255, 255, 255, 160))
+            
+            dpg.add_spacer(height=5)
+        
+        # Save controls
+        dpg.add_separator()
+        dpg.add_text("Save Mix:")
+        with dpg.group(horizontal=True):
+            dpg.add_input_text(tag="filename_input", hint="Enter filename", width=300)
+            dpg.add_button(label="Save Mix", callback=save_callback, width=100)
+            dpg.add_button(label="Cancel", callback=cancel_save_callback, width=60)
+        
+        dpg.add_text("Session:")
+        with dpg.group(horizontal=True):
+            dpg.add_input_text(tag="session_input", hint="Session folder", width=300)
+            dpg.add_button(label="Save Session", callback=save_session_callback, width=100)
+            dpg.add_button(label="Load Session", callback=load_session_callback, width=100)
+        
+        dpg.add_text("Scene:")
+        with dpg.group(horizontal=True):
+            dpg.add_input_text(tag="scene_input", hint="Scene name", width=300)
+            dpg.add_button(label="Save Scene", callback=save_scene_callback, width=100)
+            dpg.add_button(label="Go", callback=go_scene_callback, width=60)
+            dpg.add_button(label="From Session", callback=add_scene_callback, width=100)
+        with dpg.group(horizontal=True):
+            dpg.add_input_text(tag="song_input", hint="verse x2, chorus x4, outro", width=300)
+            dpg.add_button(label="Play Song", callback=play_song_callback, width=100)
+            dpg.add_button(label="Stop Song", callback=stop_song_callback, width=100)
+        dpg.add_text("Scenes: none", tag="scene_list_text")
+        
+        dpg.add_text("Import WAV:")
+        with dpg.group(horizontal=True):
+            dpg.add_input_text(tag="import_input", hint="WAV file or folder", width=300)
+            dpg.add_button(label="Import Folder", callback=import_folder_callback, width=100)
+        
+        dpg.add_text("", tag="status_text")
+        
+        # Audio info
+        dpg.add_text(f"Audio: {app.sample_rate}Hz, {app.channels}ch", color=(128, 128, 128))
+        
+        # Insert effects
+        with dpg.collapsing_header(label="Effects"):
+            for i in range(app.num_tracks):
+                with dpg.group(horizontal=True):
+                    dpg.add_text(f"Track {i + 1}")
+                    dpg.add_slider_float(label="Low cut", tag=f"low_cut_{i}", min_value=20,
+                                         max_value=1000, default_value=INSERT_OFF['low_cut'],
+                                         format="%.0f Hz", callback=insert_callback,
+                                         user_data=(i, 'low_cut'), width=100)
+                    dpg.add_slider_float(label="High cut", tag=f"high_cut_{i}", min_value=1000,
+                                         max_value=20000, default_value=INSERT_OFF['high_cut'],
+                                         format="%.0f Hz", callback=insert_callback,
+                                         user_data=(i, 'high_cut'), width=100)
+                    dpg.add_slider_float(label="Pan", tag=f"pan_{i}", min_value=-1, max_value=1,
+                                         default_value=INSERT_OFF['pan'], callback=insert_callback,
+                                         user_data=(i, 'pan'), width=80)
+                    dpg.add_slider_float(label="Delay", tag=f"delay_{i}", min_value=0, max_value=1,
+                                         default_value=INSERT_OFF['delay'],
+                                         callback=insert_callback, user_data=(i, 'delay'),
+                                         width=80)
+            with dpg.group(horizontal=True):
+                dpg.add_checkbox(label="Master compressor", tag="compressor_checkbox",
+                                 callback=compressor_callback)
+                dpg.add_slider_float(label="Threshold", tag="compressor_threshold", min_value=-40,
+                                     max_value=0, default_value=master_compressor.threshold_db,
+                                     format="%.0f dB", callback=compressor_callback,
+                                     user_data='threshold', width=150)
+        
+        # Callback timing and xruns
+        with dpg.collapsing_header(label="Performance"):
+            for kind in KINDS:
+                dpg.add_text(f"{kind.capitalize()}: idle", tag=f"stats_{kind}")
+            dpg.add_text("", tag="stats_queue")
+            with dpg.group(horizontal=True):
+                dpg.add_input_text(tag="stats_input", hint="stats.json or stats.csv", width=300)
+                dpg.add_button(label="Save Stats", callback=save_stats_callback, width=100)
+                dpg.add_button(label="Reset Stats", callback=reset_stats_callback, width=100)
+
+def main(num_tracks=4, sample_rate=44100, channels=2, input_channels=None, compact=None,
+         control=None):
+    """Run the looper GUI
+    
+    control is a local TCP port or Unix socket path to also serve remote
+    control on (see control.py).
+    """
+    global app, meter_display, track_inserts, master_compressor, control_server
+    
+    # Create app instance and find the audio devices up front
+    try:
+        app = MultiTrackLooper(num_tracks=num_tracks, sample_rate=sample_rate, channels=channels,
+                               input_channels=input_channels, compact=compact)
+        app.backend.devices()
+    except Exception as e:
+        import sounddevice as sd
+        print(f"Failed to initialize audio: {e}")
+        print("\nTroubleshooting:")
+        print("1. Make sure no other audio applications are using the device")
+        print("2. Try closing and reopening the terminal")
+        print("3. Check Windows sound settings")
+        print("\nAvailable devices:")
+        print(sd.query_devices())
+        raise
+    meter_display = [0.0] * (app.num_tracks + 2)
+    track_inserts = [default_inserts() for _ in range(app.num_tracks)]
+    master_compressor = Compressor()
+    
+    build_gui()
+    if control is not None:
+        control_server = ControlServer(app, **parse_address(control)).start()
+    
+    # Setup Dear PyGui
+    dpg.create_viewport(title=f"{app.num_tracks}-Track Looper", width=800, height=600)
+    dpg.setup_dearpygui()
+    dpg.show_viewport()
+    dpg.set_primary_window("main_window", True)
+    
+    # Start GUI, redrawing only what the looper marked as changed
+    while dpg.is_dearpygui_running():
+        update_live_display()
+        dpg.render_dearpygui_frame()
+    
+    # Cleanup
+    if control_server is not None:
+        control_server.stop()
+    if app.input_stream:
+        app.input_stream.close()
+    if app.output_stream:
+        app.output_stream.close()
+    if app.duplex_stream:
+        app.duplex_stream.close()
+    dpg.destroy_context()
@@ -0,0 +1,74 @@
+from collections import deque
+
+class TrackHistory:
+    """Undo/redo stacks of track versions
+    
+    A step is (stamp, track_num, state, cost): the state a track had before a
+    change, as captured by MultiTrackLooper._track_state. Track audio is
+    never modified once stored, so a state only references the take it
+    had, or holds a copy of its row of the track block. cost is the bytes
+    a step keeps alive on its own.
+    
+    When the steps' total cost exceeds memory_budget, the least recently
+    used step is dropped: steps are stamped each time they move between
+    the stacks, and the oldest always sits at the bottom of one of them.
+    """
+    def __init__(self, memory_budget=256 * 1024 * 1024):
+        self.memory_budget = memory_budget
+        self.undo_steps = deque()
+        self.redo_steps = deque()
+        self.memory = 0
+        self.evicted = 0
+        self._clock = 0
+    
+    def push(self, track_num, state, cost):
+        """Record the state a track had before a new change"""
+        for step in self.redo_steps:
+            self.memory -= step[3]
+        self.redo_steps.clear()
+        self._add(self.undo_steps, track_num, state, cost)
+    
+    def pop_undo(self):
+        """(track_num, state) to go back to, or None"""
+        return self._pop(self.undo_steps)
+    
+    def pop_redo(self):
+        """(track_num, state) to go forward to, or None"""
+        return self._pop(self.redo_steps)
+    
+    def push_undo(self, track_num, state, cost):
+        """Put back the state a redo replaced"""
+        self._add(self.undo_steps, track_num, state, cost)
+    
+    def push_redo(self, track_num, state, cost):
+        """Keep the state an undo replaced"""
+        self._add(self.redo_steps, track_num, state, cost)
+    
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+        self.memory = 0
+    
+    def _add(self, steps, track_num, state, cost):
+        self._clock += 1
+        steps.append((self._clock, track_num, state, cost))
+        self.memory += cost
+        self._evict()
+    
+    def _pop(self, steps):
+        if not steps:
+            return None
+        _, track_num, state, cost = steps.pop()
+        self.memory -= cost
+        return track_num, state
+    
+    def _evict(self):
+        """Drop least recently used steps until within the budget"""
+        while self.memory > self.memory_budget and (self.undo_steps or self.redo_steps):
+            if not self.redo_steps or (self.undo_steps and
+                                       self.undo_steps[0][0] < self.redo_steps[0][0]):
+                step = self.undo_steps.popleft()
+            else:
+                step = self.redo_steps.popleft()
+            self.memory -= step[3]
+            self.evicted += 1
@@ -0,0 +1,221 @@
+import os
+import struct
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from .convert import resample, resampled_frames, fit_channels
+
+# WAV import: 8/16/24/32-bit integer and 32/64-bit float files, decoded a
+# chunk at a time straight into the float32 array the track keeps, so a
+# stem is never held in memory twice.
+
+# Frames decoded per read
+IMPORT_CHUNK = 65536
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (format, bits per sample) -> sample dtype, and the offset and scale that
+# take it to -1..1. 24-bit samples are read as the top three bytes of an
+# int32, hence the 2**31.
+SAMPLE_FORMATS = {
+    (WAVE_FORMAT_PCM, 8): ('u1', 128.0, 1 / 128),
+    (WAVE_FORMAT_PCM, 16): ('<i2', 0.0, 1 / 32768),
+    (WAVE_FORMAT_PCM, 24): ('<i4', 0.0, 1 / 2 ** 31),
+    (WAVE_FORMAT_PCM, 32): ('<i4', 0.0, 1 / 2 ** 31),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): ('<f4', 0.0, 1.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): ('<f8', 0.0, 1.0),
+}
+
+class WavReader:
+    """Streaming reader of a WAV file's samples as float32
+    
+    Only the header is read when opening; read_into() then decodes one
+    chunk at a time through reused buffers (np.frombuffer on the bytes
+    read, converted in place into the destination).
+    """
+    def __init__(self, path, chunk_frames=IMPORT_CHUNK):
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.file = open(path, 'rb')
+        try:
+            self._read_header()
+        except Exception:
+            self.file.close()
+            raise
+        self.position = 0
+        self._buffer = None
+        self._scratch = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        self.file.close()
+    
+    def _read_header(self):
+        header = self.file.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:] != b'WAVE':
+            raise ValueError(f"{self.path}: not a WAV file")
+        fmt = None
+        while True:
+            header = self.file.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{self.path}: no audio data")
+            chunk_id, size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                fmt = self.file.read(size)
+                if len(fmt) < 16:
+                    raise ValueError(f"{self.path}: truncated format chunk")
+                # Chunks are padded to an even size
+                self.file.seek(size & 1, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"{self.path}: audio data before its format")
+                break
+            else:
+                self.file.seek(size + (size & 1), os.SEEK_CUR)
+        
+        format_tag, self.channels, self.sample_rate, _, self.block_align, self.bits = \
+            struct.unpack('<HHIIHH', fmt[:16])
+        if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            # The real format is the first two bytes of the sub-format GUID
+            format_tag = struct.unpack('<H', fmt[24:26])[0]
+        if (format_tag, self.bits) not in SAMPLE_FORMATS or self.channels < 1:
+            raise ValueError(f"{self.path}: unsupported WAV format "
+                             f"(format {format_tag}, {self.bits} bits)")
+        self.dtype, self.offset, self.scale = SAMPLE_FORMATS[format_tag, self.bits]
+        self.sample_width = self.bits // 8
+        if self.block_align != self.channels * self.sample_width:
+            raise ValueError(f"{self.path}: unsupported WAV frame layout")
+        
+        # Files written while streaming may leave the size unset or too big
+        self.data_start = self.file.tell()
+        available = os.fstat(self.file.fileno()).st_size - self.data_start
+        self.frames = min(size, available) // self.block_align
+    
+    def read_into(self, out):
+        """Decode frames into out (frames, channels) float32; returns how many
+        
+        Stops when out is full or the file ends. out's channels are the
+        file's or fewer: see convert.fit_channels.
+        """
+        frames = min(len(out), self.frames - self.position)
+        direct = out.shape[1] == self.channels
+        # 24-bit samples are read one byte into the buffer, so each is the
+        # top three bytes of the (unaligned) int32 starting a byte earlier
+        lead = 1 if self.sample_width == 3 else 0
+        if self._buffer is None:
+            self._buffer = bytearray(lead + self.chunk_frames * self.block_align)
+            if lead:
+                self._scratch = np.empty(self.chunk_frames * self.channels, dtype=np.int32)
+        decoded = None
+        
+        done = 0
+        while done < frames:
+            count = min(self.chunk_frames, frames - done)
+            size = count * self.block_align
+            got = self.file.readinto(memoryview(self._buffer)[lead:lead + size])
+            count = got // self.block_align
+            if count == 0:
+                break
+            if lead:
+                samples = np.ndarray(count * self.channels, dtype='<i4', buffer=self._buffer,
+                                     strides=(3,))
+                # Clear the low byte, which belongs to the previous sample
+                samples = np.bitwise_and(samples, -256, out=self._scratch[:count * self.channels])
+            else:
+                samples = np.frombuffer(self._buffer, dtype=self.dtype, count=count * self.channels)
+            samples = samples.reshape(count, self.channels)
+            
+            if direct:
+                target = out[done:done + count]
+            else:
+                if decoded is None:
+                    decoded = np.empty((self.chunk_frames, self.channels), dtype=np.float32)
+                target = decoded[:count]
+            target[...] = samples
+            if self.offset:
+                target -= self.offset
+            if self.scale != 1.0:
+                target *= self.scale
+            if not direct:
+                out[done:done + count] = fit_channels(target, out.shape[1])
+            done += count
+        self.position += done
+        return done
+    
+    def read(self, channels=None, max_frames=None):
+        """The rest of the file (up to max_frames) as (frames, channels) float32
+        
+        channels as for read_into; mono files stay mono.
+        """
+        frames = self.frames - self.position
+        if max_frames is not None:
+            frames = min(frames, max_frames)
+        if channels is None or self.channels == 1:
+            channels = self.channels
+        elif self.channels < channels:
+            raise ValueError(f"{self.path}: {self.channels} channels can't be spread "
+                             f"over {channels}")
+        out = np.empty((frames, channels), dtype=np.float32)
+        done = self.read_into(out)
+        return out if done == frames else out[:done]
+
+def decode_wav(path, channels, sample_rate, max_frames=None):
+    """A WAV file as float32 audio ready for a looper's tracks
+    
+    At most channels wide (mono stays mono) and at sample_rate. max_frames
+    trims the audio, e.g. to the loop length, without decoding the rest.
+    """
+    with WavReader(path) as reader:
+        if not reader.frames:
+            raise ValueError(f"{path}: no audio frames")
+        if reader.sample_rate != sample_rate:
+            # Trimmed only once resampled, so the cut sees the right samples
+            audio = reader.read(channels)
+            audio = resample(audio, reader.sample_rate, sample_rate)
+            if max_frames is not None and len(audio) > max_frames:
+                audio = audio[:max_frames].copy()
+            return audio
+        return reader.read(channels, max_frames)
+
+def import_wav(looper, track_num, path, offset=0):
+    """Load a WAV file onto a track, trimmed or looped like a recorded take"""
+    audio = decode_wav(path, looper.channels, looper.sample_rate, looper.master_length)
+    looper.set_track_audio(track_num, audio, offset=offset, copy=False)
+
+def import_files(looper, paths, first_track=0, workers=None):
+    """Load WAV files onto consecutive tracks, decoding them in a thread pool
+    
+    The first file sets the loop length if no track has audio yet, and the
+    others are only decoded as far as the loop length. The tracks are
+    filled in order on the calling thread as their files finish.
+    """
+    if first_track + len(paths) > looper.num_tracks:
+        raise ValueError(f"{len(paths)} files don't fit on the looper's "
+                         f"{looper.num_tracks - first_track} tracks from track {first_track + 1}")
+    length = looper.master_length
+    if length is None and paths:
+        # The first file will set the loop length; its header tells it
+        with WavReader(paths[0]) as reader:
+            length = resampled_frames(reader.frames, reader.sample_rate, looper.sample_rate)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        decoded = [pool.submit(decode_wav, path, looper.channels, looper.sample_rate,
+                               None if i == 0 and looper.master_length is None else length)
+                   for i, path in enumerate(paths)]
+        for i, future in enumerate(decoded):
+            looper.set_track_audio(first_track + i, future.result(), copy=False)
+
+def import_folder(looper, directory, first_track=0, workers=None):
+    """Load the WAV files in a directory, in name order, onto the tracks
+    
+    Returns the paths loaded.
+    """
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.lower().endswith('.wav'))
+    import_files(looper, paths, first_track, workers)
+    return paths
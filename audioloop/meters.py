@@ -0,0 +1,98 @@
+import numpy as np
+
+class LevelMeters:
+    """Peak and RMS levels measured in the audio callbacks
+    
+    Slots 0..num_tracks-1 are the tracks (post-fader), then the master
+    output and the recording input. The callbacks write into the
+    preallocated peak/rms arrays in place and the GUI polls them at frame
+    rate; each slot has a single writer, so no lock is needed (a read can
+    at worst mix values from two consecutive blocks).
+    
+    Levels are reduced without allocating: ufuncs and axis reductions on
+    strided views make numpy allocate iterator buffers, so the audio is
+    first copied into contiguous scratch and reduced row by row with
+    reduceat, which doesn't.
+    """
+    def __init__(self, num_tracks):
+        self.num_tracks = num_tracks
+        self.master = num_tracks
+        self.input = num_tracks + 1
+        self.peak = np.zeros(num_tracks + 2, dtype=np.float32)
+        self.rms = np.zeros(num_tracks + 2, dtype=np.float32)
+        
+        # Per-track levels of the block so far, and of the current span
+        self._high = np.zeros(num_tracks, dtype=np.float32)
+        self._sumsq = np.zeros(num_tracks, dtype=np.float32)
+        self._tmp = np.zeros(num_tracks, dtype=np.float32)
+        self._span_samples = 0
+        # Where each track's row starts in the span scratch
+        self._rows = np.arange(num_tracks)
+        self._starts = np.zeros(num_tracks, dtype=np.intp)
+        self._first = np.zeros(1, dtype=np.intp)
+        # Contiguous scratch, grown to the largest span seen: the tracks'
+        # (written by the output callback) and one per measured slot, as the
+        # master and the input are measured from different callbacks
+        self._span_scratch = np.zeros(0, dtype=np.float32)
+        self._block_scratch = {self.master: np.zeros(0, dtype=np.float32),
+                               self.input: np.zeros(0, dtype=np.float32)}
+        # A slot's sum of squares, so rms only ever holds finished values
+        self._block_sumsq = {self.master: np.zeros(1, dtype=np.float32),
+                             self.input: np.zeros(1, dtype=np.float32)}
+    
+    def add_track_span(self, span, first):
+        """Fold a (num_tracks, samples) span of the tracks into the block's levels"""
+        samples = span.shape[1]
+        if len(self._span_scratch) < span.size:
+            self._span_scratch = np.zeros(span.size, dtype=np.float32)
+        flat = self._span_scratch[:span.size]
+        np.copyto(flat.reshape(span.shape), span)
+        np.multiply(self._rows, samples, out=self._starts)
+        
+        np.abs(flat, out=flat)
+        if first:
+            np.maximum.reduceat(flat, self._starts, out=self._high)
+        else:
+            np.maximum.reduceat(flat, self._starts, out=self._tmp)
+            np.maximum(self._high, self._tmp, out=self._high)
+        np.square(flat, out=flat)
+        if first:
+            np.add.reduceat(flat, self._starts, out=self._sumsq)
+            self._span_samples = samples
+        else:
+            np.add.reduceat(flat, self._starts, out=self._tmp)
+            np.add(self._sumsq, self._tmp, out=self._sumsq)
+            self._span_samples += samples
+    
+    def finish_tracks(self, gains):
+        """Publish the track levels of the block, scaled by the track gains"""
+        tracks = slice(0, self.num_tracks)
+        np.multiply(self._high, gains, out=self.peak[tracks])
+        np.divide(self._sumsq, self._span_samples, out=self._sumsq)
+        np.sqrt(self._sumsq, out=self._sumsq)
+        np.multiply(self._sumsq, gains, out=self.rms[tracks])
+    
+    def measure(self, slot, block):
+        """Publish the levels of one block of audio (master or input)"""
+        scratch = self._block_scratch[slot]
+        if len(scratch) < block.size:
+            scratch = self._block_scratch[slot] = np.zeros(block.size, dtype=np.float32)
+        flat = scratch[:block.size]
+        np.copyto(flat.reshape(block.shape), block)
+        level = slice(slot, slot + 1)
+        np.abs(flat, out=flat)
+        np.maximum.reduceat(flat, self._first, out=self.peak[level])
+        np.square(flat, out=flat)
+        sumsq = self._block_sumsq[slot]
+        np.add.reduceat(flat, self._first, out=sumsq)
+        np.divide(sumsq, block.size, out=sumsq)
+        np.sqrt(sumsq, out=self.rms[level])
+    
+    def clear(self, slot=None):
+        """Zero one slot, or every track and the master when slot is None"""
+        if slot is None:
+            self.peak[:self.input] = 0
+            self.rms[:self.input] = 0
+        else:
+            self.peak[slot] = 0
+            self.rms[slot] = 0
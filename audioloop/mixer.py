@@ -0,0 +1,288 @@
+import numpy as np
+import wave
+from .automation import GainRamps
+from .effects import copy_effects
+from .compact import CompactAudio
+
+# Largest block an export mixes at once
+EXPORT_BLOCK_FRAMES = 8192
+
+def mix_frames(gains, flat_tracks, out):
+    """out = gains @ flat_tracks for (num_tracks, samples) track data
+    
+    einsum sums the tracks in order for every sample, so the result does not
+    depend on how the loop is split into blocks (BLAS matmul does) and
+    matches adding the tracks one by one in float32.
+    """
+    np.einsum('t,tf->f', gains, flat_tracks, out=out)
+
+def read_looped(audio, position, out):
+    """Fill out with frames of audio repeated forever, from frame position on
+    
+    audio is an array or a CompactAudio, dequantized only as far as needed.
+    """
+    length = len(audio)
+    compact = isinstance(audio, CompactAudio)
+    done = 0
+    while done < len(out):
+        source = (position + done) % length
+        count = min(length - source, len(out) - done)
+        if compact:
+            audio.read(source, out[done:done + count])
+        else:
+            out[done:done + count] = audio[source:source + count]
+        done += count
+
+def gather_span(track_data, loops, start, count, out):
+    """Copy loop frames [start, start + count) of every track into out
+    
+    loops has one entry per track: None for a track stored in its
+    track_data row, or (audio, offset) for one kept at its own length. That
+    audio starts at loop position offset and repeats, restarting every time
+    round the loop, exactly as if it had been tiled into a full row.
+    out is (num_tracks, count * channels).
+    """
+    length, channels = track_data.shape[1:]
+    for t, loop in enumerate(loops):
+        row = out[t].reshape(count, channels)
+        if loop is None:
+            row[:] = track_data[t, start:start + count]
+        else:
+            audio, offset = loop
+            position = (start - offset) % length
+            first = min(count, length - position)
+            read_looped(audio, position, row[:first])
+            read_looped(audio, 0, row[first:])
+
+class MixEngine:
+    """Preallocated mixer for the real-time output callback
+    
+    Gain changes glide over a short ramp (see GainRamps) instead of
+    stepping, and automation events are applied at their exact frames.
+    """
+    def __init__(self, channels, max_frames=4096, num_tracks=0):
+        self.channels = channels
+        # Contiguous scratch block the tracks are mixed into, grown only if
+        # a stream ever delivers a block larger than max_frames
+        self.scratch = np.zeros((max_frames, channels), dtype=np.float32)
+        # Where the tracks' frames are gathered when some are shorter than
+        # the loop (see gather_span), and per-sample gains while ramping
+        self.gather = np.zeros((num_tracks, max_frames * channels), dtype=np.float32)
+        self.gain_samples = np.zeros((num_tracks, max_frames * channels), dtype=np.float32)
+        self.ramps = GainRamps(num_tracks, channels, max_frames)
+        
+        # Parameters the ramps were last aimed at, and where the next block
+        # should start if playback carries straight on
+        self._gains = None
+        self._loops = None
+        self._track_data = None
+        self._next_position = None
+    
+    def ensure_capacity(self, frames, num_tracks=0):
+        """Grow the scratch buffers (outside the hot path ideally)"""
+        if frames > len(self.scratch):
+            self.scratch = np.zeros((frames, self.channels), dtype=np.float32)
+        if num_tracks > len(self.gather) or frames * self.channels > self.gather.shape[1]:
+            shape = (max(num_tracks, len(self.gather)), len(self.scratch) * self.channels)
+            self.gather = np.zeros(shape, dtype=np.float32)
+            self.gain_samples = np.zeros(shape, dtype=np.float32)
+        if num_tracks != len(self.ramps.target):
+            self.ramps = GainRamps(num_tracks, self.channels, len(self.scratch))
+            self._gains = None
+        self.ramps.ensure_capacity(len(self.scratch))
+    
+    def _retarget(self, track_data, loops, gains, position):
+        """Aim the ramps at a new gains snapshot
+        
+        Only tracks whose gain changed ramp. A track whose audio was also
+        swapped (a take, clear, undo) jumps, so the old audio never plays
+        on at the new gain or the new audio at the old one.
+        """
+        if position != self._next_position or self._gains is None:
+            # Playback (re)started: begin at the gains as they are
+            self.ramps.reset(gains)
+        elif gains is not self._gains:
+            for t in range(len(gains)):
+                if gains[t] != self._gains[t]:
+                    hard = (track_data is not self._track_data or
+                            _loop_entry(loops, t) is not _loop_entry(self._loops, t))
+                    self.ramps.set(t, gains[t], position, hard)
+        self._gains = gains
+        self._loops = loops
+        self._track_data = track_data
+    
+    def _automate(self, automation, present, start, count, at):
+        """Apply the events at loop position start; returns count cut short
+        at the next event, so every event lands on its exact frame"""
+        positions = automation.positions
+        i = automation.first_at(start)
+        while i < len(positions) and positions[i] == start:
+            track = automation.tracks[i]
+            # Empty tracks stay silent (their row may hold stale audio)
+            if present is None or present[track]:
+                self.ramps.set(track, automation.gains[i], at)
+            i += 1
+        if i < len(positions) and positions[i] < start + count:
+            count = int(positions[i]) - start
+        return count
+    
+    def _mix_span(self, track_data, start, count, out, meters, first, loops, at, chains, present):
+        """out = sum over tracks of gain[t] * track_data[t, start:start + count]
+        
+        Tracks with insert effects in chains are run through them first.
+        """
+        num_tracks = len(self.ramps.target)
+        if loops is None and chains is None:
+            span = track_data[:, start:start + count].reshape(num_tracks, -1)
+        else:
+            # A copy, which the effects can process in place
+            span = self.gather[:num_tracks, :count * self.channels]
+            if loops is None:
+                rows = span.reshape(num_tracks, count, self.channels)
+                rows[:] = track_data[:, start:start + count]
+            else:
+                gather_span(track_data, loops, start, count, span)
+            if chains is not None:
+                for t, chain in enumerate(chains):
+                    if chain and (present is None or present[t]):
+                        row = span[t].reshape(count, self.channels)
+                        for effect in chain:
+                            effect.process(row, at)
+        if self.ramps.steady(at):
+            mix_frames(self.ramps.target, span, out.reshape(-1))
+        else:
+            gain_samples = self.gain_samples[:num_tracks, :count * self.channels]
+            self.ramps.fill(at, count, gain_samples)
+            np.einsum('tf,tf->f', gain_samples, span, out=out.reshape(-1))
+        if meters is not None:
+            meters.add_track_span(span, first)
+    
+    def mix(self, outdata, track_data, gains, position, length, meters=None, loops=None,
+            automation=None, present=None, effects=None):
+        """Mix the stacked tracks into outdata starting at loop position
+        
+        position counts frames since playback started (unwrapped); a block
+        that does not follow on from the previous one resets the ramps.
+        If meters (a LevelMeters) is given, the per-track and master levels
+        of the block are published to it. loops lists the tracks kept at
+        their own length, as for gather_span (None if there are none).
+        automation (an Automation) is replayed on the tracks present marks
+        as having audio. effects is (track chains, master chain) of insert
+        effects (see effects.py), or None; the track chains can be None too.
+        """
+        frames = len(outdata)
+        self.ensure_capacity(frames, len(gains))
+        self._retarget(track_data, loops, gains, position)
+        self._next_position = position + frames
+        if automation is not None and not len(automation):
+            automation = None
+        chains, master_chain = effects if effects is not None else (None, ())
+        mix = self.scratch[:frames]
+        
+        # Spans end at the loop wrap (more than once if the loop is shorter
+        # than a block) and at automation events
+        done = 0
+        while done < frames:
+            at = position + done
+            start = at % length
+            count = min(frames - done, length - start)
+            if automation is not None:
+                count = self._automate(automation, present, start, count, at)
+            self._mix_span(track_data, start, count, mix[done:done + count], meters, done == 0,
+                           loops, at, chains, present)
+            done += count
+        
+        for effect in master_chain:
+            effect.process(mix, position)
+        
+        # Clip to prevent distortion
+        np.clip(mix, -1.0, 1.0, out=outdata)
+        
+        if meters is not None:
+            meters.finish_tracks(self.ramps.target)
+            meters.measure(meters.master, outdata)
+
+def _loop_entry(loops, track):
+    return None if loops is None else loops[track]
+
+def float_to_pcm16(samples, out):
+    """Clip float samples and convert them to int16 in out
+    
+    samples is used as scratch space. The conversion truncates like
+    astype(np.int16), so the bytes match the original save_mix.
+    """
+    np.clip(samples, -1.0, 1.0, out=samples)
+    np.multiply(samples, 32767, out=samples)
+    np.copyto(out, samples, casting='unsafe')
+
+def write_mix(wav_file, track_data, gains, repeats=1, chunk_frames=65536, progress=None,
+              cancel=None, loops=None, automation=None, present=None, effects=None):
+    """Mix, clip and convert to int16 chunk by chunk, writing each to wav_file
+    
+    Memory use is bounded by chunk_frames regardless of loop length or
+    repeats. progress(frames_written, total_frames) is called after each chunk.
+    If the cancel event gets set, stops early and returns the frames written.
+    loops, automation, present and effects are as for MixEngine.mix. With
+    automation or effects the chunks go through a MixEngine, so the ramps
+    land on the same frames as in live playback from the start and the
+    effects give the same samples. The effects are copied first: the
+    export starts them from silence, as playback does, and never touches
+    the state of the ones playing.
+    """
+    num_tracks, length, channels = track_data.shape
+    flat = track_data.reshape(num_tracks, -1)
+    chunk_frames = min(chunk_frames, length)
+    mix = np.empty((chunk_frames, channels), dtype=np.float32)
+    pcm = np.empty(chunk_frames * channels, dtype=np.int16)
+    effects = copy_effects(effects)
+    if (automation is not None and len(automation)) or effects is not None:
+        # The engine mixes each chunk in blocks, keeping its scratch small
+        block_frames = min(chunk_frames, EXPORT_BLOCK_FRAMES)
+        engine = MixEngine(channels, block_frames, num_tracks)
+    else:
+        engine = None
+        if loops is not None:
+            gathered = np.empty((num_tracks, chunk_frames * channels), dtype=np.float32)
+    
+    total = length * repeats
+    written = 0
+    for _ in range(repeats):
+        for start in range(0, length, chunk_frames):
+            if cancel is not None and cancel.is_set():
+                return written
+            count = min(chunk_frames, length - start)
+            if engine is not None:
+                for block in range(0, count, block_frames):
+                    frames = min(block_frames, count - block)
+                    engine.mix(mix[block:block + frames], track_data, gains, written + block,
+                               length, loops=loops, automation=automation, present=present,
+                               effects=effects)
+            elif loops is None:
+                mix_frames(gains, flat[:, start * channels:(start + count) * channels],
+                           mix[:count].reshape(-1))
+            else:
+                span = gathered[:, :count * channels]
+                gather_span(track_data, loops, start, count, span)
+                mix_frames(gains, span, mix[:count].reshape(-1))
+            
+            out = pcm[:count * channels]
+            float_to_pcm16(mix[:count].reshape(-1), out)
+            wav_file.writeframes(out)
+            
+            written += count
+            if progress:
+                progress(written, total)
+    return written
+
+def export_wav(filepath, track_data, gains, sample_rate, repeats=1, chunk_frames=65536,
+               progress=None, cancel=None, loops=None, automation=None, present=None,
+               effects=None):
+    """Write the mix of track_data to a 16-bit WAV file"""
+    with wave.open(filepath, 'wb') as wav_file:
+        wav_file.setnchannels(track_data.shape[2])
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        return write_mix(wav_file, track_data, gains, repeats=repeats,
+                         chunk_frames=chunk_frames, progress=progress, cancel=cancel,
+                         loops=loops, automation=automation, present=present,
+                         effects=effects)
@@ -0,0 +1,113 @@
+import numpy as np
+
+class PeakPyramid:
+    """Multi-resolution min/max peaks of a track for waveform display
+    
+    Level 0 holds the min and max sample (over all channels) of every
+    base_block frames, and each level above halves the resolution by
+    combining pairs from the level below. Audio can be appended
+    incrementally, e.g. while a take is being recorded.
+    """
+    def __init__(self, base_block=64, levels=16):
+        self.base_block = base_block
+        self.frames = 0
+        self.counts = [0] * levels
+        self.mins = [np.empty(0, dtype=np.float32) for _ in range(levels)]
+        self.maxs = [np.empty(0, dtype=np.float32) for _ in range(levels)]
+        
+        # Frames of an incomplete level 0 block, waiting for more audio
+        self._partial = None
+        self._partial_count = 0
+    
+    @classmethod
+    def from_audio(cls, audio, base_block=64):
+        """Build the pyramid for a whole track"""
+        pyramid = cls(base_block)
+        pyramid.append(audio)
+        return pyramid
+    
+    def block_frames(self, level):
+        """Frames covered by one entry of a level"""
+        return self.base_block << level
+    
+    def append(self, audio):
+        """Add frames to the end of the pyramid"""
+        if len(audio) == 0:
+            return
+        if self._partial is None:
+            self._partial = np.empty((self.base_block, audio.shape[1]), dtype=np.float32)
+        self.frames += len(audio)
+        
+        # Finish the incomplete block first
+        if self._partial_count:
+            take = min(self.base_block - self._partial_count, len(audio))
+            self._partial[self._partial_count:self._partial_count + take] = audio[:take]
+            self._partial_count += take
+            audio = audio[take:]
+            if self._partial_count < self.base_block:
+                return
+            self._push(0, self._partial.min(keepdims=True).ravel(),
+                       self._partial.max(keepdims=True).ravel())
+            self._partial_count = 0
+        
+        # Whole blocks in one vectorized reduce
+        whole = len(audio) // self.base_block
+        if whole:
+            blocks = audio[:whole * self.base_block].reshape(whole, -1)
+            self._push(0, blocks.min(axis=1), blocks.max(axis=1))
+        
+        rest = len(audio) - whole * self.base_block
+        if rest:
+            self._partial[:rest] = audio[whole * self.base_block:]
+            self._partial_count = rest
+    
+    def truncate(self, frames):
+        """Drop everything past frames (rounded down to whole blocks)"""
+        self.frames = min(self.frames, frames)
+        for level in range(len(self.counts)):
+            self.counts[level] = min(self.counts[level], self.frames // self.block_frames(level))
+        self._partial_count = 0
+    
+    def _push(self, level, mins, maxs):
+        """Append entries to a level and carry complete pairs upwards"""
+        count = self.counts[level]
+        new_count = count + len(mins)
+        if new_count > len(self.mins[level]):
+            capacity = max(new_count, 2 * len(self.mins[level]), 64)
+            self.mins[level] = np.resize(self.mins[level], capacity)
+            self.maxs[level] = np.resize(self.maxs[level], capacity)
+        self.mins[level][count:new_count] = mins
+        self.maxs[level][count:new_count] = maxs
+        self.counts[level] = new_count
+        
+        if level + 1 < len(self.counts):
+            start = self.counts[level + 1] * 2
+            stop = new_count // 2 * 2
+            if stop > start:
+                pairs_min = self.mins[level][start:stop].reshape(-1, 2)
+                pairs_max = self.maxs[level][start:stop].reshape(-1, 2)
+                self._push(level + 1, pairs_min.min(axis=1), pairs_max.max(axis=1))
+    
+    def level_for(self, pixels):
+        """Finest level with no more entries than pixels"""
+        for level, count in enumerate(self.counts):
+            if count <= pixels:
+                return level
+        return len(self.counts) - 1
+    
+    def display(self, pixels, sample_rate):
+        """(times, values) for a line plot pixels wide
+        
+        Each entry becomes a min point followed by a max point, so the line
+        traces the envelope and transients are never decimated away. The
+        point count depends on pixels, not on the track length.
+        """
+        level = self.level_for(pixels)
+        count = self.counts[level]
+        block = self.block_frames(level)
+        
+        times = np.repeat(np.arange(count) * (block / sample_rate), 2)
+        values = np.empty(2 * count, dtype=np.float32)
+        values[0::2] = self.mins[level][:count]
+        values[1::2] = self.maxs[level][:count]
+        return times, values
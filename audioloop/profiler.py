@@ -0,0 +1,152 @@
+import csv
+import json
+import numpy as np
+from time import perf_counter_ns
+
+# Execution-time histogram: bin 0 counts callbacks under 1 us, bin k those
+# from 2**(k-1) up to 2**k us, and the last bin everything slower
+HISTOGRAM_BINS = 24
+HISTOGRAM_EDGES_US = [2 ** k for k in range(HISTOGRAM_BINS - 1)] + [float('inf')]
+
+# Status flags counted per callback (priming_output is not an xrun)
+STATUS_FLAGS = ('input_underflow', 'input_overflow', 'output_underflow', 'output_overflow')
+
+# Callback kinds, in slot order
+INPUT, OUTPUT, DUPLEX = 0, 1, 2
+KINDS = ('input', 'output', 'duplex')
+
+class CallbackProfiler:
+    """Execution times, deadline use and xruns of the audio callbacks
+    
+    There is one slot per callback kind. A callback passes the
+    perf_counter_ns() it started at to record(), which only does integer
+    arithmetic and stores into preallocated arrays: it never prints or
+    allocates. As with LevelMeters each slot has a single writer and the
+    GUI reads without a lock; stats() does the analysis on the reader's
+    thread.
+    
+    A callback's deadline is the duration of the frames it handles; one
+    that runs longer than that is counted as late. The execution times of
+    the last `recent` callbacks are kept for percentiles.
+    """
+    def __init__(self, sample_rate, recent=4096):
+        self.sample_rate = sample_rate
+        self.recent = recent
+        kinds = len(KINDS)
+        self.callbacks = np.zeros(kinds, dtype=np.int64)
+        self.total_ns = np.zeros(kinds, dtype=np.int64)
+        self.total_frames = np.zeros(kinds, dtype=np.int64)
+        self.max_ns = np.zeros(kinds, dtype=np.int64)
+        self.late = np.zeros(kinds, dtype=np.int64)
+        self.histogram = np.zeros((kinds, HISTOGRAM_BINS), dtype=np.int64)
+        self.recent_ns = np.zeros((kinds, recent), dtype=np.int64)
+        self.recent_frames = np.zeros((kinds, recent), dtype=np.int64)
+        self.flags = np.zeros((kinds, len(STATUS_FLAGS)), dtype=np.int64)
+        self.queue_depth = np.zeros(kinds, dtype=np.int64)
+        self.max_queue_depth = np.zeros(kinds, dtype=np.int64)
+        
+        # Flag counts already reported by report()
+        self._reported = np.zeros_like(self.flags)
+    
+    def record(self, slot, started, frames, queue_depth=0):
+        """Account one callback that started at perf_counter_ns() started"""
+        elapsed = perf_counter_ns() - started
+        count = int(self.callbacks[slot])
+        i = count % self.recent
+        self.recent_ns[slot, i] = elapsed
+        self.recent_frames[slot, i] = frames
+        self.total_ns[slot] += elapsed
+        self.total_frames[slot] += frames
+        if elapsed > self.max_ns[slot]:
+            self.max_ns[slot] = elapsed
+        # elapsed > frames / sample_rate seconds, in integers
+        if elapsed * self.sample_rate > frames * 1_000_000_000:
+            self.late[slot] += 1
+        self.histogram[slot, min((elapsed // 1000).bit_length(), HISTOGRAM_BINS - 1)] += 1
+        self.queue_depth[slot] = queue_depth
+        if queue_depth > self.max_queue_depth[slot]:
+            self.max_queue_depth[slot] = queue_depth
+        self.callbacks[slot] = count + 1
+    
+    def count_status(self, slot, status):
+        """Count the xrun flags a callback was called with"""
+        for flag, name in enumerate(STATUS_FLAGS):
+            if getattr(status, name):
+                self.flags[slot, flag] += 1
+    
+    def reset(self):
+        """Zero everything (a callback running meanwhile may keep one block)"""
+        for array in (self.callbacks, self.total_ns, self.total_frames, self.max_ns, self.late,
+                      self.histogram, self.flags, self.queue_depth, self.max_queue_depth,
+                      self._reported):
+            array[:] = 0
+    
+    def report(self):
+        """Messages for the xruns flagged since the last call
+        
+        Meant to be polled off the audio thread, which is where the
+        messages get logged.
+        """
+        messages = []
+        flags = self.flags.copy()
+        new = flags - self._reported
+        for slot, kind in enumerate(KINDS):
+            for flag, name in enumerate(STATUS_FLAGS):
+                if new[slot, flag]:
+                    messages.append(f"{kind.capitalize()} callback: {new[slot, flag]} x "
+                                    f"{name.replace('_', ' ')}")
+        self._reported[:] = flags
+        return messages
+    
+    def stats(self):
+        """Summary of every callback kind as plain Python values"""
+        stats = {}
+        for slot, kind in enumerate(KINDS):
+            count = int(self.callbacks[slot])
+            recent = min(count, self.recent)
+            times = self.recent_ns[slot, :recent] / 1000
+            budget_us = self.recent_frames[slot, :recent] * (1e6 / self.sample_rate)
+            total_budget_ns = int(self.total_frames[slot]) * 1e9 / self.sample_rate
+            entry = {
+                'callbacks': count,
+                'mean_us': int(self.total_ns[slot]) / count / 1000 if count else 0.0,
+                'p50_us': float(np.percentile(times, 50)) if recent else 0.0,
+                'p99_us': float(np.percentile(times, 99)) if recent else 0.0,
+                'max_us': int(self.max_ns[slot]) / 1000,
+                # Share of the real-time budget spent in the callback
+                'budget_percent': 100 * int(self.total_ns[slot]) / total_budget_ns if count else 0.0,
+                'peak_budget_percent': float(100 * (times / budget_us).max()) if recent else 0.0,
+                'late': int(self.late[slot]),
+                'queue_depth': int(self.queue_depth[slot]),
+                'max_queue_depth': int(self.max_queue_depth[slot]),
+            }
+            for flag, name in enumerate(STATUS_FLAGS):
+                entry[name] = int(self.flags[slot, flag])
+            entry['histogram'] = self.histogram[slot].tolist()
+            stats[kind] = entry
+        return stats
+
+def write_stats(stats, path):
+    """Dump MultiTrackLooper.callback_stats() to a .csv or .json file
+    
+    JSON keeps everything. CSV has one row per callback kind, with the
+    histogram as one column per bin, named by its upper edge in us.
+    """
+    if path.lower().endswith('.csv'):
+        bins = [f"hist_lt_{edge}us" for edge in HISTOGRAM_EDGES_US[:-1]]
+        bins.append(f"hist_ge_{HISTOGRAM_EDGES_US[-2]}us")
+        with open(path, 'w', newline='') as f:
+            writer = None
+            for kind in KINDS:
+                entry = dict(stats['callbacks'][kind])
+                histogram = entry.pop('histogram')
+                row = {'callback': kind}
+                row.update(entry)
+                row.update(zip(bins, histogram))
+                if writer is None:
+                    writer = csv.DictWriter(f, fieldnames=list(row))
+                    writer.writeheader()
+                writer.writerow(row)
+    else:
+        with open(path, 'w') as f:
+            json.dump(dict(stats, histogram_edges_us=HISTOGRAM_EDGES_US[:-1]), f, indent=4)
@@ -0,0 +1,87 @@
+import os
+import time
+import wave
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from .backends import NullBackend
+from .mixer import float_to_pcm16
+from .session import load_session
+
+def render_session(session_path, output_path, block_size=256, repeats=1, chunk_frames=65536,
+                   sample_rate=None):
+    """Render a session to a 16-bit WAV file without a sound card
+    
+    The looper's own audio_output_callback is driven through a NullBackend
+    in blocks of block_size frames, as fast as the CPU allows. The output
+    is at the session's sample rate unless sample_rate is given. Returns a
+    dict with the frames rendered and the time taken.
+    """
+    backend = NullBackend(blocksize=block_size)
+    looper = load_session(session_path, backend=backend, sample_rate=sample_rate)
+    if looper.master_length is None:
+        raise ValueError(f"{session_path}: session has no audio")
+    
+    channels = looper.channels
+    total = looper.master_length * repeats
+    # Whole blocks per chunk so the block size seen by the callback is constant
+    chunk_frames = max(block_size, chunk_frames // block_size * block_size)
+    mix = np.empty((chunk_frames, channels), dtype=np.float32)
+    pcm = np.empty(chunk_frames * channels, dtype=np.int16)
+    
+    stream = backend.output_stream(looper.sample_rate, channels, looper.dtype,
+                                   looper.audio_output_callback)
+    looper.playback_position = 0
+    looper.playing = True
+    stream.start()
+    
+    t0 = time.perf_counter()
+    with wave.open(output_path, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(looper.sample_rate)
+        
+        for start in range(0, total, chunk_frames):
+            count = min(chunk_frames, total - start)
+            backend.run(count, output=mix[:count])
+            out = pcm[:count * channels]
+            float_to_pcm16(mix[:count].reshape(-1), out)
+            wav_file.writeframes(out)
+    elapsed = time.perf_counter() - t0
+    
+    stream.close()
+    looper.playing = False
+    
+    return {
+        'session': session_path,
+        'output': output_path,
+        'frames': total,
+        'seconds': total / looper.sample_rate,
+        'elapsed': elapsed,
+    }
+
+def _render_job(args):
+    return render_session(*args)
+
+def render_sessions(jobs, workers=None):
+    """Render jobs, each a tuple of render_session() arguments
+    
+    More than one job is spread over a process pool. Yields each job's
+    result as it finishes.
+    """
+    if len(jobs) == 1 or workers == 1:
+        for job in jobs:
+            yield _render_job(job)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(_render_job, jobs):
+            yield result
+
+def output_path_for(session_path, output, multiple):
+    """Where to write a session's render given the -o argument"""
+    name = os.path.splitext(os.path.basename(session_path))[0] + '.wav'
+    if output is None:
+        return os.path.join(os.path.dirname(session_path), name)
+    if multiple or os.path.isdir(output):
+        return os.path.join(output, name)
+    return output
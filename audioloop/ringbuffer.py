@@ -0,0 +1,86 @@
+import numpy as np
+
+class RingBuffer:
+    """Preallocated single-producer/single-consumer ring buffer of audio frames
+    
+    The producer (an audio callback) only ever advances write_pos and the
+    consumer only ever advances read_pos, so no lock is needed. Both counters
+    grow monotonically; positions in the buffer are taken modulo capacity.
+    """
+    def __init__(self, capacity, channels, dtype=np.float32):
+        self.capacity = capacity
+        self.channels = channels
+        self.buffer = np.zeros((capacity, channels), dtype=dtype)
+        self.write_pos = 0
+        self.read_pos = 0
+        
+        # Overflow counters (written by the producer only)
+        self.overflows = 0
+        self.dropped_frames = 0
+    
+    def available(self):
+        """Number of frames written but not yet read"""
+        return self.write_pos - self.read_pos
+    
+    def free(self):
+        """Number of frames that can be written without overflowing"""
+        return self.capacity - (self.write_pos - self.read_pos)
+    
+    def reset(self):
+        """Discard everything (only call while the producer is idle)"""
+        self.read_pos = self.write_pos = 0
+        self.overflows = 0
+        self.dropped_frames = 0
+    
+    def write(self, data):
+        """Producer side: copy a block in, dropping what does not fit"""
+        frames = len(data)
+        free = self.free()
+        if frames > free:
+            self.overflows += 1
+            self.dropped_frames += frames - free
+            frames = free
+        
+        start = self.write_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        if first < frames:
+            self.buffer[:frames - first] = data[first:frames]
+        
+        # Publish only after the data is in place
+        self.write_pos += frames
+        return frames
+    
+    def read(self, frames=None):
+        """Consumer side: take up to frames frames out of the buffer
+        
+        Returns a view when the data is contiguous in the buffer (valid until
+        the producer wraps around onto it), otherwise a single copy.
+        """
+        available = self.available()
+        if frames is None or frames > available:
+            frames = available
+        
+        start = self.read_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        if first == frames:
+            data = self.buffer[start:start + frames]
+        else:
+            data = np.concatenate((self.buffer[start:], self.buffer[:frames - first]))
+        
+        self.read_pos += frames
+        return data
+    
+    def segments(self, start, stop):
+        """Views of the frames at absolute positions [start, stop) without consuming
+        
+        Up to two views (the span may wrap). The caller must make sure the
+        producer has not overwritten them yet.
+        """
+        frames = stop - start
+        begin = start % self.capacity
+        first = min(frames, self.capacity - begin)
+        views = [self.buffer[begin:begin + first]]
+        if first < frames:
+            views.append(self.buffer[:frames - first])
+        return views
@@ -0,0 +1,121 @@
+import numpy as np
+from .backends import NullBackend
+from .compact import CompactAudio
+
+# Scenes: named loop sets, each with its own tracks, loop length, volumes
+# and mutes, that the looper switches between at a loop boundary. Insert
+# effects and automation belong to the looper's channels and carry over.
+#
+# A switch is prepared on a worker thread (loaded, paged in and turned
+# into a mix snapshot), handed to the audio callback, which swaps
+# snapshots on the boundary frame, and then adopted by the looper's own
+# state on the GUI thread (MultiTrackLooper.update_scenes).
+
+# Bytes between the samples read to page a scene's buffers in
+PAGE_SIZE = 4096
+
+class Scene:
+    """A named loop set, held in memory or loaded from a session on demand"""
+    def __init__(self, name, path=None):
+        self.name = name
+        # Session file the scene is loaded from when first prepared
+        self.path = path
+        # (track_data, tracks, loops, peaks, master_length, volumes,
+        # enabled) as the looper keeps them, once captured or loaded
+        self.state = None
+    
+    def capture(self, looper):
+        """Take the looper's current tracks as this scene's
+        
+        Only references: track audio is never written once stored.
+        """
+        self.state = (looper.track_data, list(looper.tracks), list(looper.track_loops),
+                      list(looper.track_peaks), looper.master_length,
+                      list(looper.track_volumes), list(looper.track_enabled))
+    
+    def restore(self, looper):
+        """Make this scene's tracks the looper's (the caller publishes them)"""
+        track_data, tracks, loops, peaks, master_length, volumes, enabled = self.state
+        looper.track_data = track_data
+        looper.tracks = list(tracks)
+        looper.track_loops = list(loops)
+        looper.track_peaks = list(peaks)
+        looper.master_length = master_length
+        looper.track_volumes = list(volumes)
+        looper.track_enabled = list(enabled)
+    
+    def load(self, looper):
+        """Load the scene from its session, if not done yet (off the GUI thread)
+        
+        Read into a looper of its own with the same settings, so it is
+        converted exactly like a session opened directly.
+        """
+        if self.state is not None:
+            return
+        from .engine import MultiTrackLooper
+        from .session import load_session
+        scratch = MultiTrackLooper(num_tracks=looper.num_tracks, max_record_seconds=1,
+                                   backend=NullBackend(), sample_rate=looper.sample_rate,
+                                   channels=looper.channels, compact=looper.compact)
+        load_session(self.path, looper=scratch)
+        self.capture(scratch)
+    
+    def page_in(self):
+        """Touch every page of the audio the mixer will read
+        
+        Memory-mapped and freshly allocated buffers are only read in (or
+        mapped) on first access; doing it here keeps those page faults out
+        of the audio callback.
+        """
+        track_data, tracks, loops, _, _, _, _ = self.state
+        for t, track in enumerate(tracks):
+            if track is None:
+                continue
+            if loops[t] is None:
+                _touch(track_data[t])
+            else:
+                audio = loops[t][0]
+                if isinstance(audio, CompactAudio):
+                    _touch(audio.data)
+                    _touch(audio.scales)
+                else:
+                    _touch(audio)
+
+class SceneSwitch:
+    """A prepared change of scene, as handed to the audio callback
+    
+    at is the loop position (in frames since the current scene started)
+    the new scene starts on; None means the next loop boundary, which the
+    callback fills in.
+    """
+    def __init__(self, scene, at=None):
+        self.scene = scene
+        self.at = at
+        self.mix_params = None
+        # Entry of the song this switch plays, in song mode
+        self.song_index = None
+        # Whether the looper has taken on the scene's state yet
+        self.entered = False
+
+def _touch(array):
+    """Read one sample per page of a contiguous array"""
+    flat = array.reshape(-1)
+    step = max(PAGE_SIZE // array.itemsize, 1)
+    return float(np.sum(flat[::step], dtype=np.float64))
+
+def parse_song(text):
+    """Song entries from text like "verse x2, chorus x4, outro"
+    
+    Returns [(scene name, repeats), ...]; a scene without xN plays once.
+    """
+    song = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, repeats = item.rpartition(' x')
+        if name and repeats.isdigit():
+            song.append((name.strip(), int(repeats)))
+        else:
+            song.append((item, 1))
+    return song
@@ -0,0 +1,184 @@
+import json
+import os
+import numpy as np
+from .engine import MultiTrackLooper
+from .mixer import gather_span
+from .automation import Automation
+from .convert import resample, fit_channels
+from .importer import WavReader, import_files
+from .effects import effect_from_dict
+
+# A session file is JSON describing the tracks to load, e.g.
+#
+#   {
+#       "sample_rate": 44100,
+#       "tracks": [
+#           {"path": "drums.wav", "volume": 0.8},
+#           {"path": "bass.wav", "muted": true}
+#       ]
+#   }
+#
+# Paths are relative to the session file. As with recording, the first
+# track sets the loop length and later ones are trimmed or looped to it.
+# Files at another sample rate than the looper's are resampled on load,
+# and mono files stay mono.
+# Either form can also have volume/mute automation, as a list of
+# [loop position in frames, track, gain] events:
+#
+#   "automation": [[0, 1, 0.0], [22050, 1, 0.8]]
+#
+# and insert effects (see effects.py), per track and on the master bus:
+#
+#   {"path": "bass.wav", "effects": [{"type": "biquad", "kind": "highpass", "freq": 40}]}
+#   "master_effects": [{"type": "compressor", "threshold_db": -12}]
+#
+# save_session writes the other form: the raw float32 track block as
+# tracks.npy next to the manifest, with one entry per row:
+#
+#   {
+#       "sample_rate": 44100,
+#       "channels": 2,
+#       "data": "tracks.npy",
+#       "tracks": [{"volume": 1.0, "muted": false, "empty": false}, ...]
+#   }
+#
+# That block is memory-mapped on load rather than read, so opening is
+# near-instant, the audio lives in the page cache and the output callback
+# mixes straight from the mapped pages.
+
+SESSION_FILE = 'session.json'
+DATA_FILE = 'tracks.npy'
+
+def read_wav(path, channels=2):
+    """Read a WAV file as float32 frames, at most channels wide
+    
+    Returns the audio and the file's sample rate. Mono files are returned
+    as one channel; see convert.fit_channels.
+    """
+    with WavReader(path) as reader:
+        return reader.read(channels), reader.sample_rate
+
+def _manifest_path(path):
+    """Session files can be given directly or as the directory holding them"""
+    if os.path.isdir(path):
+        return os.path.join(path, SESSION_FILE)
+    return path
+
+def load_session(path, backend=None, looper=None, sample_rate=None):
+    """Create a looper holding the tracks described by a session file
+    
+    The looper runs at sample_rate if given, otherwise at the session's.
+    If looper is given, the tracks are loaded into it instead (its track
+    count must match for saved sessions, and playback should be stopped).
+    Tracks at another rate are resampled to the looper's.
+    """
+    path = _manifest_path(path)
+    with open(path) as f:
+        session = json.load(f)
+    
+    base_dir = os.path.dirname(os.path.abspath(path))
+    tracks = session.get('tracks', [])
+    session_rate = session.get('sample_rate', 44100)
+    if looper is None:
+        looper = MultiTrackLooper(num_tracks=max(len(tracks), 1), backend=backend,
+                                  sample_rate=sample_rate or session_rate,
+                                  channels=session.get('channels', 2))
+    
+    events = session.get('automation', [])
+    if session_rate != looper.sample_rate:
+        # Event positions are frames, so they move with the resampled audio
+        events = [[round(position * looper.sample_rate / session_rate), track, gain]
+                  for position, track, gain in events]
+    looper.automation = Automation.from_list(events)
+    for i in range(looper.num_tracks):
+        chain = tracks[i].get('effects', []) if i < len(tracks) else []
+        looper.set_track_effects(i, [effect_from_dict(e) for e in chain])
+    looper.set_master_effects([effect_from_dict(e) for e in session.get('master_effects', [])])
+    if 'data' in session:
+        # Copy-on-write mapping: new takes never modify the file
+        data_path = os.path.join(base_dir, session['data'])
+        track_data = np.load(data_path, mmap_mode='c')
+        if session_rate != looper.sample_rate or track_data.shape[2] != looper.channels:
+            # Converted into memory once; the mapping is no use then
+            track_data = np.stack([resample(fit_channels(row, looper.channels), session_rate,
+                                            looper.sample_rate)
+                                   for row in track_data])
+            if track_data.shape[2] != looper.channels:
+                track_data = np.repeat(track_data, looper.channels, axis=2)
+        else:
+            _prefetch(data_path)
+        looper.load_tracks(np.asarray(track_data),
+                           volumes=[track.get('volume', 1.0) for track in tracks],
+                           enabled=[not track.get('muted', False) for track in tracks],
+                           empty=[track.get('empty', False) for track in tracks])
+        return looper
+    
+    if len(tracks) > looper.num_tracks:
+        raise ValueError(f"{path}: {len(tracks)} tracks, looper has {looper.num_tracks}")
+    for i in range(looper.num_tracks):
+        if looper.tracks[i] is not None:
+            looper.clear_track(i)
+    import_files(looper, [os.path.join(base_dir, track['path']) for track in tracks])
+    for i, track in enumerate(tracks):
+        looper.set_track_volume(i, track.get('volume', 1.0))
+        if track.get('muted', False):
+            looper.toggle_track(i)
+    # As with saved sessions, loading starts a fresh undo history
+    looper.history.clear()
+    
+    return looper
+
+def _prefetch(path):
+    """Ask the OS to start reading a file into the page cache in the background
+    
+    Keeps the first playback blocks after a cold open from page-faulting
+    on disk reads in the audio callback.
+    """
+    if hasattr(os, 'posix_fadvise'):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+def save_session(looper, directory):
+    """Save the looper's tracks losslessly as a session directory
+    
+    Returns the path of the session manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    session = {
+        'sample_rate': looper.sample_rate,
+        'channels': looper.channels,
+        'tracks': [{'volume': looper.track_volumes[i],
+                    'muted': not looper.track_enabled[i],
+                    'empty': looper.tracks[i] is None}
+                   for i in range(looper.num_tracks)],
+    }
+    if len(looper.automation):
+        session['automation'] = looper.automation.to_list()
+    for i, chain in enumerate(looper.track_effects):
+        if chain:
+            session['tracks'][i]['effects'] = [effect.to_dict() for effect in chain]
+    if looper.master_effects:
+        session['master_effects'] = [effect.to_dict() for effect in looper.master_effects]
+    
+    if looper.track_data is not None:
+        # Write next to the old file and swap it in, so a session that is
+        # currently mapped (e.g. saving back over it) is never truncated
+        data_path = os.path.join(directory, DATA_FILE)
+        tmp_path = data_path + '.tmp'
+        data = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32,
+                                         shape=looper.track_data.shape)
+        # Tracks kept at their own length are saved looped out to full rows
+        gather_span(looper.track_data, looper.track_loops, 0, looper.master_length,
+                    data.reshape(looper.num_tracks, -1))
+        data.flush()
+        del data
+        os.replace(tmp_path, data_path)
+        session['data'] = DATA_FILE
+    
+    manifest_path = os.path.join(directory, SESSION_FILE)
+    with open(manifest_path, 'w') as f:
+        json.dump(session, f, indent=4)
+    return manifest_path
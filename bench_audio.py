@@ -0,0 +1,601 @@
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import wave
+from audioloop.ringbuffer import RingBuffer
+from audioloop.mixer import write_mix
+from audioloop.engine import MultiTrackLooper
+from audioloop.backends import NullBackend
+from audioloop.session import load_session, save_session, DATA_FILE
+from audioloop.importer import import_files
+from audioloop.effects import Biquad, Delay, Pan, Compressor
+
+# Headless micro-benchmarks for the looper's audio hot paths. NullBackend
+# stands in for sounddevice, so no sound card (or sounddevice) is needed.
+# Run with: python bench_audio.py [--quick] [--json results.json]
+#                                 [--compare old.json] [--only output export ...]
+#
+# Every bench prints a table and returns rows of results: a 'case' label
+# plus numbers. --json saves them with the commit and machine they came
+# from, and --compare prints how the timings moved against an older file.
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+TAKE_SECONDS = 10
+
+# Callback timing repeats per case (--quick lowers it)
+REPEATS = 2000
+
+# Output callback grid
+BLOCK_SIZES = (32, 64, 128, 256, 512, 1024, 2048)
+TRACK_COUNTS = (1, 4, 16)
+LOOP_SECONDS = (1, 10, 30)
+
+def summarize(name, block_times_ns, finish_ns):
+    times = np.array(block_times_ns) / 1000.0
+    print(f"  {name:<6} mean {times.mean():7.2f} us   p99 {np.percentile(times, 99):7.2f} us"
+          f"   max {times.max():8.2f} us   finish {finish_ns / 1e6:7.2f} ms")
+    return {'mean_us': float(times.mean()), 'p99_us': float(np.percentile(times, 99)),
+            'max_us': float(times.max()), 'finish_ms': finish_ns / 1e6}
+
+def time_stats(times_us):
+    """Summary numbers of per-call times in us"""
+    return {'mean_us': float(times_us.mean()), 'p50_us': float(np.percentile(times_us, 50)),
+            'p99_us': float(np.percentile(times_us, 99)), 'max_us': float(times_us.max())}
+
+def random_tracks(num_tracks, frames, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((num_tracks, frames, CHANNELS), dtype=np.float32)
+            * np.float32(0.3))
+
+def bench_queue_path(blocks):
+    """The old path: copy + Queue.put per block, polling thread, concatenate"""
+    audio_queue = queue.Queue()
+    audio_buffer = []
+    state = {'recording': True}
+    
+    def record_thread():
+        while state['recording']:
+            try:
+                audio_buffer.append(audio_queue.get(timeout=0.1))
+            except queue.Empty:
+                continue
+    
+    thread = threading.Thread(target=record_thread, daemon=True)
+    thread.start()
+    
+    block_times = []
+    for block in blocks:
+        t0 = time.perf_counter_ns()
+        audio_queue.put(block.copy())
+        block_times.append(time.perf_counter_ns() - t0)
+    
+    t0 = time.perf_counter_ns()
+    state['recording'] = False
+    thread.join()
+    while not audio_queue.empty():
+        audio_buffer.append(audio_queue.get_nowait())
+    take = np.concatenate(audio_buffer, axis=0)
+    finish = time.perf_counter_ns() - t0
+    return block_times, finish, len(take)
+
+def bench_ring_path(blocks, ring):
+    """The ring buffer path: one copy into preallocated memory per block"""
+    ring.reset()
+    block_times = []
+    for block in blocks:
+        t0 = time.perf_counter_ns()
+        ring.write(block)
+        block_times.append(time.perf_counter_ns() - t0)
+    
+    t0 = time.perf_counter_ns()
+    take = ring.read()
+    finish = time.perf_counter_ns() - t0
+    return block_times, finish, len(take)
+
+def bench_looper_path(blocks, looper):
+    """The looper's own path: audio_input_callback per block, then stop_recording"""
+    looper.start_recording(0)
+    block_times = []
+    for block in blocks:
+        t0 = time.perf_counter_ns()
+        looper.audio_input_callback(block, len(block), None, None)
+        block_times.append(time.perf_counter_ns() - t0)
+    
+    t0 = time.perf_counter_ns()
+    looper.stop_recording()
+    finish = time.perf_counter_ns() - t0
+    return block_times, finish, looper.master_length
+
+def bench_record_path():
+    print(f"Record path: {TAKE_SECONDS} s take, {CHANNELS} ch @ {SAMPLE_RATE} Hz")
+    ring = RingBuffer(TAKE_SECONDS * SAMPLE_RATE, CHANNELS)
+    rng = np.random.default_rng(0)
+    rows = []
+    for block_size in (32, 64, 256):
+        n_blocks = TAKE_SECONDS * SAMPLE_RATE // block_size
+        source = rng.standard_normal((block_size, CHANNELS)).astype(np.float32)
+        blocks = [source] * n_blocks
+        print(f" block size {block_size} ({n_blocks} blocks)")
+        looper = MultiTrackLooper(num_tracks=1, max_record_seconds=TAKE_SECONDS,
+                                  backend=NullBackend(blocksize=block_size))
+        for name, run in (("queue", lambda: bench_queue_path(blocks)),
+                          ("ring", lambda: bench_ring_path(blocks, ring)),
+                          ("looper", lambda: bench_looper_path(blocks, looper))):
+            block_times, finish, frames = run()
+            row = {'case': f"{name} block {block_size}", 'path': name,
+                   'block_size': block_size}
+            row.update(summarize(name, block_times, finish))
+            # Recorded seconds per second spent in the callbacks and finishing
+            row['realtime_factor'] = frames / SAMPLE_RATE / ((sum(block_times) + finish) / 1e9)
+            rows.append(row)
+        if ring.overflows:
+            print(f"  ring overflowed: {ring.dropped_frames} frames dropped")
+    return rows
+
+def time_callback(callback, block, repeats=None):
+    """Per-call times (ns) of an audio callback on one block"""
+    repeats = repeats or REPEATS
+    for _ in range(50):
+        callback(block, len(block), None, None)
+    times = np.empty(repeats, dtype=np.int64)
+    for i in range(repeats):
+        t0 = time.perf_counter_ns()
+        callback(block, len(block), None, None)
+        times[i] = time.perf_counter_ns() - t0
+    return times
+
+def bench_output_callback():
+    print("\nOutput callback per block (metering on)")
+    rows = []
+    for seconds in LOOP_SECONDS:
+        for num_tracks in TRACK_COUNTS:
+            looper = MultiTrackLooper(num_tracks=num_tracks, backend=NullBackend())
+            looper.load_tracks(random_tracks(num_tracks, seconds * SAMPLE_RATE))
+            looper.playing = True
+            print(f" {num_tracks} tracks, {seconds} s loop")
+            for block_size in BLOCK_SIZES:
+                block = np.zeros((block_size, CHANNELS), dtype=np.float32)
+                # Fewer repeats for long blocks, so every case takes about as long
+                times = time_callback(looper.audio_output_callback, block,
+                                      max(REPEATS * 64 // max(block_size, 64), 100)) / 1000.0
+                row = {'case': f"block {block_size} tracks {num_tracks} loop {seconds}s",
+                       'block_size': block_size, 'tracks': num_tracks, 'loop_seconds': seconds}
+                row.update(time_stats(times))
+                # Share of the block's real-time deadline used on average
+                row['deadline_percent'] = 100 * row['mean_us'] / (block_size * 1e6 / SAMPLE_RATE)
+                rows.append(row)
+                print(f"  block size {block_size:<5} mean {row['mean_us']:7.1f} us  p99 "
+                      f"{row['p99_us']:7.1f} us  max {row['max_us']:8.1f} us  "
+                      f"deadline {row['deadline_percent']:5.1f}%")
+            # Free these tracks before the next set is allocated
+            del looper
+    return rows
+
+# Inserts timed by bench_effects
+EFFECT_CASES = (
+    ("highpass", lambda: Biquad('highpass', 80)),
+    ("peak EQ", lambda: Biquad('peak', 2500, 1.0, 4.0)),
+    ("delay", lambda: Delay(0.25, 0.4, 0.3)),
+    ("pan", lambda: Pan(-0.3)),
+    ("compressor", lambda: Compressor()),
+)
+
+def bench_effects():
+    block_size, num_tracks = 64, 4
+    budget_us = block_size * 1e6 / SAMPLE_RATE
+    print(f"\nInsert effects: output callback, {num_tracks} tracks, block {block_size} "
+          f"({budget_us:.0f} us deadline)")
+    looper = MultiTrackLooper(num_tracks=num_tracks, backend=NullBackend())
+    looper.load_tracks(random_tracks(num_tracks, 10 * SAMPLE_RATE))
+    looper.playing = True
+    block = np.zeros((block_size, CHANNELS), dtype=np.float32)
+    plain = time_stats(time_callback(looper.audio_output_callback, block) / 1000.0)['mean_us']
+    print(f"  {'no effects':<12} callback {plain:7.1f} us")
+    rows = [{'case': "no effects", 'mean_us': plain}]
+    
+    for name, make in EFFECT_CASES:
+        # One and then two of the effect on every track: the difference is
+        # the cost of an insert, the rest the cost of having effects at all
+        means = []
+        for inserts in (1, 2):
+            for t in range(num_tracks):
+                looper.set_track_effects(t, [make() for _ in range(inserts)])
+            means.append(time_stats(time_callback(looper.audio_output_callback, block)
+                                    / 1000.0)['mean_us'])
+        insert_us = max((means[1] - means[0]) / num_tracks, 0.01)
+        fixed_us = means[0] - num_tracks * insert_us
+        fits = int((budget_us - fixed_us) / insert_us)
+        print(f"  {name:<12} per insert {insert_us:6.1f} us   callback with {num_tracks} "
+              f"{means[0]:7.1f} us   ~{fits} inserts fit the deadline")
+        rows.append({'case': name, 'insert_us': insert_us, 'mean_us': means[0],
+                     'inserts_per_block': fits})
+    
+    # Master bus: the same inserts on the mix
+    for t in range(num_tracks):
+        looper.set_track_effects(t, [])
+    for name, make in EFFECT_CASES:
+        looper.set_master_effects([make()])
+        mean = time_stats(time_callback(looper.audio_output_callback, block) / 1000.0)['mean_us']
+        print(f"  master {name:<12} callback {mean:7.1f} us")
+        rows.append({'case': f"master {name}", 'mean_us': mean})
+    return rows
+
+def bench_compact():
+    num_tracks, seconds = 8, 30
+    print(f"\nCompact storage: {num_tracks} tracks x {seconds} s, {CHANNELS} ch @ {SAMPLE_RATE} Hz")
+    track_data = random_tracks(num_tracks, seconds * SAMPLE_RATE)
+    volumes = [1.0 / num_tracks] * num_tracks
+    rows = []
+    players = []
+    # float32 as one block, as takes (mixed through the same gather as
+    # compact tracks, so the difference is the dequantizing) and compact
+    for name, storage in (("float32", None), ("takes", None), ("int16", 'int16'),
+                          ("float16", 'float16')):
+        looper = MultiTrackLooper(num_tracks=num_tracks, backend=NullBackend(), compact=storage)
+        if name == "takes":
+            for t in range(num_tracks):
+                looper.set_track_audio(t, track_data[t])
+                looper.set_track_volume(t, volumes[t])
+        else:
+            looper.load_tracks(track_data, volumes=volumes)
+        looper.playing = True
+        players.append(looper)
+        # Bytes the tracks keep resident: rows of the block that are used,
+        # and takes (compact ones leave the block untouched)
+        stored = sum(looper.track_data[t].nbytes if loop is None else loop[0].nbytes
+                     for t, loop in enumerate(looper.track_loops))
+        row = {'case': name, 'track_mb': stored / 1e6}
+        line = f"  {name:<8} tracks {stored / 1e6:7.1f} MB"
+        for block_size in (64, 512):
+            block = np.zeros((block_size, CHANNELS), dtype=np.float32)
+            mean = time_stats(time_callback(looper.audio_output_callback, block)
+                              / 1000.0)['mean_us']
+            row[f"block_{block_size}_us"] = mean
+            line += f"   block {block_size} {mean:6.1f} us"
+        if storage is not None:
+            # Worst difference from float32 playback over a second of output
+            outputs = []
+            for player in (players[0], looper):
+                player.playback_position = 0
+                out = np.zeros((SAMPLE_RATE, CHANNELS), dtype=np.float32)
+                for start in range(0, len(out), 512):
+                    player.audio_output_callback(out[start:start + 512], 512, None, None)
+                outputs.append(out)
+            error = np.abs(outputs[1] - outputs[0]).max()
+            row['max_error_db'] = 20 * np.log10(max(error, 1e-12))
+            line += f"   max error {row['max_error_db']:6.1f} dBFS"
+        print(line)
+        rows.append(row)
+    return rows
+
+def export_full_buffer(wav_file, track_data, gains):
+    """The old save_mix: whole-loop float32 mix and int16 copy in memory"""
+    num_tracks, length, channels = track_data.shape
+    mix = np.einsum('t,tf->f', gains, track_data.reshape(num_tracks, -1))
+    mix = np.clip(mix, -1.0, 1.0)
+    wav_file.writeframes((mix * 32767).astype(np.int16).tobytes())
+
+def bench_export():
+    num_tracks, seconds = 8, 60
+    print(f"\nExport: {num_tracks} tracks x {seconds} s, {CHANNELS} ch @ {SAMPLE_RATE} Hz")
+    track_data = random_tracks(num_tracks, seconds * SAMPLE_RATE)
+    gains = np.full(num_tracks, 0.5, dtype=np.float32)
+    looper = MultiTrackLooper(num_tracks=num_tracks, backend=NullBackend())
+    looper.load_tracks(track_data, volumes=[0.5] * num_tracks)
+    rows = []
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'mix.wav')
+        for name, export in (("full", lambda f: export_full_buffer(f, track_data, gains)),
+                             ("stream", lambda f: write_mix(f, track_data, gains)),
+                             ("save", None)):
+            # Truncating the last case's file can be slow; start from none
+            if os.path.exists(path):
+                os.remove(path)
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            if export is None:
+                # The looper's save_mix, file handling included
+                looper.save_mix(path)
+            else:
+                wav_file = wave.open(path, 'wb')
+                wav_file.setnchannels(CHANNELS)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(SAMPLE_RATE)
+                export(wav_file)
+                wav_file.close()
+            elapsed = time.perf_counter() - t0
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            throughput = seconds / elapsed
+            print(f"  {name:<6} {elapsed * 1000:8.1f} ms   peak memory {peak / 2**20:8.2f} MiB"
+                  f"   {throughput:7.0f}x realtime")
+            rows.append({'case': name, 'elapsed_ms': elapsed * 1000,
+                         'peak_memory_mib': peak / 2**20, 'realtime_factor': throughput})
+    return rows
+
+def bench_metering():
+    print("\nMetering and profiling overhead per callback (10 s loop)")
+    rng = np.random.default_rng(0)
+    rows = []
+    for num_tracks in (4, 16):
+        looper = MultiTrackLooper(num_tracks=num_tracks, backend=NullBackend())
+        looper.load_tracks(random_tracks(num_tracks, 10 * SAMPLE_RATE))
+        looper.playing = True
+        for block_size in (64, 256):
+            block = np.zeros((block_size, CHANNELS), dtype=np.float32)
+            indata = rng.standard_normal((block_size, CHANNELS)).astype(np.float32)
+            print(f" {num_tracks} tracks, block size {block_size}")
+            for label, metering, profiling in (("plain", False, False),
+                                               ("timed", False, True),
+                                               ("meters", True, True)):
+                looper.metering = metering
+                looper.profiling = profiling
+                out_times = time_callback(looper.audio_output_callback, block) / 1000.0
+                in_times = time_callback(looper.audio_input_callback, indata) / 1000.0
+                print(f"  {label:<6} output mean {out_times.mean():6.1f} us  p99 "
+                      f"{np.percentile(out_times, 99):6.1f} us   input mean "
+                      f"{in_times.mean():5.1f} us  p99 {np.percentile(in_times, 99):5.1f} us")
+                rows.append({'case': f"{label} tracks {num_tracks} block {block_size}",
+                             'output_mean_us': float(out_times.mean()),
+                             'output_p99_us': float(np.percentile(out_times, 99)),
+                             'input_mean_us': float(in_times.mean()),
+                             'input_p99_us': float(np.percentile(in_times, 99))})
+    return rows
+
+def bench_short_takes():
+    seconds, phrase_seconds = 30, 2
+    print(f"\nShort takes: {phrase_seconds} s phrases over a {seconds} s loop")
+    loop = random_tracks(1, seconds * SAMPLE_RATE)[0]
+    phrase = random_tracks(1, phrase_seconds * SAMPLE_RATE, seed=1)[0]
+    rows = []
+    
+    # Memory to store one phrase: the old tile-and-trim vs its own length
+    tracemalloc.start()
+    loops_needed = int(np.ceil(len(loop) / len(phrase)))
+    tiled = np.tile(phrase, (loops_needed, 1))[:len(loop)].copy()
+    tile_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    looper = MultiTrackLooper(num_tracks=4, backend=NullBackend())
+    looper.set_track_audio(0, loop)
+    tracemalloc.start()
+    looper.set_track_audio(1, phrase)
+    native_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  store one take: tiled {tile_peak / 1e6:6.1f} MB   native {native_peak / 1e6:6.1f} MB")
+    rows.append({'case': "store one take", 'tiled_mb': tile_peak / 1e6,
+                 'native_mb': native_peak / 1e6})
+    
+    # Playback cost: phrases tiled into the track block vs repeated by the mixer
+    for i in (2, 3):
+        looper.set_track_audio(i, phrase)
+    tiled_looper = MultiTrackLooper(num_tracks=4, backend=NullBackend())
+    tiled_looper.load_tracks(np.stack([loop, tiled, tiled, tiled]))
+    for block_size in (64, 256):
+        block = np.zeros((block_size, CHANNELS), dtype=np.float32)
+        for name, player in (("tiled", tiled_looper), ("native", looper)):
+            player.playing = True
+            times = time_callback(player.audio_output_callback, block) / 1000.0
+            print(f"  block size {block_size:<4} {name:<6} output mean {times.mean():6.1f} us"
+                  f"  p99 {np.percentile(times, 99):6.1f} us")
+            row = {'case': f"{name} block {block_size}"}
+            row.update(time_stats(times))
+            rows.append(row)
+    return rows
+
+def bench_track_display():
+    """What update_track_display does apart from handing the lists to Dear PyGui"""
+    pixels = 800
+    print(f"\nTrack display: {pixels} px waveform")
+    rows = []
+    for seconds in LOOP_SECONDS:
+        looper = MultiTrackLooper(num_tracks=1, backend=NullBackend())
+        looper.set_track_audio(0, random_tracks(1, seconds * SAMPLE_RATE)[0])
+        
+        # First display after a take builds the peak pyramid
+        looper.track_peaks[0] = None
+        t0 = time.perf_counter()
+        peaks = looper.get_track_peaks(0)
+        build = time.perf_counter() - t0
+        
+        # Later refreshes only read it at the plot's resolution
+        repeats = max(REPEATS // 10, 20)
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            time_axis, display_data = peaks.display(pixels, looper.sample_rate)
+            series = [time_axis.tolist(), display_data.tolist()]
+        refresh = (time.perf_counter() - t0) / repeats
+        print(f"  {seconds:>3} s loop   build peaks {build * 1000:7.2f} ms   "
+              f"refresh {refresh * 1e6:7.1f} us   ({len(series[0])} points)")
+        rows.append({'case': f"loop {seconds}s", 'loop_seconds': seconds,
+                     'build_ms': build * 1000, 'refresh_us': refresh * 1e6,
+                     'points': len(series[0])})
+    return rows
+
+def drop_page_cache(path):
+    """Evict a file from the page cache so the next open is cold"""
+    if hasattr(os, 'posix_fadvise'):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+def bench_session_open():
+    num_tracks, seconds = 8, 60
+    print(f"\nSession open: {num_tracks} tracks x {seconds} s, {CHANNELS} ch @ {SAMPLE_RATE} Hz")
+    looper = MultiTrackLooper(num_tracks=num_tracks, backend=NullBackend())
+    looper.load_tracks(random_tracks(num_tracks, seconds * SAMPLE_RATE))
+    out = np.empty((256, CHANNELS), dtype=np.float32)
+    rows = []
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        save_session(looper, tmp)
+        data_path = os.path.join(tmp, DATA_FILE)
+        
+        for name, load in (("read", lambda: looper.load_tracks(np.load(data_path))),
+                           ("mmap", lambda: load_session(tmp, looper=looper))):
+            # Cold opens are also timed with playback starting 0.5 s after
+            # the open, which gives the prefetch time to run
+            for state, delay in (("cold", 0), ("cold", 0.5), ("warm", 0)):
+                if state == "cold":
+                    drop_page_cache(data_path)
+                t0 = time.perf_counter()
+                load()
+                opened = time.perf_counter() - t0
+                time.sleep(delay)
+                
+                # First block of playback after opening
+                looper.playback_position = looper.master_length // 2
+                looper.playing = True
+                t0 = time.perf_counter()
+                looper.audio_output_callback(out, len(out), None, None)
+                first_block = time.perf_counter() - t0
+                looper.playing = False
+                print(f"  {name} {state} +{delay:.1f}s  open {opened * 1000:8.2f} ms   "
+                      f"first block {first_block * 1e6:8.1f} us")
+                rows.append({'case': f"{name} {state} +{delay:.1f}s",
+                             'open_ms': opened * 1000, 'first_block_us': first_block * 1e6})
+    return rows
+
+def write_stem(path, audio, sample_width):
+    """Write audio as a 16- or 24-bit WAV file"""
+    scale = 2 ** (8 * sample_width - 1) - 1
+    samples = np.round(audio * scale).astype('<i4')
+    if sample_width == 3:
+        data = samples.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    else:
+        data = samples.astype('<i2').tobytes()
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(audio.shape[1])
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(data)
+
+def read_whole_wav(path):
+    """Import the way read_wav used to: whole file to bytes, then convert"""
+    with wave.open(path, 'rb') as wav_file:
+        data = wav_file.readframes(wav_file.getnframes())
+    return np.frombuffer(data, dtype='<i2').reshape(-1, CHANNELS).astype(np.float32) / 32768
+
+def bench_import():
+    num_stems, seconds = 8, 30
+    print(f"\nStem import: {num_stems} WAV files x {seconds} s, {CHANNELS} ch @ {SAMPLE_RATE} Hz")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for sample_width in (2, 3):
+            paths = []
+            for i in range(num_stems):
+                paths.append(os.path.join(tmp, f"stem{i}_{sample_width}.wav"))
+                write_stem(paths[-1], random_tracks(1, seconds * SAMPLE_RATE, seed=i)[0],
+                           sample_width)
+            
+            cases = [("stream 1 thread", lambda: import_files(looper, paths, workers=1)),
+                     ("stream pool", lambda: import_files(looper, paths))]
+            if sample_width == 2:
+                cases.insert(0, ("whole file", lambda: [
+                    looper.set_track_audio(i, read_whole_wav(path)) for i, path in enumerate(paths)]))
+            for name, load in cases:
+                looper = MultiTrackLooper(num_tracks=num_stems, backend=NullBackend())
+                # Files in the page cache: this times decoding, not the disk
+                tracemalloc.start()
+                t0 = time.perf_counter()
+                load()
+                elapsed = time.perf_counter() - t0
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                # Beyond the track block (allocated lazily, so untouched rows
+                # cost nothing) and the tracks kept outside it
+                audio = looper.track_data.nbytes + sum(
+                    loop[0].nbytes for loop in looper.track_loops if loop is not None)
+                extra = (peak - audio) / 2 ** 20
+                case = f"{8 * sample_width}-bit {name}"
+                print(f"  {case:<24} {elapsed * 1000:8.1f} ms   {extra:6.1f} MiB beyond the audio")
+                rows.append({'case': case, 'import_ms': elapsed * 1000, 'extra_mib': extra})
+    return rows
+
+BENCHES = {
+    'record': bench_record_path,
+    'output': bench_output_callback,
+    'export': bench_export,
+    'session': bench_session_open,
+    'metering': bench_metering,
+    'short_takes': bench_short_takes,
+    'display': bench_track_display,
+    'import': bench_import,
+    'effects': bench_effects,
+    'compact': bench_compact,
+}
+
+def environment(quick):
+    """Where a set of results came from"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'quick': quick,
+    }
+
+def compare(results, old):
+    """Print how each timing changed from an older results file"""
+    print(f"\nCompared with {old['environment'].get('commit')} ({old['environment'].get('date')})")
+    for name, rows in results['benches'].items():
+        old_rows = {row['case']: row for row in old['benches'].get(name, [])}
+        for row in rows:
+            old_row = old_rows.get(row['case'])
+            if old_row is None:
+                continue
+            for key, value in row.items():
+                if key.endswith(('_us', '_ms')) and old_row.get(key):
+                    change = 100 * (value / old_row[key] - 1)
+                    print(f"  {name:<11} {row['case']:<32} {key:<15} {old_row[key]:10.2f} -> "
+                          f"{value:10.2f}  {change:+6.1f}%")
+
+def main(argv=None):
+    global REPEATS, LOOP_SECONDS
+    parser = argparse.ArgumentParser(description="Benchmark the looper's audio hot paths")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHES), help="benches to run")
+    parser.add_argument('--quick', action='store_true',
+                        help="fewer repeats and no 30 s loops, for a fast check")
+    parser.add_argument('--json', metavar='PATH', help="save the results as JSON")
+    parser.add_argument('--compare', metavar='PATH', help="compare with an earlier --json file")
+    args = parser.parse_args(argv)
+    
+    if args.quick:
+        REPEATS = 200
+        LOOP_SECONDS = LOOP_SECONDS[:2]
+    results = {'environment': environment(args.quick), 'benches': {}}
+    for name in args.only or BENCHES:
+        results['benches'][name] = BENCHES[name]()
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.json}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return results
+
+if __name__ == "__main__":
+    main()
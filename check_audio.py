@@ -1,10 +1,7 @@
-import sounddevice as sd
+import sys
+from audioloop.cli import main
 
-# List all audio devices
-print("Available audio devices:")
-print(sd.query_devices())
-
-# Show default input device
-default_input = sd.query_devices(kind='input')
-print(f"\nDefault input device: {default_input['name']}")
-print(f"Max input channels: {default_input['max_input_channels']}")
+# List all audio devices and show the ones the looper will use.
+# Run with --probe to also find their smallest stable block sizes,
+# or --rescan to choose them again.
+main(['devices'] + sys.argv[1:])
@@ -0,0 +1,126 @@
+import wave
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend
+from audioloop.automation import RAMP_FRAMES
+from audioloop.mixer import float_to_pcm16
+
+LENGTH = 3000
+
+def gain_curve(start_gain, changes, frames):
+    """Gain at every frame: a linear glide of RAMP_FRAMES from each change
+    
+    changes maps absolute frames to new gains. A change during a glide
+    starts from the gain reached so far.
+    """
+    curve = np.empty(frames)
+    begin, target, ramp_start = start_gain, start_gain, -np.inf
+    for frame in range(frames):
+        fraction = min(max((frame - ramp_start) / RAMP_FRAMES, 0.0), 1.0)
+        if frame in changes:
+            begin = target * fraction + begin * (1 - fraction)
+            target, ramp_start, fraction = changes[frame], frame, 0.0
+        curve[frame] = target * fraction + begin * (1 - fraction)
+    return curve
+
+def make_looper(blocksize, tracks):
+    looper = MultiTrackLooper(num_tracks=len(tracks), max_record_seconds=1,
+                              backend=NullBackend(blocksize=blocksize))
+    for t, audio in enumerate(tracks):
+        looper.set_track_audio(t, audio)
+    return looper
+
+def split_tracks():
+    """Track 0 on the left only and track 1 on the right, both at 0.5"""
+    tracks = np.zeros((2, LENGTH, 2), dtype=np.float32)
+    tracks[0, :, 0] = 0.5
+    tracks[1, :, 1] = 0.5
+    return tracks
+
+def play(looper, frames):
+    out = np.zeros((frames, looper.channels), dtype=np.float32)
+    looper.backend.run(frames, output=out)
+    return out
+
+def test_volume_and_mute_changes_ramp():
+    looper = make_looper(100, split_tracks()[:1])
+    looper.toggle_playback()
+    out = [play(looper, 1000)]
+    looper.set_track_volume(0, 0.2)
+    out.append(play(looper, 100))
+    # Muted halfway through the first ramp
+    looper.toggle_track(0)
+    out.append(play(looper, 900))
+    looper.toggle_track(0)
+    out.append(play(looper, 1000))
+    left = np.concatenate(out)[:, 0]
+    
+    expected = 0.5 * gain_curve(1.0, {1000: 0.2, 1100: 0.0, 2000: 0.2}, len(left))
+    assert np.allclose(left, expected, rtol=0, atol=1e-6)
+    # The ramp takes RAMP_FRAMES frames, then holds the gain exactly
+    assert left[1100 + RAMP_FRAMES - 1] > 0
+    assert np.all(left[1100 + RAMP_FRAMES:2000] == 0)
+    assert np.all(left[2000 + RAMP_FRAMES:] == np.float32(0.5) * np.float32(0.2))
+    # No clicks: no step bigger than a ramp's share of the largest change
+    assert np.abs(np.diff(left)).max() <= 0.5 * 0.8 / RAMP_FRAMES + 1e-6
+
+def record_automation(looper):
+    """Play the first loop making changes on 100-frame blocks, recording them"""
+    looper.automation_recording = True
+    looper.toggle_playback()
+    out = []
+    for frames, change in ((600, lambda: looper.set_track_volume(0, 0.3)),
+                           (900, lambda: looper.toggle_track(1)),
+                           (700, lambda: looper.set_track_volume(0, 0.8)),
+                           (500, lambda: looper.toggle_track(1)),
+                           (300, None)):
+        out.append(play(looper, frames))
+        if change is not None:
+            change()
+    looper.automation_recording = False
+    return np.concatenate(out)
+
+def test_automation_replays_on_exact_frames_every_loop():
+    looper = make_looper(100, split_tracks())
+    out = [record_automation(looper)]
+    automation = looper.automation
+    assert automation.positions.tolist() == [600, 1500, 2200, 2700]
+    assert automation.tracks.tolist() == [0, 1, 0, 1]
+    assert np.allclose(automation.gains, [0.3, 0.0, 0.8, 1.0])
+    # Replayed in blocks that don't line up with the events or the loop
+    looper.backend.blocksize = 77
+    out.append(play(looper, 3 * LENGTH))
+    out = np.concatenate(out)
+    
+    loops = range(4)
+    left = gain_curve(1.0, {k * LENGTH + p: g for k in loops
+                            for p, g in ((600, 0.3), (2200, 0.8))}, len(out))
+    right = gain_curve(1.0, {k * LENGTH + p: g for k in loops
+                             for p, g in ((1500, 0.0), (2700, 1.0))}, len(out))
+    assert np.allclose(out, 0.5 * np.stack([left, right], axis=1), rtol=0, atol=1e-6)
+    for k in loops:
+        # Each ramp starts on its event's frame, every time round
+        start = k * LENGTH + 1500
+        assert out[start, 1] == out[start - 1, 1] > out[start + 1, 1]
+        assert np.all(out[start + RAMP_FRAMES:start + 1200, 1] == 0)
+
+def wav_frames(path):
+    with wave.open(path, 'rb') as wav_file:
+        return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+
+@pytest.mark.parametrize('blocksize', [64, 256, 1000])
+def test_export_matches_live_ramps(tmp_path, blocksize):
+    rng = np.random.default_rng(5)
+    tracks = (rng.standard_normal((2, LENGTH, 2)) * 0.3).astype(np.float32)
+    looper = make_looper(100, tracks)
+    record_automation(looper)
+    # Live playback from the start, as an export plays it
+    looper.toggle_playback()
+    looper.toggle_playback()
+    looper.backend.blocksize = blocksize
+    live = play(looper, 3 * LENGTH)
+    expected = np.empty(live.size, dtype=np.int16)
+    float_to_pcm16(live.reshape(-1), expected)
+    
+    path = looper.save_mix(str(tmp_path / 'mix'), repeats=3, chunk_frames=1001)
+    assert np.array_equal(wav_frames(path), expected)
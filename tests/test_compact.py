@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend, load_session, save_session
+from audioloop.compact import CompactAudio, COMPACT_CHUNK
+from audioloop.mixer import gather_span
+
+def chunked_audio(rng, chunks=40):
+    """Stereo noise whose level changes every chunk, from loud to very quiet
+    
+    One chunk is silent and the last one is short.
+    """
+    frames = chunks * COMPACT_CHUNK - 300
+    levels = np.repeat(10.0 ** rng.uniform(-5, 0, chunks), COMPACT_CHUNK)[:frames]
+    levels[5 * COMPACT_CHUNK:6 * COMPACT_CHUNK] = 0
+    audio = rng.uniform(-1, 1, (frames, 2)) * levels[:, None]
+    return audio.astype(np.float32)
+
+def chunk_peaks(audio):
+    """Each frame's chunk peak"""
+    starts = np.arange(0, len(audio), COMPACT_CHUNK)
+    peaks = np.maximum.reduceat(np.abs(audio).max(axis=1), starts)
+    return np.repeat(peaks, COMPACT_CHUNK)[:len(audio), None]
+
+def dequantized(compact):
+    out = np.empty(compact.shape, dtype=np.float32)
+    compact.read(0, out)
+    return out
+
+def error_bound(audio, dtype):
+    """Largest error each sample of audio may have once stored as dtype
+    
+    int16: half a step of the chunk's peak scaled to 32767 (about -96 dB).
+    float16: 11 significant bits (about -66 dB) down to the smallest normal
+    float16 (2**-14 of the chunk's peak); below that the spacing stays
+    2**-24 of it. Both plus a few float32 roundings of the peak.
+    """
+    peaks = chunk_peaks(audio)
+    if dtype == 'int16':
+        bound = np.broadcast_to(peaks / 65534, audio.shape)
+    else:
+        bound = np.maximum(np.abs(audio) / 2048, peaks * 2.0 ** -25)
+    return bound + peaks * 2.0 ** -21
+
+def test_int16_error_is_bounded_by_the_chunk_peak():
+    audio = chunked_audio(np.random.default_rng(1))
+    error = np.abs(dequantized(CompactAudio(audio, 'int16')) - audio)
+    assert np.all(error <= error_bound(audio, 'int16'))
+    assert np.all(error[5 * COMPACT_CHUNK:6 * COMPACT_CHUNK] == 0)
+
+def test_float16_error_is_bounded_by_each_sample():
+    audio = chunked_audio(np.random.default_rng(2))
+    error = np.abs(dequantized(CompactAudio(audio, 'float16')) - audio)
+    assert np.all(error <= error_bound(audio, 'float16'))
+
+def test_reads_match_at_any_start():
+    audio = chunked_audio(np.random.default_rng(3), chunks=4)
+    compact = CompactAudio(audio, 'int16')
+    whole = dequantized(compact)
+    out = np.empty((1500, 2), dtype=np.float32)
+    for start in (0, 1, COMPACT_CHUNK - 1, 2000):
+        compact.read(start, out[:len(audio) - start])
+        assert np.array_equal(out[:len(audio) - start], whole[start:start + 1500])
+    assert np.array_equal(np.concatenate([piece.copy() for piece in compact.segments(1000)]),
+                          whole)
+
+def test_unknown_storage_is_rejected():
+    with pytest.raises(ValueError):
+        CompactAudio(np.zeros((10, 2), dtype=np.float32), 'int8')
+    with pytest.raises(ValueError):
+        MultiTrackLooper(num_tracks=1, backend=NullBackend(), compact='int8')
+
+def render(looper, frames):
+    out = np.zeros((frames, looper.channels), dtype=np.float32)
+    looper.toggle_playback()
+    looper.backend.run(frames, output=out)
+    looper.toggle_playback()
+    return out
+
+def rows(looper):
+    out = np.zeros((looper.num_tracks, looper.master_length * looper.channels), dtype=np.float32)
+    gather_span(looper.track_data, looper.track_loops, 0, looper.master_length, out)
+    return out
+
+# (chunks, channels, volume) of the takes: the loop's length, shorter and
+# mono, shorter
+TAKES = [(40, 2, 1.0), (7, 1, 0.5), (13, 2, 0.8)]
+
+def takes_looper(compact):
+    """The same three takes, all from the loop start, in a looper"""
+    rng = np.random.default_rng(4)
+    looper = MultiTrackLooper(num_tracks=4, backend=NullBackend(), compact=compact)
+    for track, (chunks, channels, volume) in enumerate(TAKES):
+        looper.set_track_audio(track, chunked_audio(rng, chunks)[:, :channels])
+        looper.set_track_volume(track, volume)
+    return looper
+
+def mix_bound(looper, dtype, frames):
+    """Largest difference of each output sample from the float32 mix"""
+    length = looper.master_length
+    bound = np.zeros((length, looper.channels))
+    for track in range(len(TAKES)):
+        audio = looper.tracks[track]
+        # Takes shorter than the loop repeat from its start
+        bound += looper.track_volumes[track] * np.resize(error_bound(audio, dtype),
+                                                         (length, audio.shape[1]))
+    # Plus the rounding of the float32 sum
+    bound += 2.0 ** -21
+    return np.resize(bound, (frames, looper.channels))
+
+@pytest.mark.parametrize('dtype', ['int16', 'float16'])
+def test_compact_playback_is_within_the_bound_of_float32(dtype):
+    plain, compact = takes_looper(None), takes_looper(dtype)
+    assert all(isinstance(compact.tracks[i], CompactAudio) for i in range(len(TAKES)))
+    frames = 2 * plain.master_length + 77
+    difference = np.abs(render(compact, frames) - render(plain, frames))
+    assert np.all(difference <= mix_bound(plain, dtype, frames))
+    assert difference.max() > 0
+
+def test_compact_session_round_trip(tmp_path):
+    looper = takes_looper('int16')
+    save_session(looper, str(tmp_path))
+    
+    loaded = MultiTrackLooper(num_tracks=4, backend=NullBackend(), compact='int16')
+    load_session(str(tmp_path), looper=loaded)
+    assert all(isinstance(loaded.tracks[i], CompactAudio) for i in range(len(TAKES)))
+    assert loaded.tracks[3] is None
+    assert loaded.track_volumes == looper.track_volumes
+    # A full-precision looper reads back exactly the samples that were saved,
+    # and the compact one plays them within the bound of that float32 mix
+    plain = load_session(str(tmp_path), backend=NullBackend())
+    assert np.array_equal(rows(plain), rows(looper))
+    frames = 2 * plain.master_length + 77
+    difference = np.abs(render(loaded, frames) - render(plain, frames))
+    assert np.all(difference <= mix_bound(plain, 'int16', frames))
@@ -0,0 +1,190 @@
+import json
+import socket
+import threading
+import time
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend
+from audioloop.control import ControlServer
+
+BLOCK = 256
+
+class SnapshotLooper(MultiTrackLooper):
+    """A looper keeping the gains of every mix snapshot it publishes"""
+    def __init__(self, *args, **kwargs):
+        self.published = []
+        super().__init__(*args, **kwargs)
+    
+    @property
+    def mix_params(self):
+        return self._mix_params
+    
+    @mix_params.setter
+    def mix_params(self, params):
+        self._mix_params = params
+        self.published.append(params[2].tolist())
+
+class Client:
+    """A socket client collecting the server's lines on a thread of its own"""
+    def __init__(self, address):
+        self.sock = socket.create_connection(address)
+        self.lines = []
+        self.lock = threading.Lock()
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+    
+    def _read(self):
+        with self.sock.makefile('rb') as lines:
+            for line in lines:
+                with self.lock:
+                    self.lines.append(json.loads(line))
+    
+    def send(self, message):
+        self.sock.sendall(json.dumps(message).encode() + b'\n')
+    
+    def wait(self, match, pump, timeout=5.0):
+        """The first line match accepts, pumping the server until it comes"""
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            pump()
+            with self.lock:
+                for message in self.lines:
+                    if match(message):
+                        self.lines.remove(message)
+                        return message
+            time.sleep(0.001)
+        raise TimeoutError("no matching reply")
+    
+    def request(self, message, pump):
+        self.send(message)
+        return self.wait(lambda reply: reply.get('id') == message['id'], pump)
+    
+    def close(self):
+        # Ends the reader's blocking read first
+        self.sock.shutdown(socket.SHUT_RDWR)
+        self.reader.join()
+        self.sock.close()
+
+@pytest.fixture
+def served():
+    """A playing-ready looper of three constant tracks, its server and a pump"""
+    looper = SnapshotLooper(num_tracks=3, backend=NullBackend(blocksize=BLOCK))
+    for track, value in enumerate((0.1, 0.2, 0.3)):
+        looper.set_track_audio(track, np.full((4410, 2), value, dtype=np.float32))
+    server = ControlServer(looper).start()
+    
+    def pump():
+        """What the owner thread does each frame, with a block of audio"""
+        if looper.playing:
+            looper.backend.run(BLOCK)
+        server.process()
+        looper.poll_events()
+    
+    clients = []
+    
+    def connect(target=server):
+        client = Client(target.address)
+        clients.append(client)
+        return client
+    
+    yield looper, server, pump, connect
+    for client in clients:
+        client.close()
+    server.stop()
+
+def test_commands_reply_and_errors(served):
+    looper, server, pump, connect = served
+    client = connect()
+    reply = client.request({'id': 1, 'cmd': 'play'}, pump)
+    assert reply == {'id': 1, 'ok': True, 'result': None}
+    assert looper.playing
+    assert client.request({'id': 2, 'cmd': 'volume', 'track': 1, 'value': 0.5}, pump)['ok']
+    assert looper.track_volumes[1] == 0.5
+    reply = client.request({'id': 3, 'cmd': 'stats'}, pump)
+    assert reply['result']['callbacks']['output']['callbacks'] > 0
+    
+    for request, error in [({'id': 4, 'cmd': 'nope'}, "Unknown command 'nope'"),
+                           ({'id': 5, 'cmd': 'mute', 'track': 3}, "No track 3"),
+                           ({'id': 6, 'cmd': 'volume', 'track': 0}, "volume needs 'value'"),
+                           ({'id': 7, 'cmd': 'volume', 'track': 0, 'value': 2},
+                            "volume must be a number between 0 and 1"),
+                           ({'id': 8, 'cmd': 'scene', 'name': 'chorus'},
+                            "No scene named 'chorus'")]:
+        assert client.request(request, pump) == {'id': request['id'], 'ok': False,
+                                                 'error': error}
+    client.sock.sendall(b'not json\n')
+    reply = client.wait(lambda reply: 'id' not in reply, pump)
+    assert not reply['ok'] and reply['error'].startswith("Bad request")
+    
+    assert client.request({'id': 9, 'cmd': 'stop'}, pump)['ok']
+    assert not looper.playing
+
+@pytest.mark.parametrize('batch, error', [
+    ([{'cmd': 'volume', 'track': 0, 'value': 0.5},
+      {'cmd': 'volume', 'track': 1, 'value': 5}], "volume must be a number between 0 and 1"),
+    ([{'cmd': 'mute', 'track': 0}, {'cmd': 'play'},
+      {'cmd': 'record', 'track': 1}, {'cmd': 'record', 'track': 2}], "Already recording"),
+    ([{'cmd': 'clear', 'track': 0}, {'cmd': 'clear', 'track': 1}, {'cmd': 'clear', 'track': 2},
+      {'cmd': 'play'}], "Nothing to play"),
+    ([{'cmd': 'mute', 'track': 2, 'muted': 'yes'}], "muted must be true or false"),
+])
+def test_failing_batch_changes_nothing(served, batch, error):
+    looper, server, pump, connect = served
+    client = connect()
+    published = len(looper.published)
+    reply = client.request({'id': 1, 'batch': batch}, pump)
+    assert reply == {'id': 1, 'ok': False, 'error': error}
+    assert looper.track_volumes == [1.0, 1.0, 1.0]
+    assert looper.track_enabled == [True, True, True]
+    assert all(track is not None for track in looper.tracks)
+    assert not looper.playing and not looper.recording
+    assert len(looper.published) == published
+
+def test_batch_gains_land_in_one_snapshot(served):
+    looper, server, pump, connect = served
+    client = connect()
+    assert client.request({'id': 1, 'cmd': 'play'}, pump)['ok']
+    published = len(looper.published)
+    reply = client.request({'id': 2, 'batch': [{'cmd': 'volume', 'track': 0, 'value': 0.0},
+                                               {'cmd': 'volume', 'track': 1, 'value': 0.5},
+                                               {'cmd': 'mute', 'track': 2}]}, pump)
+    assert reply == {'id': 2, 'ok': True, 'result': [None, None, None]}
+    assert looper.published[published:] == [[0.0, 0.5, 0.0]]
+
+def test_subscribers_are_pushed_state_and_meters(served):
+    looper, server, pump, connect = served
+    subscriber, client = connect(), connect()
+    state = subscriber.request({'id': 1, 'cmd': 'subscribe', 'meters': True}, pump)['result']
+    assert state['loop_length'] == 4410 and not state['playing']
+    
+    assert client.request({'id': 2, 'cmd': 'play'}, pump)['ok']
+    assert client.request({'id': 3, 'cmd': 'mute', 'track': 1}, pump)['ok']
+    pushed = subscriber.wait(lambda message: message.get('event') == 'state'
+                             and message['state']['tracks'][1]['muted'], pump)
+    assert pushed['state']['playing']
+    # Levels of blocks after the mute's gain ramp
+    after = looper.playback_position + 4 * BLOCK
+    meters = subscriber.wait(lambda message: message.get('event') == 'meters'
+                             and message['position'] >= after, pump)
+    # Tracks, master, input: track 1 muted, the master the sum of the others
+    assert meters['peak'][1] == 0.0
+    assert meters['peak'][0] == pytest.approx(0.1)
+    assert meters['peak'][3] == pytest.approx(0.4)
+    
+    assert subscriber.request({'id': 4, 'cmd': 'unsubscribe'}, pump)['ok']
+    assert not server.subscribers
+
+def test_full_queue_answers_busy(served):
+    looper, server, pump, connect = served
+    small = ControlServer(looper, max_queue=1).start()
+    try:
+        first, second = connect(small), connect(small)
+        first.send({'id': 1, 'cmd': 'state'})
+        # The first request fills the queue, as nothing runs it yet
+        while small.requests.empty():
+            time.sleep(0.001)
+        reply = second.request({'id': 2, 'cmd': 'state'}, lambda: None)
+        assert reply == {'id': 2, 'ok': False, 'error': 'busy'}
+        assert first.wait(lambda reply: reply.get('id') == 1, small.process)['ok']
+    finally:
+        small.stop()
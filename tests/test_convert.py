@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend
+from audioloop import convert
+from audioloop.convert import resample, resampled_frames, fit_channels
+
+def sine(frequency, rate, frames, channels=2):
+    t = np.arange(frames) / rate
+    wave = 0.5 * np.sin(2 * np.pi * frequency * t)
+    return np.repeat(wave[:, None], channels, axis=1).astype(np.float32)
+
+@pytest.mark.parametrize('from_rate, to_rate, frames, expected', [
+    (44100, 48000, 44100, 48000),
+    (48000, 44100, 48000, 44100),
+    (22050, 44100, 22050, 44100),
+    (44100, 48000, 1001, 1090),
+    (48000, 44100, 7, 6),
+])
+def test_output_length(from_rate, to_rate, frames, expected):
+    assert resampled_frames(frames, from_rate, to_rate) == expected
+    audio = np.zeros((frames, 2), dtype=np.float32)
+    out = resample(audio, from_rate, to_rate)
+    assert out.shape == (expected, 2) and out.dtype == np.float32
+
+@pytest.mark.parametrize('from_rate, to_rate', [(44100, 48000), (48000, 44100), (22050, 44100)])
+def test_passband_sine_and_dc(from_rate, to_rate):
+    frames = from_rate
+    out = resample(sine(1000.0, from_rate, frames), from_rate, to_rate)
+    expected = sine(1000.0, to_rate, len(out))
+    # Away from the ends, where the filter runs into the padding silence
+    inner = slice(to_rate // 100, -to_rate // 100)
+    error = np.abs(out[inner] - expected[inner]).max()
+    assert 20 * np.log10(error / 0.5) < -85
+    
+    dc = resample(np.full((frames, 1), 0.5, dtype=np.float32), from_rate, to_rate)
+    assert np.allclose(dc[inner], 0.5, rtol=0, atol=1e-6)
+
+def test_chunks_join_without_discontinuity(monkeypatch):
+    audio = sine(3000.0, 44100, 100000)
+    whole = resample(audio, 44100, 48000)
+    # Output frames are computed a chunk at a time; smaller (and uneven)
+    # chunks must give exactly the same samples
+    monkeypatch.setattr(convert, 'RESAMPLE_CHUNK', 1000)
+    assert np.array_equal(resample(audio, 44100, 48000), whole)
+    monkeypatch.setattr(convert, 'RESAMPLE_CHUNK', 777)
+    assert np.array_equal(resample(audio, 44100, 48000), whole)
+    # And across the default chunk boundaries the sine carries straight on
+    expected = sine(3000.0, 48000, len(whole))
+    for boundary in (32768, 65536, 98304):
+        around = slice(boundary - 5, boundary + 5)
+        assert np.abs(whole[around] - expected[around]).max() < 1e-3
+
+def test_fit_channels():
+    stereo = np.arange(20, dtype=np.float32).reshape(10, 2)
+    assert fit_channels(stereo, 2) is stereo
+    mono = stereo[:, :1]
+    assert fit_channels(mono, 2) is mono
+    assert fit_channels(stereo[:, 0], 2).shape == (10, 1)
+    assert np.array_equal(fit_channels(stereo, 1), stereo.mean(axis=1, keepdims=True))
+    quad = np.arange(40, dtype=np.float32).reshape(10, 4)
+    assert np.array_equal(fit_channels(quad, 2), quad[:, :2])
+    with pytest.raises(ValueError):
+        fit_channels(stereo, 3)
+
+def test_mono_takes_stay_mono_until_the_mix():
+    rng = np.random.default_rng(0)
+    looper = MultiTrackLooper(num_tracks=2, backend=NullBackend(blocksize=300))
+    loop = (rng.standard_normal((4800, 2)) * 0.1).astype(np.float32)
+    looper.set_track_audio(0, loop)
+    looper.set_track_volume(0, 0.0)
+    mono = (rng.standard_normal((4800, 1)) * 0.1).astype(np.float32)
+    looper.set_track_audio(1, mono)
+    assert looper.tracks[1].shape == (4800, 1)
+    # Resampled on the way in, still as one channel
+    looper.set_track_audio(1, resample(mono, 44100, 48000), sample_rate=48000)
+    assert looper.tracks[1].shape == (4800, 1)
+    stored = np.array(looper.tracks[1])
+    
+    looper.toggle_playback()
+    out = np.zeros((2 * 4800 + 100, 2), dtype=np.float32)
+    looper.backend.run(len(out), output=out)
+    # Spread over both output channels in the mix only
+    expected = np.resize(stored, (len(out), 1))
+    assert np.array_equal(out[:, :1], expected)
+    assert np.array_equal(out[:, 1:], expected)
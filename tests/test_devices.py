@@ -0,0 +1,66 @@
+import types
+import numpy as np
+from audioloop.devices import DeviceSelector
+
+APIS = [{'name': 'ALSA'}, {'name': 'JACK Audio Connection Kit'}]
+
+def device(name, hostapi):
+    return {'name': name, 'hostapi': hostapi, 'max_input_channels': 2,
+            'max_output_channels': 2, 'default_samplerate': 44100.0,
+            'default_low_input_latency': 0.003, 'default_low_output_latency': 0.006}
+
+DEVICES = [device('HDA Intel PCH', 0), device('pulse', 0), device('system', 1)]
+
+def fake_sounddevice(stable_from):
+    """A sounddevice stand-in whose streams xrun below a per-device block size"""
+    sd = types.SimpleNamespace(opened=[], default=types.SimpleNamespace(device=[0, 0]))
+    sd.query_devices = lambda device=None, kind=None: DEVICES if device is None else DEVICES[device]
+    sd.query_hostapis = lambda index=None: APIS if index is None else APIS[index]
+    sd.check_input_settings = sd.check_output_settings = lambda **kwargs: None
+    
+    class Stream:
+        def __init__(self, device, blocksize, channels, callback, **kwargs):
+            self.device, self.blocksize, self.channels = device, blocksize, channels
+            self.callback = callback
+            sd.opened.append(device)
+        
+        def __enter__(self):
+            xrun = self.blocksize < stable_from[self.device]
+            status = types.SimpleNamespace(input_overflow=xrun, input_underflow=False,
+                                           output_underflow=xrun, output_overflow=False)
+            block = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+            self.callback(block, self.blocksize, None, status)
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+    
+    sd.InputStream = sd.OutputStream = Stream
+    return sd
+
+def test_probe_uses_the_explicit_device(tmp_path):
+    sd = fake_sounddevice({0: 64, 1: 256, 2: 32})
+    selector = DeviceSelector(sd, path=str(tmp_path / 'devices.json'))
+    cached = selector.select('output')
+    assert cached['index'] == 2
+    assert selector.probe('output', seconds=0) == 32
+    
+    # An explicit device is the one probed, and the cache keeps its own
+    sd.opened.clear()
+    chosen = selector.select('output', 1)
+    assert selector.probe('output', chosen, seconds=0) == 256
+    assert set(sd.opened) == {1}
+    assert chosen['block_size'] == 256
+    reloaded = DeviceSelector(sd, path=str(tmp_path / 'devices.json'))
+    assert reloaded.cache['output']['index'] == 2
+    assert reloaded.cache['output']['block_size'] == 32
+
+def test_probe_of_the_cached_device_is_saved(tmp_path):
+    sd = fake_sounddevice({0: 64, 1: 256, 2: 32})
+    selector = DeviceSelector(sd, path=str(tmp_path / 'devices.json'))
+    selector.select('input')
+    # The cached device chosen explicitly still updates the cache
+    chosen = selector.select('input', 2)
+    assert selector.probe('input', chosen, seconds=0) == 32
+    reloaded = DeviceSelector(sd, path=str(tmp_path / 'devices.json'))
+    assert reloaded.select('input')['block_size'] == 32
@@ -0,0 +1,97 @@
+import time
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend
+from audioloop.mixer import gather_span
+
+SAMPLE_RATE = 44100
+LENGTH = SAMPLE_RATE // 2 + 3
+
+def loop_row(looper, track):
+    """A track as a full loop-length row, however it is stored"""
+    out = np.zeros((looper.num_tracks, looper.master_length * looper.channels), dtype=np.float32)
+    gather_span(looper.track_data, looper.track_loops, 0, looper.master_length, out)
+    return out[track].reshape(-1, looper.channels)
+
+def duplex_looper(blocksize, latency, quantize=0):
+    """A looper playing a noise loop on track 0, its output looped back into its input"""
+    backend = NullBackend(blocksize=blocksize, latency=latency, loopback=True)
+    looper = MultiTrackLooper(num_tracks=2, max_record_seconds=5, backend=backend)
+    looper.quantize = quantize
+    rng = np.random.default_rng(0)
+    loop = (rng.standard_normal((LENGTH, 2)) * 0.1).astype(np.float32)
+    looper.set_track_audio(0, loop)
+    looper.start_duplex()
+    looper.toggle_playback()
+    return looper, loop
+
+def finish_take(looper):
+    """Stop the take and let the callback and update_recording store it"""
+    looper.stop_recording()
+    while looper.recording:
+        looper.backend.run(looper.backend.blocksize)
+        looper.update_recording()
+
+@pytest.mark.parametrize('latency', [(0.003, 0.005), (0.01, 0.0123)])
+@pytest.mark.parametrize('blocksize', [64, 100, 256])
+def test_overdub_lands_where_it_was_played(blocksize, latency):
+    looper, loop = duplex_looper(blocksize, latency)
+    looper.backend.run(1000)
+    looper.start_recording(1)
+    looper.backend.run(LENGTH + 777)
+    finish_take(looper)
+    # Recording the loop back in through the round trip gives the loop itself
+    assert np.array_equal(loop_row(looper, 1), loop)
+    looper.stop_duplex()
+
+@pytest.mark.parametrize('blocksize', [64, 100])
+def test_short_overdub_keeps_its_offset(blocksize):
+    looper, loop = duplex_looper(blocksize, (0.003, 0.005))
+    looper.backend.run(LENGTH - 5000)
+    looper.start_recording(1)
+    looper.backend.run(9000)
+    finish_take(looper)
+    audio, offset = looper.track_loops[1]
+    assert offset == looper._take_start % LENGTH
+    # Covers the loop end and wraps round to its start
+    positions = (offset + np.arange(len(audio))) % LENGTH
+    assert positions[-1] < positions[0]
+    assert np.array_equal(audio, loop[positions])
+
+@pytest.mark.parametrize('divisions', [1, 3, 4])
+def test_quantized_take_lands_on_boundaries(divisions):
+    looper, loop = duplex_looper(100, (0.003, 0.005), quantize=divisions)
+    looper.backend.run(12345)
+    looper.start_recording(1)
+    looper.backend.run(30000)
+    finish_take(looper)
+    start, end = looper._take_start, looper._take_end
+    boundaries = [k * LENGTH // divisions for k in range(divisions)]
+    assert start % LENGTH in boundaries and end % LENGTH in boundaries and end > start
+    take = loop[np.arange(start, end) % LENGTH]
+    expected = np.empty_like(loop)
+    expected[np.arange(start, start + LENGTH) % LENGTH] = np.resize(take, loop.shape)
+    assert np.array_equal(loop_row(looper, 1), expected)
+
+def test_stopping_a_take_does_not_wait_for_the_callback():
+    looper, loop = duplex_looper(256, (0.003, 0.005))
+    looper.start_recording(1)
+    looper.backend.run(5000)
+    started = time.perf_counter()
+    looper.stop_recording()
+    assert time.perf_counter() - started < 0.05
+    # Nothing ran the callback yet: the take is still open
+    assert looper.recording and looper.tracks[1] is None
+    looper.update_recording()
+    assert looper.recording
+    looper.backend.run(256)
+    looper.update_recording()
+    assert not looper.recording and looper.tracks[1] is not None
+
+def test_stopping_duplex_keeps_a_stopping_take():
+    looper, loop = duplex_looper(256, (0.003, 0.005))
+    looper.start_recording(1)
+    looper.backend.run(5000)
+    looper.stop_recording()
+    looper.stop_duplex()
+    assert not looper.recording and looper.tracks[1] is not None
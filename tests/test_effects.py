@@ -0,0 +1,83 @@
+import wave
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend, Biquad, Delay, Pan, Compressor
+from audioloop.mixer import float_to_pcm16
+
+SAMPLE_RATE = 44100
+
+def signal(frames, seed=0):
+    """Noise with a loud burst in the middle, so the compressor has work to do"""
+    rng = np.random.default_rng(seed)
+    audio = (rng.standard_normal((frames, 2)) * 0.1).astype(np.float32)
+    audio[frames // 3:frames // 2] *= 8
+    return audio
+
+EFFECTS = [
+    lambda: Biquad('lowpass', freq=800.0, q=0.9),
+    lambda: Biquad('peak', freq=3000.0, q=2.0, gain_db=9.0),
+    lambda: Biquad('highshelf', freq=5000.0, gain_db=-6.0),
+    lambda: Delay(time=0.01, feedback=0.6, mix=0.5),
+    # Longer than a delay step, so steps wrap round the line
+    lambda: Delay(time=0.2, feedback=0.4),
+    lambda: Pan(pan=-0.4),
+    lambda: Compressor(threshold_db=-20.0, ratio=6.0, attack=0.001, release=0.05),
+]
+
+def processed(effect, audio, blocksize):
+    """audio run through effect in blocks of blocksize, as the callback would"""
+    effect.prepare(SAMPLE_RATE, audio.shape[1])
+    out = audio.copy()
+    for start in range(0, len(out), blocksize):
+        effect.process(out[start:start + blocksize], start)
+    return out
+
+@pytest.mark.parametrize('make', EFFECTS)
+def test_effects_do_not_depend_on_the_block_size(make):
+    audio = signal(20000)
+    reference = processed(make(), audio, 64)
+    assert not np.array_equal(reference, audio)
+    for blocksize in (1, 63, 256, 1000, len(audio)):
+        assert np.array_equal(processed(make(), audio, blocksize), reference), blocksize
+
+def test_effects_restart_when_playback_does():
+    audio = signal(5000)
+    for make in EFFECTS:
+        effect = make()
+        first = processed(effect, audio, 256)
+        # Played again from the start: same effect, state reset by itself
+        again = audio.copy()
+        for start in range(0, len(again), 1000):
+            effect.process(again[start:start + 1000], start)
+        assert np.array_equal(again, first)
+
+def wav_frames(path):
+    with wave.open(path, 'rb') as wav_file:
+        return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+
+@pytest.mark.parametrize('blocksize', [64, 256, 1000])
+def test_export_with_effects_matches_live_playback(tmp_path, blocksize):
+    length = 9000
+    looper = MultiTrackLooper(num_tracks=4, max_record_seconds=1,
+                              backend=NullBackend(blocksize=blocksize))
+    looper.set_track_audio(0, signal(length, seed=1))
+    # Kept at their own length: short, and mono
+    looper.set_track_audio(1, signal(3001, seed=2), offset=700)
+    looper.set_track_audio(2, signal(500, seed=3)[:, :1])
+    looper.set_track_effects(0, [Biquad('lowpass', freq=1200.0), Delay(time=0.05)])
+    looper.set_track_effects(1, [Compressor(threshold_db=-24.0), Pan(pan=0.7)])
+    looper.set_track_effects(2, [Biquad('peak', freq=2000.0, gain_db=6.0)])
+    looper.set_master_effects([Compressor(threshold_db=-12.0, ratio=3.0),
+                               Biquad('highpass', freq=60.0)])
+    looper.set_track_volume(1, 0.7)
+    
+    repeats = 3
+    looper.toggle_playback()
+    live = np.zeros((length * repeats, 2), dtype=np.float32)
+    looper.backend.run(len(live), output=live)
+    expected = np.empty(live.size, dtype=np.int16)
+    float_to_pcm16(live.reshape(-1), expected)
+    
+    # In chunks that don't divide the loop, while the effects keep playing
+    path = looper.save_mix(str(tmp_path / 'mix'), repeats=repeats, chunk_frames=4001)
+    assert np.array_equal(wav_frames(path), expected)
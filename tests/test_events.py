@@ -0,0 +1,43 @@
+from audioloop import MultiTrackLooper, NullBackend
+from audioloop.events import EventBus
+
+def test_marked_keys_are_taken_once():
+    bus = EventBus()
+    bus.mark('playing', ('mixer', 1))
+    bus.mark('playing')
+    assert bus.take() == {'playing', ('mixer', 1)}
+    assert bus.take() == set()
+
+def test_listeners_see_every_mark_until_removed():
+    bus = EventBus()
+    gui = bus.listener()
+    server = bus.listener()
+    bus.mark('scene')
+    # Each consumer takes its own keys, without clearing the others'
+    assert gui.take() == {'scene'}
+    assert server.take() == {'scene'}
+    assert bus.take() == {'scene'}
+    
+    bus.remove_listener(server)
+    bus.mark('recording')
+    assert gui.take() == {'recording'}
+    assert server.take() == set()
+    assert bus.take() == {'recording'}
+
+def test_ticks_are_marked_at_most_once_per_interval():
+    bus = EventBus({'stats': 0.5})
+    bus.tick('stats', now=10.0)
+    bus.tick('stats', now=10.2)
+    assert bus.take() == {'stats'}
+    bus.tick('stats', now=10.4)
+    assert bus.take() == set()
+    bus.tick('stats', now=10.5)
+    assert bus.take() == {'stats'}
+
+def test_looper_changes_are_delivered():
+    looper = MultiTrackLooper(num_tracks=2, max_record_seconds=1, backend=NullBackend())
+    listener = looper.events.listener()
+    looper.events.take()
+    looper.set_track_volume(1, 0.5)
+    assert ('mixer', 1) in looper.events.take()
+    assert ('mixer', 1) in listener.take()
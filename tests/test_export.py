@@ -0,0 +1,102 @@
+import os
+import tracemalloc
+import wave
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend, ExportJob
+from audioloop.mixer import export_wav
+
+SAMPLE_RATE = 44100
+
+def random_tracks(num_tracks, frames, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((num_tracks, frames, 2)) * 0.4).astype(np.float32)
+
+def full_buffer_wav(path, track_data, gains, repeats=1):
+    """The original save_mix: the whole mix in memory, track by track"""
+    mix = np.zeros(track_data.shape[1:], dtype=np.float32)
+    for track, gain in zip(track_data, gains):
+        if gain:
+            mix += track * gain
+    mix = np.clip(mix, -1.0, 1.0)
+    mix_int16 = (mix * 32767).astype(np.int16)
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(track_data.shape[2])
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(mix_int16.tobytes() * repeats)
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+@pytest.mark.parametrize('chunk_frames', [777, 1000, 4096, 30011, 65536])
+@pytest.mark.parametrize('repeats', [1, 3])
+def test_streamed_export_matches_full_buffer(tmp_path, chunk_frames, repeats):
+    track_data = random_tracks(4, 30011)
+    # Loud enough to clip, and a muted track
+    gains = np.array([1.0, 0.7, 0.0, 1.3], dtype=np.float32)
+    expected = str(tmp_path / 'full.wav')
+    full_buffer_wav(expected, track_data, gains, repeats)
+    
+    streamed = str(tmp_path / 'stream.wav')
+    export_wav(streamed, track_data, gains, SAMPLE_RATE, repeats=repeats,
+               chunk_frames=chunk_frames)
+    assert read_bytes(streamed) == read_bytes(expected)
+
+def test_looper_exports_match_full_buffer(tmp_path):
+    track_data = random_tracks(3, 20000)
+    looper = MultiTrackLooper(num_tracks=3, max_record_seconds=1, backend=NullBackend())
+    looper.load_tracks(track_data.copy(), volumes=[0.5, 0.8, 1.0])
+    looper.toggle_track(1)
+    expected = str(tmp_path / 'full.wav')
+    full_buffer_wav(expected, track_data, [0.5, 0.0, 1.0], repeats=2)
+    
+    saved = looper.save_mix(str(tmp_path / 'saved'), repeats=2, chunk_frames=3000)
+    assert saved.endswith('saved.wav')
+    assert read_bytes(saved) == read_bytes(expected)
+    job = looper.start_export(str(tmp_path / 'job.wav'), repeats=2)
+    assert job.wait(10) and job.error is None and job.progress == 1.0
+    assert read_bytes(job.filepath) == read_bytes(expected)
+
+def test_export_memory_is_bounded(tmp_path):
+    """Peak memory is the chunk buffers, however long the loop"""
+    chunk_frames = 65536
+    track_data = random_tracks(4, 20 * SAMPLE_RATE)
+    gains = np.full(4, 0.5, dtype=np.float32)
+    path = str(tmp_path / 'mix.wav')
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        export_wav(path, track_data, gains, SAMPLE_RATE, repeats=2, chunk_frames=chunk_frames)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # float32 mix and int16 buffers of one chunk
+    chunk_bytes = chunk_frames * 2 * (4 + 2)
+    assert peak - start < 2 * chunk_bytes
+    assert peak - start < track_data[0].nbytes / 8
+
+def _memory_status(key):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(key):
+                return int(line.split()[1]) * 1024
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/clear_refs'),
+                    reason="needs Linux to reset the peak resident size")
+def test_export_peak_rss_is_bounded(tmp_path):
+    track_data = random_tracks(4, 20 * SAMPLE_RATE)
+    gains = np.full(4, 0.5, dtype=np.float32)
+    job = ExportJob(str(tmp_path / 'mix.wav'), track_data, gains, SAMPLE_RATE)
+    # Reset the peak resident size (VmHWM) to what is resident now
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pytest.skip("can't reset the peak resident size")
+    before = _memory_status('VmRSS')
+    assert job.start().wait(30) and job.error is None
+    grown = _memory_status('VmHWM') - before
+    # A whole-loop float32 mix alone would be 7 MB
+    assert grown < 2 * 1024 * 1024
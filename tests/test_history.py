@@ -0,0 +1,143 @@
+import numpy as np
+from audioloop import MultiTrackLooper, NullBackend
+from audioloop.history import TrackHistory
+from audioloop.mixer import gather_span
+
+LENGTH = 5000
+
+def rows(looper):
+    """Every track as a full loop-length row, however it is stored"""
+    if looper.master_length is None:
+        return None
+    out = np.zeros((looper.num_tracks, looper.master_length * looper.channels), dtype=np.float32)
+    gather_span(looper.track_data, looper.track_loops, 0, looper.master_length, out)
+    for track in range(looper.num_tracks):
+        if looper.tracks[track] is None:
+            out[track] = 0
+    return out
+
+def take(rng, frames=LENGTH, channels=2):
+    return (rng.standard_normal((frames, channels)) * 0.1).astype(np.float32)
+
+def test_loop_length_takes_are_mixed_from_the_block():
+    rng = np.random.default_rng(0)
+    looper = MultiTrackLooper(num_tracks=4, backend=NullBackend())
+    audio = [take(rng) for _ in range(3)]
+    looper.set_track_audio(0, audio[0])
+    published = looper.mix_params[0]
+    kept = published.copy()
+    looper.set_track_audio(1, audio[1], offset=1200)
+    # Longer than the loop: trimmed
+    looper.set_track_audio(2, np.concatenate((audio[2], take(rng, 700))))
+    # No track needs the per-track gather, and published blocks stay as they were
+    assert looper.mix_params[1] is None
+    assert looper.mix_params[0] is looper.track_data
+    assert np.array_equal(published, kept)
+    assert all(looper.tracks[t].base is looper.track_data for t in range(3))
+    assert np.array_equal(looper.track_data[0], audio[0])
+    assert np.array_equal(looper.track_data[1], np.roll(audio[1], 1200, axis=0))
+    assert np.array_equal(looper.track_data[2], audio[2])
+    
+    # Shorter, mono and compact takes are kept at their own length
+    looper.set_track_audio(3, take(rng, 1000))
+    assert looper.track_loops[3] is not None
+    looper.set_track_audio(3, take(rng, channels=1))
+    assert looper.track_loops[3] is not None
+    compact = MultiTrackLooper(num_tracks=2, backend=NullBackend(), compact='int16')
+    compact.set_track_audio(0, take(rng))
+    compact.set_track_audio(1, take(rng))
+    assert all(loop is not None for loop in compact.track_loops)
+
+def test_undo_and_redo_walk_the_changes_back_and_forth():
+    rng = np.random.default_rng(1)
+    looper = MultiTrackLooper(num_tracks=3, backend=NullBackend())
+    states = [rows(looper)]
+    changes = [lambda: looper.set_track_audio(0, take(rng)),
+               lambda: looper.set_track_audio(1, take(rng, 1500), offset=300),
+               lambda: looper.set_track_audio(0, take(rng), offset=42),
+               lambda: looper.set_track_audio(2, take(rng, channels=1)),
+               lambda: looper.clear_track(1),
+               lambda: looper.clear_track(0),
+               lambda: looper.clear_track(2)]
+    for change in changes:
+        change()
+        states.append(rows(looper))
+    assert looper.master_length is None and looper.track_data is None
+    
+    def assert_state(expected):
+        actual = rows(looper)
+        assert (actual is None) == (expected is None)
+        if expected is not None:
+            assert np.array_equal(actual, expected)
+            # Row tracks are always on the stacked path
+            for track in range(looper.num_tracks):
+                if looper.track_loops[track] is None and looper.tracks[track] is not None:
+                    assert looper.tracks[track].base is looper.track_data
+    
+    for expected in reversed(states[:-1]):
+        assert looper.undo() is not None
+        assert_state(expected)
+    assert looper.undo() is None
+    for expected in states[1:]:
+        assert looper.redo() is not None
+        assert_state(expected)
+    assert looper.redo() is None
+    
+    # A new change after undoing drops the redo steps
+    looper.undo()
+    looper.undo()
+    looper.set_track_audio(1, take(rng))
+    assert looper.redo() is None
+    assert looper.history.memory == sum(step[3] for step in looper.history.undo_steps)
+
+def test_replaced_rows_are_copied_out_of_the_block():
+    rng = np.random.default_rng(2)
+    looper = MultiTrackLooper(num_tracks=4, backend=NullBackend())
+    for track in range(4):
+        looper.set_track_audio(track, take(rng))
+    looper.set_track_audio(0, take(rng))
+    # The step holds the replaced row alone, not the whole block it was in
+    _, track, state, cost = looper.history.undo_steps[-1]
+    assert track == 0 and state[0].base is None
+    assert cost == LENGTH * 2 * 4
+
+def test_history_drops_least_recently_used_steps():
+    history = TrackHistory(memory_budget=300)
+    for track in range(3):
+        history.push(track, f'state {track}', 100)
+    assert history.memory == 300 and history.evicted == 0
+    # Undo the last step: it is now the most recently used, on the redo stack
+    assert history.pop_undo() == (2, 'state 2')
+    history.push_redo(2, 'redone 2', 100)
+    history.push_undo(0, 'extra', 100)
+    # Over budget: the oldest step is the first undo one
+    assert history.evicted == 1
+    assert [step[2] for step in history.undo_steps] == ['state 1', 'extra']
+    assert [step[2] for step in history.redo_steps] == ['redone 2']
+    # Then the redo step, older than the remaining undo ones
+    history.push_undo(1, 'more', 150)
+    assert history.evicted == 3
+    assert [step[2] for step in history.undo_steps] == ['extra', 'more']
+    assert not history.redo_steps
+    assert history.memory == 250
+
+def test_undo_budget_keeps_the_latest_takes():
+    rng = np.random.default_rng(3)
+    looper = MultiTrackLooper(num_tracks=2, backend=NullBackend())
+    # Room for two and a half replaced takes
+    looper.history.memory_budget = int(2.5 * LENGTH * 2 * 4)
+    audio = [take(rng) for _ in range(6)]
+    for i, version in enumerate(audio):
+        looper.set_track_audio(i % 2, version)
+    assert looper.history.memory <= looper.history.memory_budget
+    # The first two takes' steps (which cost nothing) went first, then the
+    # oldest replacements
+    assert looper.history.evicted == 4
+    assert looper.undo() == 1
+    assert looper.undo() == 0
+    assert looper.undo() is None
+    assert np.array_equal(looper.tracks[0], audio[2])
+    assert np.array_equal(looper.tracks[1], audio[3])
+    assert looper.redo() == 0 and looper.redo() == 1
+    assert np.array_equal(looper.tracks[0], audio[4])
+    assert np.array_equal(looper.tracks[1], audio[5])
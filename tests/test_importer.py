@@ -0,0 +1,132 @@
+import struct
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend, WavReader, import_wav
+from audioloop.importer import (decode_wav, import_files, WAVE_FORMAT_PCM,
+                                WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_EXTENSIBLE)
+
+RATE = 44100
+
+def chunk(chunk_id, body):
+    """A RIFF chunk, padded to an even size"""
+    return struct.pack('<4sI', chunk_id, len(body)) + body + b'\0' * (len(body) & 1)
+
+def fmt_chunk(format_tag, channels, bits, extensible=False):
+    block_align = channels * bits // 8
+    body = struct.pack('<HHIIHH', WAVE_FORMAT_EXTENSIBLE if extensible else format_tag,
+                       channels, RATE, RATE * block_align, block_align, bits)
+    if extensible:
+        # cbSize, valid bits, channel mask, then the sub-format GUID
+        body += struct.pack('<HHIH14s', 22, bits, 0, format_tag,
+                            b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71')
+    return chunk(b'fmt ', body)
+
+def write_wav(path, samples, format_tag, bits, extensible=False, before=b'', between=b''):
+    """Write (frames, channels) samples, already in the file's sample type
+    
+    before and between are extra chunks put before the format chunk and
+    between it and the data.
+    """
+    if bits == 24:
+        data = samples.astype('<i4').view('u1').reshape(-1, 4)[:, :3].tobytes()
+    else:
+        data = samples.tobytes()
+    body = (b'WAVE' + before + fmt_chunk(format_tag, samples.shape[1], bits, extensible)
+            + between + chunk(b'data', data))
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', len(body)) + body)
+    return str(path)
+
+def file_samples(rng, bits, float_format=False, frames=1000, channels=2):
+    """Random samples in a file's type, and the float32 values they stand for"""
+    if float_format:
+        values = rng.uniform(-1, 1, (frames, channels))
+        samples = values.astype('<f4' if bits == 32 else '<f8')
+        return samples, samples.astype(np.float32)
+    if bits == 8:
+        samples = rng.integers(0, 256, (frames, channels)).astype('u1')
+        return samples, ((samples - 128.0) / 128).astype(np.float32)
+    top = 2 ** (bits - 1)
+    samples = rng.integers(-top, top, (frames, channels))
+    samples = samples.astype('<i2' if bits == 16 else '<i4')
+    return samples, (samples / top).astype(np.float32)
+
+@pytest.mark.parametrize('format_tag, bits', [
+    (WAVE_FORMAT_PCM, 8), (WAVE_FORMAT_PCM, 16), (WAVE_FORMAT_PCM, 24), (WAVE_FORMAT_PCM, 32),
+    (WAVE_FORMAT_IEEE_FLOAT, 32), (WAVE_FORMAT_IEEE_FLOAT, 64),
+])
+@pytest.mark.parametrize('extensible', [False, True])
+def test_sample_formats(tmp_path, format_tag, bits, extensible):
+    float_format = format_tag == WAVE_FORMAT_IEEE_FLOAT
+    samples, expected = file_samples(np.random.default_rng(bits), bits, float_format)
+    path = write_wav(tmp_path / 'take.wav', samples, format_tag, bits, extensible)
+    with WavReader(path) as reader:
+        assert (reader.channels, reader.sample_rate, reader.frames) == (2, RATE, 1000)
+        audio = reader.read()
+    assert audio.dtype == np.float32
+    assert np.array_equal(audio, expected)
+
+@pytest.mark.parametrize('bits', [16, 24])
+def test_reads_across_chunk_boundaries(tmp_path, bits):
+    samples, expected = file_samples(np.random.default_rng(0), bits, frames=1001)
+    path = write_wav(tmp_path / 'take.wav', samples, WAVE_FORMAT_PCM, bits)
+    with WavReader(path, chunk_frames=64) as reader:
+        pieces = []
+        for frames in (1, 63, 64, 65, 200, 1000):
+            out = np.zeros((frames, 2), dtype=np.float32)
+            pieces.append(out[:reader.read_into(out)])
+        assert reader.position == 1001
+    assert np.array_equal(np.concatenate(pieces), expected)
+    # Read into one channel, the file's channels are averaged
+    with WavReader(path, chunk_frames=64) as reader:
+        out = np.zeros((1001, 1), dtype=np.float32)
+        assert reader.read_into(out) == 1001
+    assert np.array_equal(out, expected.mean(axis=1, keepdims=True, dtype=np.float32))
+
+def test_odd_sized_chunks_are_skipped_with_their_padding(tmp_path):
+    samples, expected = file_samples(np.random.default_rng(1), 16, frames=333, channels=1)
+    path = write_wav(tmp_path / 'take.wav', samples, WAVE_FORMAT_PCM, 16,
+                     before=chunk(b'JUNK', b'abc'), between=chunk(b'LIST', b'INFOx'))
+    assert np.array_equal(decode_wav(path, 2, RATE), expected)
+
+def test_truncated_data_reads_the_whole_frames_there(tmp_path):
+    samples, expected = file_samples(np.random.default_rng(2), 16, frames=500)
+    path = write_wav(tmp_path / 'take.wav', samples, WAVE_FORMAT_PCM, 16)
+    with open(path, 'r+b') as f:
+        # Cut off the last 10 frames and half of another
+        f.truncate(f.seek(0, 2) - 10 * 4 - 2)
+    with WavReader(path) as reader:
+        assert reader.frames == 489
+        assert np.array_equal(reader.read(), expected[:489])
+
+@pytest.mark.parametrize('contents', [
+    b'',
+    b'RIFF\x04\x00\x00\x00WA',
+    b'RIFF\x04\x00\x00\x00WAVE',
+    b'RIFF\x10\x00\x00\x00WAVEfmt \x10\x00\x00\x00\x01\x00',
+    b'RIFF\x0c\x00\x00\x00WAVEdata\x00\x00\x00\x00',
+    b'RIFF\x04\x00\x00\x00AVI ',
+])
+def test_broken_files_are_rejected(tmp_path, contents):
+    path = tmp_path / 'broken.wav'
+    path.write_bytes(contents)
+    with pytest.raises(ValueError):
+        WavReader(str(path))
+
+def test_empty_audio_is_not_loaded(tmp_path):
+    path = write_wav(tmp_path / 'empty.wav', np.zeros((0, 2), dtype='<i2'),
+                     WAVE_FORMAT_PCM, 16)
+    looper = MultiTrackLooper(num_tracks=2, backend=NullBackend())
+    with pytest.raises(ValueError, match="no audio frames"):
+        import_wav(looper, 0, path)
+    with pytest.raises(ValueError, match="no audio frames"):
+        import_files(looper, [path])
+    with pytest.raises(ValueError):
+        looper.set_track_audio(0, np.zeros((0, 2), dtype=np.float32))
+    assert looper.master_length is None and looper.tracks == [None, None]
+    # Still a looper that plays once it has audio
+    looper.set_track_audio(0, np.full((100, 2), 0.5, dtype=np.float32))
+    looper.toggle_playback()
+    out = np.zeros((300, 2), dtype=np.float32)
+    looper.backend.run(300, output=out)
+    assert np.all(out == 0.5)
@@ -0,0 +1,123 @@
+import tracemalloc
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend
+
+BLOCK = 1024
+
+def make_looper(rng, metering=False, compact=None):
+    looper = MultiTrackLooper(num_tracks=4, max_record_seconds=1,
+                              backend=NullBackend(blocksize=BLOCK), compact=compact)
+    looper.set_track_audio(0, (rng.standard_normal((10 * BLOCK, 2)) * 0.2).astype(np.float32))
+    # Shorter than the loop, and shorter than a block: mixed from native length
+    looper.set_track_audio(1, (rng.standard_normal((3000, 2)) * 0.2).astype(np.float32),
+                           offset=100)
+    looper.set_track_audio(2, (rng.standard_normal((700, 1)) * 0.2).astype(np.float32))
+    looper.set_track_volume(2, 0.5)
+    looper.metering = metering
+    looper.toggle_playback()
+    return looper
+
+def callback_allocations(looper, blocks=1000):
+    """(bytes kept, peak bytes) allocated while the output callback runs blocks blocks
+    
+    Only what audioloop's own lines allocate counts as kept; the peak is
+    everything, the NullBackend driving the callback included.
+    """
+    backend = looper.backend
+    tracemalloc.start()
+    try:
+        # Warm up, traced, so objects replaced every block (the position...)
+        # and numpy's cache of small buffers are counted on both sides
+        backend.run(200 * BLOCK)
+        before = tracemalloc.take_snapshot()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        backend.run(blocks * BLOCK)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    package = [tracemalloc.Filter(True, '*/audioloop/*')]
+    kept = sum(stat.size_diff for stat in after.filter_traces(package).compare_to(
+        before.filter_traces(package), 'filename'))
+    return kept, peak - current
+
+@pytest.mark.parametrize('compact', [None, 'int16', 'float16'])
+def test_output_callback_does_not_allocate(compact):
+    looper = make_looper(np.random.default_rng(0), compact=compact)
+    kept, peak = callback_allocations(looper, blocks=1000)
+    # Nothing kept per block (at most a few ints swapped for new ones)
+    assert kept < 1000
+    # Only small objects come and go (views, ints), nothing like a block of audio
+    assert peak < looper.channels * BLOCK * 4 / 2
+
+def test_metering_does_not_allocate():
+    looper = make_looper(np.random.default_rng(0), metering=True)
+    kept, peak = callback_allocations(looper, blocks=1000)
+    assert kept < 1000
+    assert peak < looper.channels * BLOCK * 4 / 2
+
+def test_meter_levels():
+    rng = np.random.default_rng(3)
+    track_data = (rng.standard_normal((3, 4 * BLOCK, 2)) * 0.3).astype(np.float32)
+    looper = MultiTrackLooper(num_tracks=3, max_record_seconds=1,
+                              backend=NullBackend(blocksize=BLOCK))
+    looper.load_tracks(track_data, volumes=[1.0, 0.5, 0.25])
+    looper.toggle_playback()
+    out = np.zeros((BLOCK, 2), dtype=np.float32)
+    # The second block ends across the loop start
+    looper.backend.run(3 * BLOCK + BLOCK // 2)
+    looper.backend.run(BLOCK, output=out)
+    
+    frames = np.r_[3 * BLOCK + BLOCK // 2:4 * BLOCK, 0:BLOCK // 2]
+    block = track_data[:, frames].reshape(3, -1)
+    gains = np.array([1.0, 0.5, 0.25])
+    meters = looper.meters
+    assert np.allclose(meters.peak[:3], np.abs(block).max(axis=1) * gains, rtol=1e-6)
+    assert np.allclose(meters.rms[:3], np.sqrt((block.astype(np.float64) ** 2).mean(axis=1))
+                       * gains, rtol=1e-5)
+    assert meters.peak[meters.master] == np.abs(out).max()
+    assert np.isclose(meters.rms[meters.master], np.sqrt((out.astype(np.float64) ** 2).mean()),
+                      rtol=1e-5)
+
+def tiled(audio, offset, length, channels=2):
+    """audio tiled out to a full loop row from offset, as tracks used to be stored"""
+    positions = (np.arange(length) - offset) % length % len(audio)
+    return np.repeat(audio[positions], channels // audio.shape[1], axis=1)
+
+@pytest.mark.parametrize('blocksize', [32, 100, 256, 1024, 5000])
+def test_native_length_loops_play_like_tiled_rows(tmp_path, blocksize):
+    rng = np.random.default_rng(13)
+    length = 3001
+    takes = [
+        ((rng.standard_normal((length, 2)) * 0.2).astype(np.float32), 0),
+        # Shorter than any block, and at an offset
+        ((rng.standard_normal((17, 2)) * 0.2).astype(np.float32), 5),
+        # Longer than most blocks, wrapping round the loop end
+        ((rng.standard_normal((1500, 2)) * 0.2).astype(np.float32), 2500),
+        # Mono, at an offset
+        ((rng.standard_normal((700, 1)) * 0.2).astype(np.float32), 1234),
+    ]
+    native = MultiTrackLooper(num_tracks=4, max_record_seconds=1,
+                              backend=NullBackend(blocksize=blocksize))
+    for t, (audio, offset) in enumerate(takes):
+        native.set_track_audio(t, audio, offset=offset)
+    assert [len(track) for track in native.tracks] == [length, 17, 1500, 700]
+    reference = MultiTrackLooper(num_tracks=4, max_record_seconds=1,
+                                 backend=NullBackend(blocksize=blocksize))
+    reference.load_tracks(np.stack([tiled(audio, offset, length) for audio, offset in takes]))
+    
+    outputs = []
+    for looper in (native, reference):
+        looper.set_track_volume(2, 0.6)
+        looper.toggle_playback()
+        out = np.zeros((3 * length + 77, 2), dtype=np.float32)
+        looper.backend.run(len(out), output=out)
+        outputs.append(out)
+    assert np.array_equal(outputs[0], outputs[1])
+    # And export the same, in chunks that don't divide the loop either
+    files = [looper.save_mix(str(tmp_path / name), repeats=2, chunk_frames=blocksize)
+             for looper, name in ((native, 'native'), (reference, 'reference'))]
+    with open(files[0], 'rb') as a, open(files[1], 'rb') as b:
+        assert a.read() == b.read()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend
+from audioloop.peaks import PeakPyramid
+
+def assert_same_pyramid(pyramid, reference):
+    assert pyramid.frames == reference.frames
+    assert pyramid.counts == reference.counts
+    for level, count in enumerate(reference.counts):
+        assert np.array_equal(pyramid.mins[level][:count], reference.mins[level][:count])
+        assert np.array_equal(pyramid.maxs[level][:count], reference.maxs[level][:count])
+
+def noise(frames, channels=2, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((frames, channels)) * 0.2).astype(np.float32)
+
+@pytest.mark.parametrize('pieces', [[1], [63, 1, 64, 65], [100], [1000, 7], [4096]])
+def test_appended_pieces_give_the_whole_take_pyramid(pieces):
+    audio = noise(20000)
+    pyramid = PeakPyramid()
+    done, i = 0, 0
+    while done < len(audio):
+        count = pieces[i % len(pieces)]
+        pyramid.append(audio[done:done + count])
+        done += count
+        i += 1
+    pyramid.append(audio[:0])
+    assert_same_pyramid(pyramid, PeakPyramid.from_audio(audio))
+
+@pytest.mark.parametrize('blocksize', [64, 100, 1000])
+def test_recorded_take_peaks_match_the_take(blocksize):
+    backend = NullBackend(blocksize=blocksize)
+    looper = MultiTrackLooper(num_tracks=2, max_record_seconds=1, backend=backend)
+    backend.input_signal = noise(30011, looper.input_channels, seed=1)
+    looper.start_recording(0)
+    # The GUI folds in whatever arrived since its last frame
+    for frames in (700, 3, 5000, 64, 12000):
+        backend.run(frames)
+        looper.update_recording()
+    backend.run(30011 - 17767)
+    looper.stop_recording()
+    
+    take = backend.input_signal
+    assert np.array_equal(looper.tracks[0][:, 0], take[:, 0])
+    assert_same_pyramid(looper.get_track_peaks(0), PeakPyramid.from_audio(take))
+
+def test_levels_are_correct_across_chunk_boundaries():
+    base = 64
+    audio = noise(base * 40 + 17, seed=2)
+    # Extremes on either side of block edges, where appends also split
+    cuts = [base - 1, 3 * base, 5 * base - 1, 5 * base + 3, 16 * base, 33 * base - 2]
+    for n, frame in enumerate(cuts):
+        audio[frame, n % 2] = 2.0 + n
+        audio[frame + 1, (n + 1) % 2] = -2.0 - n
+    pyramid = PeakPyramid(base)
+    for start, stop in zip([0] + cuts, cuts + [len(audio)]):
+        pyramid.append(audio[start:stop])
+    
+    for level in range(6):
+        block = pyramid.block_frames(level)
+        whole = len(audio) // block
+        blocks = audio[:whole * block].reshape(whole, -1)
+        assert pyramid.counts[level] == whole
+        assert np.array_equal(pyramid.mins[level][:whole], blocks.min(axis=1))
+        assert np.array_equal(pyramid.maxs[level][:whole], blocks.max(axis=1))
+    # The spike straddling the first block edge shows in both blocks
+    assert pyramid.maxs[0][0] == 2.0 and pyramid.mins[0][1] == -2.0
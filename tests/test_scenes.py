@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from audioloop import MultiTrackLooper, NullBackend, save_session
+from audioloop.scenes import parse_song
+
+# Loop lengths that none of the block sizes divide
+LENGTHS = {'verse': 1000, 'chorus': 1700, 'bridge': 900}
+
+def scene_audio(name):
+    rng = np.random.default_rng(len(name))
+    return (rng.standard_normal((LENGTHS[name], 2)) * 0.1).astype(np.float32)
+
+def song_looper(tmp_path, blocksize):
+    """A looper in the verse scene, with the chorus and bridge in sessions"""
+    for name in ('chorus', 'bridge'):
+        other = MultiTrackLooper(num_tracks=2, backend=NullBackend())
+        other.set_track_audio(0, scene_audio(name))
+        save_session(other, str(tmp_path / name))
+    
+    looper = MultiTrackLooper(num_tracks=2, backend=NullBackend(blocksize=blocksize))
+    looper.set_track_audio(0, scene_audio('verse'))
+    looper.save_scene('verse')
+    for name in ('chorus', 'bridge'):
+        looper.add_scene(name, str(tmp_path / name))
+    return looper
+
+def play(looper, out, start=0):
+    """Render into out block by block, doing the GUI's scene upkeep between
+    blocks and waiting for each scene to be prepared"""
+    blocksize = looper.backend.blocksize
+    for done in range(start, len(out), blocksize):
+        count = min(blocksize, len(out) - done)
+        looper.backend.run(count, output=out[done:done + count])
+        looper.update_scenes()
+        if looper._scene_future is not None:
+            looper._scene_future.result()
+
+@pytest.mark.parametrize('blocksize', [100, 256, 333, 1024])
+def test_song_switches_on_the_boundary_frames(tmp_path, blocksize):
+    looper = song_looper(tmp_path, blocksize)
+    looper.toggle_playback()
+    # Part way into the verse's second loop; the song starts at its end
+    out = np.zeros((9000, 2), dtype=np.float32)
+    play(looper, out[:1300])
+    looper.play_song(parse_song("chorus x2, bridge x3, verse"))
+    looper._scene_future.result()
+    play(looper, out, start=1300)
+    
+    expected = [np.resize(scene_audio('verse'), (2000, 2)),
+                np.resize(scene_audio('chorus'), (2 * 1700, 2)),
+                np.resize(scene_audio('bridge'), (3 * 900, 2))]
+    expected.append(np.resize(scene_audio('verse'), (len(out) - 8100, 2)))
+    expected = np.concatenate(expected)
+    for boundary in (2000, 5400, 8100):
+        assert np.array_equal(out[boundary - 1:boundary + 1], expected[boundary - 1:boundary + 1])
+    assert np.array_equal(out, expected)
+    assert looper.scene == 'verse'
+    assert looper.song is None
+    assert looper.master_length == 1000
@@ -0,0 +1,75 @@
+import json
+import numpy as np
+from audioloop import (MultiTrackLooper, NullBackend, Automation, Biquad, Delay, Pan, Compressor,
+                       load_session, save_session)
+
+def render(looper, frames, blocksize=256):
+    """frames of the looper's output from the loop start"""
+    looper.backend = NullBackend(blocksize=blocksize)
+    out = np.zeros((frames, looper.channels), dtype=np.float32)
+    looper.toggle_playback()
+    looper.backend.run(frames, output=out)
+    looper.toggle_playback()
+    return out
+
+def make_looper():
+    rng = np.random.default_rng(8)
+    looper = MultiTrackLooper(num_tracks=5, max_record_seconds=1, backend=NullBackend())
+    looper.set_track_audio(0, (rng.standard_normal((9000, 2)) * 0.2).astype(np.float32))
+    # Mono, and shorter than the loop: kept at native length
+    looper.set_track_audio(1, (rng.standard_normal((2500, 1)) * 0.2).astype(np.float32))
+    # Starting at a loop offset, wrapping round the end
+    looper.set_track_audio(2, (rng.standard_normal((4000, 2)) * 0.2).astype(np.float32),
+                           offset=7000)
+    looper.set_track_audio(3, (rng.standard_normal((9000, 2)) * 0.2).astype(np.float32))
+    looper.set_track_volume(0, 0.8)
+    looper.toggle_track(3)
+    looper.set_track_effects(0, [Biquad('highpass', 200.0), Pan(-0.5)])
+    looper.set_track_effects(2, [Delay(0.01, 0.5, 0.4)])
+    looper.set_master_effects([Compressor(threshold_db=-20.0)])
+    looper.automation = Automation.from_list([[0, 0, 0.8], [3000, 0, 0.2], [6000, 2, 0.0]])
+    return looper
+
+def test_session_round_trip(tmp_path):
+    looper = make_looper()
+    manifest = save_session(looper, str(tmp_path))
+    with open(manifest) as f:
+        session = json.load(f)
+    assert session['data'] == 'tracks.npy'
+    assert [track['empty'] for track in session['tracks']] == [False] * 4 + [True]
+    
+    loaded = load_session(str(tmp_path), backend=NullBackend())
+    # Memory-mapped from the session, not read into memory
+    assert isinstance(loaded.track_data.base, np.memmap)
+    assert loaded.master_length == looper.master_length
+    assert loaded.track_volumes == looper.track_volumes
+    assert loaded.track_enabled == looper.track_enabled
+    assert loaded.tracks[4] is None
+    assert loaded.automation.to_list() == looper.automation.to_list()
+    assert [[e.to_dict() for e in chain] for chain in loaded.track_effects] == \
+        [[e.to_dict() for e in chain] for chain in looper.track_effects]
+    assert [e.to_dict() for e in loaded.master_effects] == \
+        [e.to_dict() for e in looper.master_effects]
+    
+    # Takes kept at native length were saved looped out to full rows, mono
+    # ones on every channel
+    length = looper.master_length
+    mono = np.resize(looper.tracks[1], (length, 1))
+    assert np.array_equal(loaded.track_data[1], np.repeat(mono, 2, axis=1))
+    wrapped = np.roll(np.resize(looper.tracks[2], (length, 2)), 7000, axis=0)
+    assert np.array_equal(loaded.track_data[2], wrapped)
+    
+    frames = 3 * looper.master_length + 123
+    assert np.array_equal(render(loaded, frames), render(make_looper(), frames))
+
+def test_saving_over_a_mapped_session(tmp_path):
+    looper = make_looper()
+    save_session(looper, str(tmp_path))
+    loaded = load_session(str(tmp_path), backend=NullBackend())
+    before = render(loaded, 20000)
+    loaded.set_track_volume(1, 0.5)
+    save_session(loaded, str(tmp_path))
+    reloaded = load_session(str(tmp_path), backend=NullBackend())
+    assert reloaded.track_volumes[1] == 0.5
+    reloaded.set_track_volume(1, 1.0)
+    assert np.array_equal(render(reloaded, 20000), before)